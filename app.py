@@ -1,368 +1,402 @@
-from flask import Flask, render_template, request
-import imaplib
-import email
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify, url_for
 from email.header import decode_header
-import re
 import time
-from config import EMAIL_ACCOUNT, EMAIL_PASSWORD, IMAP_SERVER, get_platform_email
-from bs4 import BeautifulSoup
-import ssl
+from config import (EMAIL_ACCOUNTS, SHARD_VIRTUAL_NODES, WARM_UP, WARM_UP_CONNECTIONS, DEBUG, IMAP_POOL_SIZE, IMAP_POOL_IDLE_TIMEOUT,
+                    IMAP_POOL_HEALTH_CHECK_INTERVAL, IMAP_POOL_CHECKOUT_TIMEOUT, MAIL_ARRIVAL_TIMEOUT,
+                    MAIL_ARRIVAL_POLL_INTERVAL, MAIL_RESUBMIT_WAIT, IMAP_IDLE_ENABLED, MAILBOX_INDEX_PATH,
+                    MAX_PENDING_VERIFICATIONS, VERIFICATION_QUEUE_TIMEOUT, VERIFICATION_DEADLINE,
+                    JOB_QUEUE_PATH, JOB_LEASE, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF, JOB_RETRY_BACKOFF_MAX, TASK_LEASE,
+                    BATCH_RESULTS_PATH, TICKET_STORE_PATH, VERIFICATION_TRACE_LOGGING,
+                    RESULT_CACHE_SIZE, RESULT_CACHE_TTL, MIME_MAX_TEXT_BYTES, PRECHECK_PEEK_BYTES,
+                    ARCHIVE_INTERVAL, ARCHIVE_FOLDER, ARCHIVE_MIN_AGE_DAYS, ARCHIVE_STALE_DAYS, ARCHIVE_MAX_INBOX, ARCHIVE_BATCH_SIZE, ARCHIVE_DRY_RUN)
+from imap_client import connect_to_email
+from imap_pool import IMAPConnectionPool
+from mail_watcher import InboxWatcher
+from mailbox_index import MailboxIndex
+from parsers import get_platform_email, warm_up as warm_up_parsers
+from message_body import NormalizedMessage
+from platforms import registry
+from imap_fetch import FetchStats, build_message, fetch_headers, fetch_section, find_body_part
+from async_verifier import AsyncVerifier
+from verification import (VERIFIED, CONNECTION_ERROR, NO_EMAIL, OVERLOADED, TIMED_OUT, make_outcome,
+                          precheck_outcome)
+from ticket_store import TicketStore
+from result_cache import ResultCache
+from metrics import metrics, span
+from log_config import configure_logging, dropped_records
+from job_queue import JobQueue, TaskLease, DONE, QUEUED, RETRYING, RUNNING
+from batch_verify import BatchResultStore, run_batch
+from sharding import MailboxShard, ShardRouter, shard_path
+from housekeeping import ArchiveScheduler, InboxArchiver
+import functools
 import logging
-import socket
-
-app = Flask(__name__)
-
-# Configure logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(levelname)s:%(message)s')
+import threading
 
 def clean_text(text):
     """Clean text for use in filenames or other purposes."""
     return "".join(c if c.isalnum() else "_" for c in text)
 
-def connect_to_email(retries=3, delay=5):
-    """Connect to the IMAP server and log in with retry logic."""
-    for attempt in range(1, retries + 1):
-        try:
-            logging.info(f"Attempt {attempt}: Connecting to IMAP server: {IMAP_SERVER}")
-            context = ssl.create_default_context()
-            mail = imaplib.IMAP4_SSL(IMAP_SERVER, 993, ssl_context=context)
-            logging.info("Successfully connected to IMAP server.")
-            
-            logging.info("Logging in...")
-            mail.login(EMAIL_ACCOUNT, EMAIL_PASSWORD)
-            logging.info("Logged in successfully!")
-            return mail
-        except socket.gaierror as e:
-            logging.error(f"Socket error (getaddrinfo failed): {e}")
-        except imaplib.IMAP4.error as e:
-            logging.error(f"IMAP4 error: {str(e)}")
-        except Exception as e:
-            logging.error(f"An unexpected error occurred: {str(e)}")
-        
-        if attempt < retries:
-            logging.info(f"Retrying in {delay} seconds...")
-            time.sleep(delay)
-    
-    raise Exception("Failed to connect to the IMAP server after multiple attempts.")
+# Bytes transferred by message fetches
+fetch_stats = FetchStats()
 
-def search_email(mail, user_email):
+def search_email(mail, user_email, index, skip_body=None):
     """
-    Search for the latest forwarded email from user_email to EMAIL_ACCOUNT.
-    Returns the email message object if found, else None.
+    Search for the latest forwarded email from user_email in the inbox of
+    mail, using index, that account's local mailbox index.
+    Returns the email message object if found, else None. skip_body is
+    passed on to fetch_forwarded_email.
     """
     mail.select("inbox")
-    
-    # Search for all emails from the user_email
-    status, messages = mail.search(None, f'(FROM "{user_email}")')
-    
-    if status != "OK":
-        logging.error("Failed to search emails.")
-        return None
 
-    email_ids = messages[0].split()
-    if not email_ids:
-        logging.info("No emails found.")
-        return None
-
-    # Fetch the latest email ID
-    latest_email_id = email_ids[-1]
-    status, msg_data = mail.fetch(latest_email_id, "(RFC822)")
+    # Look the sender up in the local index, syncing only UIDs it has not seen yet
+    try:
+        with span("index_sync"):
+            index.sync(mail)
+        latest = index.latest_from(user_email)
+    except Exception as e:
+        logging.warning("Mailbox index unavailable, searching on the server: %s", e)
+        return search_email_on_server(mail, user_email, skip_body)
 
-    if status != "OK":
-        logging.error("Failed to fetch the email.")
+    if not latest:
+        logging.info("No emails found.")
         return None
 
-    msg = email.message_from_bytes(msg_data[0][1])
-
-    # Decode the subject and check if the email is forwarded
-    subject, encoding = decode_header(msg["Subject"])[0]
-    if isinstance(subject, bytes):
-        subject = subject.decode(encoding if encoding else "utf-8")
-
+    uid, subject, _ = latest
     if "Fwd:" not in subject:
         logging.info("The latest email is not a forwarded email.")
         return None
 
-    logging.info(f"Email found: {subject}")
-    return msg
-
-def extract_forwarded_email(body):
-    """Extract the forwarded email content from the outer email body."""
-    markers = [
-        "---------- Forwarded message ----------",
-        "Begin forwarded message:",
-        "----- Original Message -----"
-    ]
-
-    for marker in markers:
-        if marker in body:
-            parts = body.split(marker, 1)
-            if len(parts) > 1:
-                return marker + parts[1]
-
-    logging.warning("No forwarded email marker found. Returning full body.")
-    return body
-
-def extract_email_field(text, field_name):
-    """Extract email address from a specific field in the email header."""
-    pattern = fr"{re.escape(field_name)}.*?([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{{2,}})"
-    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-    if match:
-        return match.group(1).strip().lower()
-    logging.warning(f"Email address not found for field: {field_name}")
-    return None
-
-def parse_bookmyshow_email(msg):
-    """Parse BookMyShow email format."""
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == "text/plain":
-                body = part.get_payload(decode=True).decode(errors="ignore")
-                break
-    else:
-        body = msg.get_payload(decode=True).decode(errors="ignore")
-
-    forwarded_email = extract_forwarded_email(body)
-    if not forwarded_email:
-        return None
+    return fetch_forwarded_email(mail, str(uid).encode(), skip_body)
 
-    # Clean soft line breaks
-    forwarded_email = forwarded_email.replace("=\n", "")
+def latest_message_key(mail, user_email, index):
+    """
+    (UIDVALIDITY, UID) of the newest message from user_email, or None. The
+    index sync is a single UID FETCH when no mail has arrived since the last one.
+    """
+    mail.select("inbox")
+    index.sync(mail)
+    latest = index.latest_from(user_email)
+    return (index.uidvalidity(), latest[0]) if latest else None
 
-    # Extract required fields
-    from_email = extract_email_field(forwarded_email, "From:")
-    to_email = extract_email_field(forwarded_email, "To:")
-    
-    # Extract BookMyShow specific fields
-    booking_id_match = re.search(r"BOOKING ID[:\s]+(\w+)", forwarded_email, re.IGNORECASE)
-    venue_match = re.search(
-        r'Venue\s+Directions.*?<.*?>.*?\n\s*([^\n<]+)',
-        forwarded_email,
-        re.DOTALL | re.IGNORECASE
-    )
-    datetime_match = re.search(
-        r'Date\s*&\s*Time\s*\n\s*([^|]+\|[^<\n]+)',
-        forwarded_email,
-        re.IGNORECASE
-    )
-    quantity_match = re.search(
-        r'Category\s+Quantity\s+Price.*?\n.*?\n(\d+)',
-        forwarded_email,
-        re.DOTALL | re.IGNORECASE
-    )
-    event_match = re.search(
-        r'Subject:.*?Booking confirmed for\s+(.*?)\n',
-        forwarded_email,
-        re.IGNORECASE | re.DOTALL
-    )
+def latest_forward(mail, user_email, index):
+    """
+    Envelope of the newest message from user_email for /precheck, or None.
+    Only the mailbox index and header fields are read, plus the first
+    PRECHECK_PEEK_BYTES of the text part when the subject does not show
+    the platform.
+    """
+    mail.select("inbox")
+    with span("index_sync"):
+        index.sync(mail)
+    latest = index.latest_from(user_email)
+    if not latest:
+        return None
 
+    uid, subject, date = latest
+    forwarded = "Fwd:" in subject
     return {
-        "from_email": from_email,
-        "to_email": to_email,
-        "booking_id": booking_id_match.group(1).strip() if booking_id_match else None,
-        "venue": venue_match.group(1).strip() if venue_match else None,
-        "date_time": datetime_match.group(1).strip() if datetime_match else None,
-        "event_name": event_match.group(1).strip() if event_match else None,
-        "quantity": quantity_match.group(1).strip() if quantity_match else None
+        "uid": uid,
+        "subject": subject,
+        "date": date,
+        "forwarded": forwarded,
+        "detected_platform": detect_forward_platform(mail, uid, subject) if forwarded else None,
     }
 
-def parse_zomato_email(msg):
-    """Parse Zomato email format."""
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == "text/plain":
-                body = part.get_payload(decode=True).decode(errors="ignore")
-                break
-    else:
-        body = msg.get_payload(decode=True).decode(errors="ignore")
-
-    forwarded_email = extract_forwarded_email(body)
-    if not forwarded_email:
+def detect_forward_platform(mail, uid, subject):
+    """The platform a forward looks like from its subject or the start of its text, or None."""
+    detected = registry.detect(subject, "")
+    if detected or not PRECHECK_PEEK_BYTES:
+        return detected
+
+    uid = str(uid).encode()
+    with span("fetch_headers"):
+        fetched = fetch_headers(mail, uid)
+    if not fetched:
+        return None
+    _, header_bytes, bodystructure, header_size = fetched
+    part = None
+    if bodystructure:
+        part = find_body_part(bodystructure) or find_body_part(bodystructure, "text/html")
+    with span("fetch_body"):
+        body, body_size = fetch_section(mail, uid, part["section"], PRECHECK_PEEK_BYTES) if part else (b"", 0)
+    fetch_stats.record(header_bytes=header_size, body_bytes=body_size)
+    if not body:
         return None
 
-    # Clean soft line breaks
-    forwarded_email = forwarded_email.replace("=\n", "")
+    # Not through normalized_messages: that cache would keep the truncated body
+    normalized = NormalizedMessage(build_message(header_bytes, part, body))
+    return registry.detect(subject, normalized.forwarded_text)
 
-    # Extract required fields
-    from_email = extract_email_field(forwarded_email, "From:")
-    to_email = extract_email_field(forwarded_email, "To:")
+def search_email_on_server(mail, user_email, skip_body=None):
+    """Find the latest email from user_email with a server-side SEARCH."""
+    # Search for all emails from the user_email
+    with span("server_search"):
+        status, messages = mail.uid("SEARCH", None, f'(FROM "{user_email}")')
     
-    # Extract Zomato specific fields
-    booking_id_match = re.search(r"Ticket ID[:\s]+(\w+)", forwarded_email, re.IGNORECASE)
-    event_match = re.search(r"You just scored tickets to\s+(.*?)(?:\n|$)", forwarded_email, re.IGNORECASE)
-    date_match = re.search(r"(\w+,\s+\w+\s+\d+,\s+\d{4})", forwarded_email)
-    quantity_match = re.search(r"RSVP x\s*(\d+)", forwarded_email, re.IGNORECASE)
-
-    # Note: Venue might not be directly available in the email template shown
-    venue = "Venue information not available in email"
-
-    return {
-        "from_email": from_email,
-        "to_email": to_email,
-        "booking_id": booking_id_match.group(1).strip() if booking_id_match else None,
-        "venue": venue,
-        "date_time": date_match.group(1).strip() if date_match else None,
-        "event_name": event_match.group(1).strip() if event_match else None,
-        "quantity": quantity_match.group(1).strip() if quantity_match else None
-    }
+    if status != "OK":
+        logging.error("Failed to search emails.")
+        return None
 
-def parse_paytminsider_email(msg):
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == "text/plain":
-                body = part.get_payload(decode=True).decode(errors="ignore")
-                break
-    else:
-        body = msg.get_payload(decode=True).decode(errors="ignore")
-
-    # Log the raw body for debugging purposes
-    logging.debug(f"Raw email body: {body}")
-
-    # Clean soft line breaks that may appear in the email
-    body = body.replace("=\n", "")
-
-    # Extract email fields
-    from_email = extract_email_field(body, "From:")
-    to_email = extract_email_field(body, "To:")
-    logging.info(f"Extracted from_email: {from_email}")
-    logging.info(f"Extracted to_email: {to_email}")
-
-    # Extract Booking ID
-    booking_id_match = re.search(r"transaction reference\s*(\w+)", body, re.IGNORECASE)
-    booking_id = booking_id_match.group(1).strip() if booking_id_match else None
-    logging.info(f"Extracted booking_id: {booking_id}")
-
-    # Refined venue extraction: Capture text after "Venue" up to "Get Directions"
-    venue_match = re.search(
-        r"Venue\s*\n([^\n]+(?:\n[^\n]+)*)\nGet Directions", body, re.IGNORECASE
-    )
-    if venue_match:
-        # Capture the matched groups, join them with commas, and remove leading/trailing commas
-        venue = ", ".join([line.strip() for line in venue_match.group(1).splitlines() if line]).strip(", ")
-    else:
-        venue = None
-    logging.info(f"Extracted venue: {venue}")
-
-    # Extract Date and Time
-    date_match = re.search(r"Date\s*\n([^\n]+)", body, re.IGNORECASE)
-    time_match = re.search(r"Time\s*\n([^\n]+)", body, re.IGNORECASE)
-    date_time = f"{date_match.group(1).strip()} {time_match.group(1).strip()}" if date_match and time_match else None
-    logging.info(f"Extracted date_time: {date_time}")
-
-    # Extract Event Name
-    event_match = re.search(r"Music\s*\n([^\n]+)", body, re.IGNORECASE)
-    event_name = event_match.group(1).strip() if event_match else None
-    logging.info(f"Extracted event_name: {event_name}")
-
-    # Extract Quantity
-    quantity_match = re.search(r"(\d+)\s*Ticket", body, re.IGNORECASE)
-    quantity = quantity_match.group(1).strip() if quantity_match else "1"
-    logging.info(f"Extracted quantity: {quantity}")
+    email_ids = messages[0].split()
+    if not email_ids:
+        logging.info("No emails found.")
+        return None
 
-    return {
-        "from_email": from_email,
-        "to_email": to_email,
-        "booking_id": booking_id,
-        "venue": venue,
-        "date_time": date_time,
-        "event_name": event_name,
-        "quantity": quantity
-    }
+    # Fetch the latest email ID
+    return fetch_forwarded_email(mail, email_ids[-1], skip_body)
 
-def parse_dice_email(msg):
-    """Parse DICE email format."""
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == "text/plain":
-                body = part.get_payload(decode=True).decode(errors="ignore")
-                break
-    else:
-        body = msg.get_payload(decode=True).decode(errors="ignore")
-
-    forwarded_email = extract_forwarded_email(body)
-    if not forwarded_email:
+def fetch_forwarded_email(mail, uid, skip_body=None):
+    """
+    Fetch the message with the given UID if it is a forwarded email.
+
+    Only BODYSTRUCTURE and the envelope header fields are fetched first, so
+    non-forwarded mail is rejected before any body bytes are downloaded;
+    after that only the first text/plain section (or text/html section for
+    HTML-only mail) is fetched, up to MIME_MAX_TEXT_BYTES. When
+    skip_body(headers) is true, as for an already claimed ticket, the
+    headers are returned without the body.
+    """
+    with span("fetch_headers"):
+        fetched = fetch_headers(mail, uid)
+    if not fetched:
+        logging.error("Failed to fetch the email.")
         return None
+    headers, header_bytes, bodystructure, header_size = fetched
 
-    # Clean soft line breaks that may appear in the email
-    forwarded_email = forwarded_email.replace("=\n", "")
-
-    # Extract required fields
-    from_email = extract_email_field(forwarded_email, "From:")
-    to_email = extract_email_field(forwarded_email, "To:")
+    # Decode the subject and check if the email is forwarded
+    subject, encoding = decode_header(headers["Subject"] or "")[0]
+    if isinstance(subject, bytes):
+        subject = subject.decode(encoding if encoding else "utf-8")
 
-    # Extract DICE specific fields
-    # Event name - appears after "you are going" and before the venue details
-    event_match = re.search(r"you are going\s*(.*?)(?:View tickets|Venue details|<https?://)", forwarded_email, re.IGNORECASE | re.DOTALL)
-    
-    # Venue - appears between "Venue" and the address
-    venue_match = re.search(r"Venue\s*[:\s]*(.*?)(?=\s*<|$)", forwarded_email, re.IGNORECASE)
+    if "Fwd:" not in subject:
+        fetch_stats.record(header_bytes=header_size, rejected=True)
+        logging.info("The latest email is not a forwarded email.")
+        return None
 
-    
-    # Date and time - format is specific in DICE emails
-    datetime_match = re.search(r"Date & time\s*(.*?)(?:\n|Doors)", forwarded_email, re.IGNORECASE)
-    
-    # Quantity - extract from the ticket details section
-    quantity_match = re.search(r"Tickets\s*(\d+).*?Group\s+of\s*(\d+)", forwarded_email, re.IGNORECASE)
-    
-    # Booking/Order ID - In DICE emails, we might need to use a different identifier
-    # Using the URL dice_id parameter as a unique identifier
-    booking_id_match = re.search(r"dice_id=([A-Za-z0-9]+)", forwarded_email, re.IGNORECASE)
+    if skip_body is not None and skip_body(headers):
+        fetch_stats.record(header_bytes=header_size)
+        logging.info("Email found: %s (body not needed)", subject)
+        return headers
+
+    part = None
+    if bodystructure:
+        part = find_body_part(bodystructure) or find_body_part(bodystructure, "text/html")
+    with span("fetch_body"):
+        body, body_size = fetch_section(mail, uid, part["section"], MIME_MAX_TEXT_BYTES) if part else (b"", 0)
+    if body is None:
+        logging.error("Failed to fetch the email body.")
+        return None
 
-    return {
-        "from_email": from_email,
-        "to_email": to_email,
-        "booking_id": booking_id_match.group(1) if booking_id_match else None,
-        "venue": venue_match.group(1).strip() if venue_match else None,
-        "date_time": datetime_match.group(1).strip() if datetime_match else None,
-        "event_name": event_match.group(1).strip() if event_match else None,
-        "quantity": quantity_match.group(1) if quantity_match else None
-    }
+    total = fetch_stats.record(header_bytes=header_size, body_bytes=body_size)
+    logging.info("Email found: %s (%s bytes fetched)", subject, total)
+    return build_message(header_bytes, part, body)
 
-def parse_email(msg, platform):
+class Services:
     """
-    Parse the email message based on the selected platform.
-    Returns a dictionary with extracted data.
+    Stores, receiving-account shards and background workers behind the
+    routes. create_app() builds one per app, so importing this module opens
+    no files or connections.
+
+    warm_up_hooks are (name, function) pairs run by warm_up(); more can be
+    appended before the app starts serving.
     """
-    if platform == 'bookmyshow':
-        return parse_bookmyshow_email(msg)
-    elif platform == 'zomato':
-        return parse_zomato_email(msg)
-    elif platform == 'paytminsider':
-        return parse_paytminsider_email(msg)
-    elif platform == 'dice':
-        return parse_dice_email(msg)
-    else:
-        logging.error(f"Unsupported platform: {platform}")
-        return None
-    
 
-@app.route("/", methods=["GET", "POST"])
+    def __init__(self):
+        # Verified tickets; rejects replays and answers repeat verifications
+        self.tickets = TicketStore(TICKET_STORE_PATH)
+
+        # Outcomes of recent verifications, keyed by the message they were decided by
+        self.result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+        # Receiving accounts; each user forwards to the one their address hashes to
+        self.shards = ShardRouter(
+            [self.build_shard(number, account) for number, account in enumerate(EMAIL_ACCOUNTS, 1)],
+            SHARD_VIRTUAL_NODES
+        )
+
+        # Persistent queue of /confirm verifications, handed to the verifiers
+        # without blocking; no more run at once than a verifier has slots for
+        self.job_queue = JobQueue(
+            JOB_QUEUE_PATH,
+            self.shards.submit,
+            max_in_flight=MAX_PENDING_VERIFICATIONS,
+            max_attempts=JOB_MAX_ATTEMPTS,
+            backoff_base=JOB_RETRY_BACKOFF,
+            backoff_max=JOB_RETRY_BACKOFF_MAX,
+            retry_statuses=(CONNECTION_ERROR, NO_EMAIL, OVERLOADED, TIMED_OUT),
+            lease=JOB_LEASE
+        )
+
+        # Batch sweeps run one at a time in a background thread, and in one
+        # worker process at a time
+        self.batch_state = {"running": False, "last_report": None, "last_error": None}
+        self.batch_lock = threading.Lock()
+        self.batch_lease = TaskLease(JOB_QUEUE_PATH, "batch-verify", TASK_LEASE)
+
+        # Inbox housekeeping, on a schedule when ARCHIVE_INTERVAL is set and on
+        # demand; every worker process schedules passes, one at a time runs them
+        self.archive_scheduler = ArchiveScheduler(self.archive_inboxes, ARCHIVE_INTERVAL, ARCHIVE_DRY_RUN,
+                                                  lease=TaskLease(JOB_QUEUE_PATH, "archive", TASK_LEASE))
+
+        self.warm_up_hooks = [("parsers", warm_up_parsers)]
+        for shard in self.shards.shards:
+            self.warm_up_hooks.append((f"pool:{shard.email}", functools.partial(shard.pool.prefill,
+                                                                                WARM_UP_CONNECTIONS)))
+            self.warm_up_hooks.append((f"index:{shard.email}", functools.partial(sync_index, shard)))
+        self.startup = {"create_seconds": None, "warm_up_running": False, "warm_up_seconds": {},
+                        "warm_up_errors": {}}
+        self.startup_lock = threading.Lock()
+
+    def build_shard(self, number, account):
+        """Connection pool, IDLE watcher, mailbox index, verifier and archiver for one receiving account."""
+        # The pool handles its own backoff, so each factory call makes a single connection attempt
+        pool = IMAPConnectionPool(
+            functools.partial(connect_to_email, retries=1, account=account),
+            max_size=IMAP_POOL_SIZE,
+            idle_timeout=IMAP_POOL_IDLE_TIMEOUT,
+            health_check_interval=IMAP_POOL_HEALTH_CHECK_INTERVAL,
+            checkout_timeout=IMAP_POOL_CHECKOUT_TIMEOUT
+        )
+
+        # Background IMAP IDLE watcher that wakes /confirm requests when new mail arrives
+        watcher = InboxWatcher(functools.partial(connect_to_email, account=account))
+
+        # Local index of inbox envelope headers used to find a user's latest forward
+        index = MailboxIndex(shard_path(MAILBOX_INDEX_PATH, number))
+
+        # Async verification pipeline multiplexing /confirm requests over the pool
+        verifier = AsyncVerifier(
+            pool,
+            watcher,
+            functools.partial(search_email, index=index),
+            arrival_timeout=MAIL_ARRIVAL_TIMEOUT,
+            poll_interval=MAIL_ARRIVAL_POLL_INTERVAL,
+            max_pending=MAX_PENDING_VERIFICATIONS,
+            queue_timeout=VERIFICATION_QUEUE_TIMEOUT,
+            deadline=VERIFICATION_DEADLINE,
+            idle_enabled=IMAP_IDLE_ENABLED,
+            tickets=self.tickets,
+            trace_logging=VERIFICATION_TRACE_LOGGING,
+            results=self.result_cache,
+            probe=functools.partial(latest_message_key, index=index),
+            resubmit_wait=MAIL_RESUBMIT_WAIT
+        )
+        batch_results = BatchResultStore(shard_path(BATCH_RESULTS_PATH, number))
+
+        # Moves verified and stale forwards out of the inbox to keep it small
+        archiver = InboxArchiver(
+            self.tickets,
+            index,
+            folder=ARCHIVE_FOLDER,
+            min_age_days=ARCHIVE_MIN_AGE_DAYS,
+            stale_days=ARCHIVE_STALE_DAYS,
+            max_inbox=ARCHIVE_MAX_INBOX,
+            batch_size=ARCHIVE_BATCH_SIZE
+        )
+        return MailboxShard(number, account, pool, watcher, index, verifier, batch_results, archiver)
+
+    def run_batch_in_background(self):
+        try:
+            report = {}
+            for shard in self.shards.shards:
+                mail = connect_to_email(account=shard.account)
+                try:
+                    report[shard.email] = run_batch(mail, shard.batch_results, tickets=self.tickets)
+                finally:
+                    mail.logout()
+            with self.batch_lock:
+                self.batch_state["last_report"] = report
+                self.batch_state["last_error"] = None
+        except Exception as e:
+            logging.error("Batch verification failed: %s", e)
+            with self.batch_lock:
+                self.batch_state["last_error"] = str(e)
+        finally:
+            self.batch_lease.release()
+            with self.batch_lock:
+                self.batch_state["running"] = False
+
+    def archive_inboxes(self, dry_run):
+        """Run one archive pass over every receiving account."""
+        report = {}
+        for shard in self.shards.shards:
+            mail = connect_to_email(account=shard.account)
+            try:
+                report[shard.email] = shard.archiver.run(mail, dry_run=dry_run)
+            finally:
+                mail.logout()
+        return report
+
+    def warm_up(self):
+        """
+        Run every warm-up hook, recording how long each took. A failing hook
+        is logged and recorded; the app serves regardless.
+        """
+        with self.startup_lock:
+            self.startup["warm_up_running"] = True
+        for name, hook in self.warm_up_hooks:
+            start = time.perf_counter()
+            try:
+                hook()
+                error = None
+            except Exception as e:
+                logging.warning("Warm-up step %s failed: %s", name, e)
+                error = str(e)
+            with self.startup_lock:
+                self.startup["warm_up_seconds"][name] = round(time.perf_counter() - start, 4)
+                if error:
+                    self.startup["warm_up_errors"][name] = error
+        with self.startup_lock:
+            self.startup["warm_up_running"] = False
+
+    def startup_stats(self):
+        with self.startup_lock:
+            return {key: dict(value) if isinstance(value, dict) else value for key, value in self.startup.items()}
+
+def sync_index(shard):
+    """Bring shard's mailbox index up to date over a pooled connection."""
+    with shard.pool.connection() as mail:
+        mail.select("inbox")
+        shard.index.sync(mail)
+
+def get_services():
+    """The Services of the app handling the current request."""
+    return current_app.extensions["ticket_verifier"]
+
+bp = Blueprint("verifier", __name__)
+
+@bp.app_context_processor
+def inject_platforms():
+    return {"platforms": registry.all()}
+
+@bp.route("/", methods=["GET", "POST"])
 def index():
+    services = get_services()
     verification_result = None
     user_email = None
     platform = None
     expected_from_email = None
+    your_email = None
 
     if request.method == "POST":
         user_email = request.form.get("user_email")
         platform = request.form.get("platform")
         if platform:
             expected_from_email = get_platform_email(platform)
-        logging.info(f"User Email Submitted: {user_email}, Platform: {platform}")
+        if user_email:
+            your_email = services.shards.for_user(user_email).email
+        logging.info("User Email Submitted: %s, Platform: %s", user_email, platform)
 
     return render_template("index.html", 
                          user_email=user_email,
                          platform=platform,
                          verification_result=verification_result,
                          expected_from_email=expected_from_email,
-                         your_email=EMAIL_ACCOUNT)
+                         your_email=your_email)
 
-@app.route("/confirm", methods=["POST"])
+@bp.route("/confirm", methods=["POST"])
 def confirm_route():
+    services = get_services()
     user_email = request.form.get("user_email")
     platform = request.form.get("platform")
     
@@ -371,93 +405,198 @@ def confirm_route():
         return render_template("index.html", 
                              verification_result="User email and platform must be provided.",
                              expected_from_email=None,
-                             your_email=EMAIL_ACCOUNT)
+                             your_email=services.shards.for_user(user_email).email if user_email else None)
 
+    your_email = services.shards.for_user(user_email).email
     expected_from_email = get_platform_email(platform)
     if not expected_from_email:
-        logging.warning(f"Invalid platform selected: {platform}")
+        logging.warning("Invalid platform selected: %s", platform)
         return render_template("index.html", 
                              user_email=user_email,
                              platform=platform,
                              verification_result="Invalid platform selected.",
                              expected_from_email=None,
-                             your_email=EMAIL_ACCOUNT)
-
-    try:
-        mail = connect_to_email()
-    except Exception as e:
-        logging.error(f"Failed to connect to email: {str(e)}")
-        return render_template("index.html", 
-                             user_email=user_email,
-                             platform=platform,
-                             verification_result=f"Failed to connect to email: {str(e)}",
-                             expected_from_email=expected_from_email,
-                             your_email=EMAIL_ACCOUNT)
+                             your_email=your_email)
 
-    time.sleep(5)  # Wait for email to arrive
+    job_id = services.job_queue.enqueue(user_email, platform)
+    logging.info("Queued verification job %s for %s (%s).", job_id, user_email, platform)
 
-    msg = search_email(mail, user_email)
-    if not msg:
-        mail.logout()
-        logging.warning(f"No forwarded email found for user: {user_email}")
-        return render_template("index.html", 
-                             user_email=user_email,
-                             platform=platform,
-                             verification_result="No forwarded email found. Please ensure you have forwarded the email correctly.",
-                             expected_from_email=expected_from_email,
-                             your_email=EMAIL_ACCOUNT)
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"job_id": job_id, "status_url": url_for(".job_status", job_id=job_id)}), 202
+    return render_template("index.html", 
+                         user_email=user_email,
+                         platform=platform,
+                         job_id=job_id,
+                         expected_from_email=expected_from_email,
+                         your_email=your_email)
 
-    parsed_data = parse_email(msg, platform)
-    mail.logout()
+@bp.route("/precheck", methods=["GET", "POST"])
+def precheck():
+    """
+    Cheap JSON check, meant for polling, of whether the user's forward has
+    arrived and which platform it looks like, before /confirm runs the full
+    fetch and parse.
+    """
+    services = get_services()
+    user_email = request.values.get("user_email")
+    platform = request.values.get("platform")
+    if not user_email or not platform:
+        return jsonify({"error": "User email and platform must be provided."}), 400
+    if not get_platform_email(platform):
+        return jsonify({"error": "Invalid platform selected."}), 400
 
-    if not parsed_data:
-        logging.error("Failed to parse the forwarded email.")
+    shard = services.shards.for_user(user_email)
+    try:
+        with shard.pool.connection() as mail:
+            outcome = precheck_outcome(latest_forward(mail, user_email, shard.index), platform)
+    except Exception as e:
+        logging.error("Precheck failed for %s: %s", user_email, e)
+        outcome = dict(make_outcome(CONNECTION_ERROR, f"Failed to connect to email: {str(e)}"), ready=False)
+    metrics.inc("prechecks_total", platform=platform, status=outcome["status"])
+
+    response = dict(outcome, user_email=user_email, platform=platform, your_email=shard.email)
+    return jsonify(response), 503 if outcome["status"] == CONNECTION_ERROR else 200
+
+@bp.route("/status/<job_id>", methods=["GET"])
+def job_status(job_id):
+    services = get_services()
+    job = services.job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found."}), 404
+    return jsonify({
+        "job_id": job["id"],
+        "platform": job["platform"],
+        "state": job["state"],
+        "attempts": job["attempts"],
+        "outcome": job["outcome"] if job["state"] == DONE else None,
+        "result_url": url_for(".job_result", job_id=job_id)
+    })
+
+@bp.route("/result/<job_id>", methods=["GET"])
+def job_result(job_id):
+    services = get_services()
+    job = services.job_queue.get(job_id)
+    if not job:
         return render_template("index.html", 
-                             user_email=user_email,
-                             platform=platform,
-                             verification_result="Failed to parse the forwarded email.",
-                             expected_from_email=expected_from_email,
-                             your_email=EMAIL_ACCOUNT)
-
-    errors = []
-    if parsed_data["from_email"] != expected_from_email.lower():
-        errors.append(f"From email does not match. Expected: {expected_from_email}, Found: {parsed_data['from_email']}")
-
-    if parsed_data["to_email"] != user_email.lower():
-        errors.append(f"To email does not match. Expected: {user_email}, Found: {parsed_data['to_email']}")
-
-    for field in ["booking_id", "venue", "date_time", "event_name", "quantity"]:
-        if not parsed_data[field]:
-            errors.append(f"{field.replace('_', ' ').title()} not found in the email.")
+                             verification_result="Verification job not found.",
+                             expected_from_email=None,
+                             your_email=None), 404
 
-    if errors:
-        verification_result = "Verification failed:<br>" + "<br>".join(errors)
-        logging.info("Verification failed.")
-        return render_template("index.html", 
-                             user_email=user_email,
-                             platform=platform,
-                             verification_result=verification_result,
-                             expected_from_email=expected_from_email,
-                             your_email=EMAIL_ACCOUNT)
-    else:
-        verification_result = "Verification successful! All details are valid."
-        logging.info("Verification successful.")
-        return render_template("index.html", 
-                             user_email=user_email,
-                             platform=platform,
-                             verification_result=verification_result,
-                             validated_data=parsed_data,
-                             expected_from_email=expected_from_email,
-                             your_email=EMAIL_ACCOUNT)
+    outcome = job["outcome"] if job["state"] == DONE else None
+    return render_template("index.html", 
+                         user_email=job["user_email"],
+                         platform=job["platform"],
+                         job_id=job_id,
+                         verification_result=outcome["message"] if outcome else None,
+                         validated_data=outcome["data"] if outcome and outcome["status"] == VERIFIED else None,
+                         expected_from_email=get_platform_email(job["platform"]),
+                         your_email=services.shards.for_user(job["user_email"]).email)
+
+@bp.route("/batch-verify", methods=["GET", "POST"])
+def batch_verify():
+    services = get_services()
+    with services.batch_lock:
+        if request.method == "POST" and not services.batch_state["running"]:
+            if not services.batch_lease.acquire():
+                return jsonify(dict(services.batch_state, running_elsewhere=True)), 409
+            services.batch_state["running"] = True
+            threading.Thread(target=services.run_batch_in_background, name="batch-verify", daemon=True).start()
+            return jsonify(dict(services.batch_state)), 202
+        return jsonify(dict(services.batch_state))
+
+@bp.route("/housekeeping", methods=["GET", "POST"])
+def housekeeping():
+    """GET reports the last archive pass; POST starts one, a dry run with dry_run=1."""
+    services = get_services()
+    if request.method == "POST":
+        dry_run = request.values.get("dry_run", "").lower() in ("1", "true", "yes")
+        started = services.archive_scheduler.trigger(dry_run)
+        return jsonify(dict(services.archive_scheduler.snapshot(), started=started)), 202 if started else 409
+    return jsonify(services.archive_scheduler.snapshot())
 
-@app.route("/test-email-connection", methods=["GET"])
+@bp.route("/test-email-connection", methods=["GET"])
 def test_email_connection():
-    try:
-        mail = connect_to_email()
-        mail.logout()
-        return "Email connection successful!", 200
-    except Exception as e:
-        return f"Email connection failed: {e}", 500
+    services = get_services()
+    failures = []
+    for shard in services.shards.shards:
+        try:
+            with shard.pool.connection() as mail:
+                status, _ = mail.noop()
+            if status != "OK":
+                failures.append(f"{shard.email}: NOOP returned {status}")
+        except Exception as e:
+            failures.append(f"{shard.email}: {e}")
+    if failures:
+        return "Email connection failed: " + "; ".join(failures), 500
+    return "Email connection successful!", 200
+
+@bp.route("/pool-stats", methods=["GET"])
+def pool_stats():
+    services = get_services()
+    return jsonify({shard.email: shard.pool.stats() for shard in services.shards.shards})
+
+@bp.route("/shard-stats", methods=["GET"])
+def shard_stats():
+    services = get_services()
+    return jsonify(services.shards.stats())
+
+@bp.route("/startup-stats", methods=["GET"])
+def startup_stats():
+    return jsonify(get_services().startup_stats())
+
+@bp.route("/parser-stats", methods=["GET"])
+def parser_stats():
+    return jsonify(registry.stats.snapshot())
+
+@bp.route("/fetch-stats", methods=["GET"])
+def fetch_stats_route():
+    return jsonify(fetch_stats.snapshot())
+
+@bp.route("/result-cache-stats", methods=["GET"])
+def result_cache_stats():
+    services = get_services()
+    return jsonify(services.result_cache.stats())
+
+@bp.route("/metrics", methods=["GET"])
+def metrics_route():
+    services = get_services()
+    for shard in services.shards.shards:
+        pool = shard.pool.stats()
+        for name in ("size", "in_use", "idle"):
+            metrics.set_gauge(f"imap_pool_{name}", pool[name], account=shard.email)
+        metrics.set_gauge("imap_account_healthy", int(pool["healthy"]), account=shard.email)
+    metrics.set_gauge("log_records_dropped", dropped_records())
+    counts = services.job_queue.counts()
+    # Every state is set, so a state that empties drops to 0 instead of
+    # keeping its last count
+    for state in (QUEUED, RUNNING, RETRYING, DONE):
+        metrics.set_gauge("verification_jobs", counts.get(state, 0), state=state)
+    return metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4"}
+
+def create_app(warm_up=WARM_UP):
+    """
+    Build the app and its services. With warm_up, Services.warm_up() runs in
+    a background thread, so the app serves while connections are opened.
+    """
+    # Configure logging; records are written by a background thread
+    configure_logging()
+
+    start = time.perf_counter()
+    app = Flask(__name__)
+    services = Services()
+    app.extensions["ticket_verifier"] = services
+    app.register_blueprint(bp)
+    services.startup["create_seconds"] = round(time.perf_counter() - start, 4)
+
+    # Queued jobs, and those a dead process left running, run from the start;
+    # scheduled archive passes run whether or not anyone ever submits /confirm
+    services.job_queue.start()
+    if ARCHIVE_INTERVAL > 0:
+        services.archive_scheduler.ensure_started()
+
+    if warm_up:
+        threading.Thread(target=services.warm_up, name="warm-up", daemon=True).start()
+    return app
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,287 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from metrics import Trace, current_trace, finish_trace, metrics, span
+from verification import (CONNECTION_ERROR, MESSAGE_OUTCOMES, NO_EMAIL, OVERLOADED, TIMED_OUT, claim_ticket,
+                          make_outcome, stored_outcome, verify_message)
+
+# Users and platforms whose last evaluated message is remembered
+MAX_EVALUATED = 10000
+
+
+class AsyncVerifier:
+    """
+    Runs verifications as coroutines on a background event loop.
+
+    A verification only holds a pooled IMAP connection (and an executor
+    thread) while it searches or fetches; waiting for the forwarded mail to
+    arrive is an asyncio wait woken by the inbox watcher. Many verifications
+    therefore share the few connections in the pool. At most max_pending
+    verifications run at once; further requests wait up to queue_timeout
+    for a slot and are then rejected. Each verification has a deadline.
+
+    search(mail, user_email, skip_body=...) returns the user's latest forward.
+    With a ticket store, verified tickets are claimed so a booking cannot be
+    verified by two users, and skip_body(headers) tells search that the
+    message is one the user already claimed for the platform. Its body is
+    then not fetched, and the outcome comes from the store.
+
+    probe(mail, user_email) returns the (UIDVALIDITY, UID) of the user's
+    newest message. The last message evaluated for each user and platform is
+    remembered. With resubmit_wait, a request for which it is still the
+    newest first waits up to resubmit_wait seconds for a newer one, in case
+    another forward is on its way; by default it is answered at once. That
+    wait and the wait for a forward to arrive share one arrival_timeout. With a
+    result cache, outcomes decided by a message are cached under it.
+
+    Each verification is traced: stage timings go to the metrics registry
+    and, with trace_logging, are logged once the verification finishes.
+    """
+
+    def __init__(self, pool, watcher, search, arrival_timeout=15, poll_interval=2,
+                 max_pending=100, queue_timeout=5, deadline=30, idle_enabled=True, tickets=None,
+                 trace_logging=False, results=None, probe=None, resubmit_wait=0):
+        self.pool = pool
+        self.watcher = watcher
+        self.search = search
+        self.arrival_timeout = arrival_timeout
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.idle_enabled = idle_enabled
+        self.tickets = tickets
+        self.trace_logging = trace_logging
+        self.results = results
+        self.probe = probe
+        self.resubmit_wait = resubmit_wait
+
+        self.loop = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._slots = None
+        self._waiters = {}
+        # (user, platform) -> result key of the last message evaluated for them
+        self._evaluated = OrderedDict()
+        # One I/O thread per pooled connection, so threads never queue on the pool
+        self._io_executor = ThreadPoolExecutor(max_workers=pool.max_size, thread_name_prefix="imap-io")
+        watcher.add_listener(self._on_arrivals)
+
+    def ensure_started(self):
+        """Start the event loop thread if it is not already running."""
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run_loop, args=(ready,),
+                                            name="async-verifier", daemon=True)
+            self._thread.start()
+            ready.wait()
+
+    def _run_loop(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._slots = asyncio.Semaphore(self.max_pending)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+    def submit(self, user_email, platform):
+        """Start a verification from a synchronous caller; returns a concurrent.futures.Future of its outcome."""
+        self.ensure_started()
+        return asyncio.run_coroutine_threadsafe(self.verify_async(user_email, platform), self.loop)
+
+    async def verify_async(self, user_email, platform):
+        """Verify the latest forward from user_email, honoring backpressure and the deadline."""
+        trace = Trace(user_email, platform)
+        current_trace.set(trace)
+        outcome = await self._verify_with_limits(user_email, platform)
+        finish_trace(trace, outcome["status"], self.trace_logging)
+        return outcome
+
+    async def _verify_with_limits(self, user_email, platform):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Too many verifications in progress; rejecting request.")
+            return make_outcome(OVERLOADED, "Too many verifications in progress. Please try again shortly.")
+        try:
+            return await asyncio.wait_for(self._verify(user_email, platform), self.deadline)
+        except asyncio.TimeoutError:
+            logging.warning("Verification for %s exceeded its %ss deadline.", user_email, self.deadline)
+            return make_outcome(TIMED_OUT, "Verification timed out. Please try again.")
+        finally:
+            self._slots.release()
+
+    async def _verify(self, user_email, platform):
+        # Every wait for mail in this verification comes out of one arrival_timeout
+        arrival_deadline = time.monotonic() + self.arrival_timeout
+        key = None
+        if self.probe is not None:
+            key = await self._run_in_executor(self._io_executor, self._result_key, user_email, platform)
+            if key and self.resubmit_wait > 0 and self._evaluated.get(key[:2]) == key:
+                # Already evaluated; give a forward that may be on its way a chance to land
+                wait = min(self.resubmit_wait, self.arrival_timeout)
+                key = await self.wait_for_newer_message(user_email, platform, key, wait) or key
+        if self.results is not None:
+            cached = self.results.get(key) if key else None
+            metrics.inc("result_cache_lookups_total", result="hit" if cached else "miss")
+            if cached:
+                return cached
+
+        outcome = await self._verify_latest(user_email, platform, arrival_deadline - time.monotonic())
+        if outcome["status"] in MESSAGE_OUTCOMES and self.probe is not None:
+            if not key:
+                # The message arrived while waiting; note which one was evaluated
+                key = await self._run_in_executor(self._io_executor, self._result_key, user_email, platform)
+            if key:
+                self._remember_evaluated(key)
+                if self.results is not None:
+                    self.results.put(key, outcome)
+        return outcome
+
+    def _remember_evaluated(self, key):
+        # Runs on the event loop thread only
+        self._evaluated[key[:2]] = key
+        self._evaluated.move_to_end(key[:2])
+        while len(self._evaluated) > MAX_EVALUATED:
+            self._evaluated.popitem(last=False)
+
+    def _result_key(self, user_email, platform):
+        try:
+            with span("cache_probe"):
+                with self.pool.connection() as mail:
+                    latest = self.probe(mail, user_email)
+        except Exception as e:
+            logging.warning("Result cache probe failed: %s", e)
+            return None
+        return (user_email.lower(), platform) + latest if latest else None
+
+    def _claimed_ticket(self, msg, user_email, platform):
+        """The ticket user_email claimed for platform with msg, or None."""
+        if self.tickets is None:
+            return None
+        ticket = self.tickets.lookup_message(msg.get("Message-ID"))
+        if ticket and ticket["user_email"] == user_email.lower() and ticket["platform"] == platform:
+            return ticket
+        # Unclaimed, or claimed by someone else: the full verification decides
+        return None
+
+    async def _verify_latest(self, user_email, platform, timeout=None):
+        try:
+            msg = await self.wait_for_forwarded_email(user_email, timeout, platform)
+        except Exception as e:
+            logging.error("Failed to connect to email: %s", e)
+            return make_outcome(CONNECTION_ERROR, f"Failed to connect to email: {str(e)}")
+
+        if not msg:
+            logging.warning("No forwarded email found for user: %s", user_email)
+            return make_outcome(NO_EMAIL, "No forwarded email found. Please ensure you have forwarded the email correctly.")
+
+        # Parsing is CPU-bound; keep it off the event loop
+        return await self._run_in_executor(None, self._verify_message, msg, user_email, platform)
+
+    def _verify_message(self, msg, user_email, platform):
+        ticket = self._claimed_ticket(msg, user_email, platform)
+        if ticket:
+            return stored_outcome(ticket)
+        outcome = verify_message(msg, user_email, platform)
+        if self.tickets is not None:
+            outcome = claim_ticket(self.tickets, outcome, user_email, platform)
+        return outcome
+
+    def _run_in_executor(self, executor, func, *args):
+        # Executor threads do not inherit the task's context; carry the trace along
+        context = contextvars.copy_context()
+        return self.loop.run_in_executor(executor, functools.partial(context.run, func, *args))
+
+    def _search_with_connection(self, user_email, platform):
+        skip_body = None
+        if platform and self.tickets is not None:
+            skip_body = functools.partial(self._claimed_ticket, user_email=user_email, platform=platform)
+        with ExitStack() as stack:
+            with span("pool_checkout"):
+                mail = stack.enter_context(self.pool.connection())
+            return self.search(mail, user_email, skip_body=skip_body)
+
+    async def _search(self, user_email, platform):
+        return await self._run_in_executor(self._io_executor, self._search_with_connection, user_email, platform)
+
+    async def wait_for_forwarded_email(self, user_email, timeout=None, platform=None):
+        """
+        Return the latest forwarded email from user_email, waiting up to
+        timeout (by default arrival_timeout) seconds for it to arrive without
+        holding a connection. With platform, a message the user already
+        claimed for it comes back as its headers only.
+        """
+        timeout = self.arrival_timeout if timeout is None else timeout
+        return await self._wait_for_arrival(user_email, functools.partial(self._search, user_email, platform),
+                                            timeout)
+
+    async def wait_for_newer_message(self, user_email, platform, key, timeout):
+        """
+        Return the result key of a message from user_email newer than the one
+        under key, waiting up to timeout seconds for it, or None.
+        """
+        async def newer():
+            latest = await self._run_in_executor(self._io_executor, self._result_key, user_email, platform)
+            return latest if latest and latest != key else None
+
+        return await self._wait_for_arrival(user_email, newer, timeout)
+
+    async def _wait_for_arrival(self, user_email, check, timeout):
+        """
+        Await check() until it returns something, re-checking whenever the
+        watcher sees mail from user_email, for up to timeout seconds.
+        Returns the last result of check().
+        """
+        if self.idle_enabled:
+            self.watcher.ensure_started()
+        sender = user_email.lower()
+        deadline = time.monotonic() + timeout
+
+        while True:
+            # Register before checking so an arrival during the check is not missed
+            arrived = asyncio.Event()
+            self._waiters.setdefault(sender, set()).add(arrived)
+            try:
+                result = await check()
+                if result:
+                    return result
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return result
+                wait = remaining if self.watcher.is_running() else min(self.poll_interval, remaining)
+                try:
+                    with span("arrival_wait"):
+                        await asyncio.wait_for(arrived.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                waiters = self._waiters.get(sender)
+                if waiters is not None:
+                    waiters.discard(arrived)
+                    if not waiters:
+                        del self._waiters[sender]
+
+    def _on_arrivals(self, arrivals):
+        # Called from the watcher thread
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._wake_waiters, arrivals)
+
+    def _wake_waiters(self, arrivals):
+        if not arrivals:
+            # Watcher started or stopped; let every waiter re-check
+            for waiters in self._waiters.values():
+                for arrived in waiters:
+                    arrived.set()
+            return
+        for _, sender in arrivals:
+            for arrived in self._waiters.get(sender, ()):
+                arrived.set()
@@ -0,0 +1,258 @@
+import argparse
+import email
+import json
+import logging
+import multiprocessing
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import parseaddr
+
+from config import (BATCH_FETCH_BYTES, BATCH_FETCH_SIZE, BATCH_RESULTS_PATH, BATCH_WORKERS, EMAIL_ACCOUNTS, MIME_MAX_MESSAGE_BYTES,
+                    TICKET_STORE_PATH)
+from mailbox_index import decode_subject
+from mime_stream import parse_first_text_part
+from parsers import detect_platform
+from sharding import shard_path
+from ticket_store import TicketStore
+from verification import UNKNOWN_PLATFORM, claim_ticket, make_outcome, verify_message
+
+UID_RE = re.compile(rb"UID (\d+)", re.IGNORECASE)
+STATUS_RE = re.compile(rb"UIDVALIDITY (\d+)", re.IGNORECASE)
+SIZE_RE = re.compile(rb"RFC822\.SIZE (\d+)", re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batch_checkpoints (
+    mailbox TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    last_uid INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_results (
+    mailbox TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    user_email TEXT,
+    platform TEXT,
+    status TEXT NOT NULL,
+    message TEXT,
+    data TEXT,
+    verified_at REAL NOT NULL,
+    PRIMARY KEY (mailbox, uidvalidity, uid)
+);
+"""
+
+
+class BatchResultStore:
+    """SQLite store of batch verification results and per-mailbox checkpoints."""
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def checkpoint(self, mailbox, uidvalidity):
+        """Last UID swept in mailbox, or 0 if UIDVALIDITY changed since then."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT uidvalidity, last_uid FROM batch_checkpoints WHERE mailbox = ?", (mailbox,)
+            ).fetchone()
+        if row is None or row[0] != uidvalidity:
+            return 0
+        return row[1]
+
+    def save(self, mailbox, uidvalidity, results, last_uid):
+        """Store results [(uid, user_email, platform, outcome)] and advance the checkpoint."""
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO batch_results "
+                "(mailbox, uidvalidity, uid, user_email, platform, status, message, data, verified_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(mailbox, uidvalidity, uid, user_email, platform, outcome["status"], outcome["message"],
+                  json.dumps(outcome["data"]) if outcome["data"] else None, now)
+                 for uid, user_email, platform, outcome in results]
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO batch_checkpoints (mailbox, uidvalidity, last_uid) VALUES (?, ?, ?)",
+                (mailbox, uidvalidity, last_uid)
+            )
+            self._db.commit()
+
+
+def verify_raw_message(uid, raw):
+    """
+    Verify one forwarded message against its outer From address and the
+    detected platform. Runs in a worker process. Only the headers and the
+    first text part are parsed; attachments are skipped unread.
+    """
+    msg, _ = parse_first_text_part(raw)
+    user_email = parseaddr(msg.get("From", ""))[1].lower()
+    platform = detect_platform(msg)
+    if not platform:
+        return uid, user_email, None, make_outcome(UNKNOWN_PLATFORM, "Could not detect the ticket platform.")
+    return uid, user_email, platform, verify_message(msg, user_email, platform)
+
+
+def _fetch(mail, uids, items):
+    """UID FETCH items for uids in one command; returns {uid: (response line, literal bytes)}."""
+    status, data = mail.uid("FETCH", b",".join(uids), items)
+    if status != "OK":
+        raise RuntimeError(f"FETCH {items} failed")
+    fetched = {}
+    for item in data:
+        if isinstance(item, tuple):
+            match = UID_RE.search(item[0])
+            if match:
+                fetched[match.group(1)] = item
+    return fetched
+
+
+def find_forwards(mail, uids):
+    """
+    [(uid, bytes to fetch)] of the messages among uids whose subject contains
+    "Fwd:", from one header FETCH. A body is cut at MIME_MAX_MESSAGE_BYTES,
+    so no more than that is counted for it.
+    """
+    fetched = _fetch(mail, uids, "(UID RFC822.SIZE BODY.PEEK[HEADER.FIELDS (SUBJECT)])")
+    forwards = []
+    for uid in uids:
+        if uid not in fetched:
+            continue
+        line, headers = fetched[uid]
+        if "Fwd:" not in decode_subject(email.message_from_bytes(headers).get("Subject")):
+            continue
+        match = SIZE_RE.search(line)
+        size = int(match.group(1)) if match else MIME_MAX_MESSAGE_BYTES
+        forwards.append((uid, min(size, MIME_MAX_MESSAGE_BYTES)))
+    return forwards
+
+
+def byte_batches(forwards, max_bytes):
+    """Split [(uid, size)] into lists of UIDs totalling at most max_bytes, or one message each if larger."""
+    batch, batch_bytes = [], 0
+    for uid, size in forwards:
+        if batch and batch_bytes + size > max_bytes:
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(uid)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+
+def fetch_bodies(mail, uids):
+    """Raw messages for uids from one FETCH, each cut at MIME_MAX_MESSAGE_BYTES; {uid: bytes}."""
+    fetched = _fetch(mail, uids, f"(UID BODY.PEEK[]<0.{MIME_MAX_MESSAGE_BYTES}>)")
+    return {uid: item[1] for uid, item in fetched.items()}
+
+
+def run_batch(mail, store, mailbox="inbox", since_uid=None, batch_size=BATCH_FETCH_SIZE, workers=BATCH_WORKERS,
+              tickets=None, fetch_bytes=BATCH_FETCH_BYTES):
+    """
+    Verify every unseen forward in mailbox above the checkpoint UID (or
+    since_uid), store the results and return a throughput report. Subjects
+    are fetched batch_size messages at a time and forwards in batches of up
+    to fetch_bytes. Each batch is fetched while the one before it is parsed
+    in worker processes; the results of the batch before that are collected
+    first, so no more than two batches are held in memory. Verified tickets
+    are claimed in tickets, if given, in UID order.
+    """
+    start = time.perf_counter()
+    mail.select(mailbox, readonly=True)
+    status, data = mail.status(mailbox, "(UIDVALIDITY)")
+    if status != "OK":
+        raise RuntimeError(f"STATUS failed for mailbox {mailbox}")
+    uidvalidity = int(STATUS_RE.search(data[0]).group(1))
+    since = store.checkpoint(mailbox, uidvalidity) if since_uid is None else since_uid
+
+    status, data = mail.uid("SEARCH", None, f"UNSEEN UID {since + 1}:*")
+    if status != "OK":
+        raise RuntimeError("UID SEARCH failed")
+    # "UID n:*" always matches the newest message, even if it is older than n
+    uids = [uid for uid in data[0].split() if int(uid) > since]
+
+    fetch_seconds = 0.0
+    forwards = 0
+    results = []
+    # Spawned, not forked: run from the app, a forked child would inherit locks
+    # held by its other threads (logging, metrics) and could deadlock
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = deque()
+
+        def collect(futures):
+            for future in futures:
+                uid, user_email, platform, outcome = future.result()
+                if tickets is not None:
+                    outcome = claim_ticket(tickets, outcome, user_email, platform)
+                results.append((uid, user_email, platform, outcome))
+
+        for i in range(0, len(uids), batch_size):
+            fetch_start = time.perf_counter()
+            found = find_forwards(mail, uids[i:i + batch_size])
+            fetch_seconds += time.perf_counter() - fetch_start
+            for batch in byte_batches(found, fetch_bytes):
+                if len(pending) > 1:
+                    collect(pending.popleft())
+                fetch_start = time.perf_counter()
+                raw_messages = fetch_bodies(mail, batch)
+                fetch_seconds += time.perf_counter() - fetch_start
+                forwards += len(raw_messages)
+                pending.append([executor.submit(verify_raw_message, int(uid), raw)
+                                for uid, raw in raw_messages.items()])
+        while pending:
+            collect(pending.popleft())
+
+    last_uid = max((int(uid) for uid in uids), default=since)
+    store.save(mailbox, uidvalidity, results, last_uid)
+
+    elapsed = time.perf_counter() - start
+    statuses = {}
+    for _, _, _, outcome in results:
+        statuses[outcome["status"]] = statuses.get(outcome["status"], 0) + 1
+    report = {
+        "mailbox": mailbox,
+        "since_uid": since,
+        "last_uid": last_uid,
+        "scanned": len(uids),
+        "forwards": forwards,
+        "outcomes": statuses,
+        "fetch_seconds": round(fetch_seconds, 3),
+        "total_seconds": round(elapsed, 3),
+        "messages_per_second": round(len(uids) / elapsed, 1) if elapsed else 0.0,
+    }
+    logging.info("Batch verification report: %s", report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify all pending forwarded emails in one sweep.")
+    parser.add_argument("--mailbox", default="inbox")
+    parser.add_argument("--since", type=int, default=None, help="Start after this UID instead of the checkpoint.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_FETCH_SIZE)
+    parser.add_argument("--fetch-bytes", type=int, default=BATCH_FETCH_BYTES)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    args = parser.parse_args()
+
+    from imap_client import connect_to_email
+    from log_config import configure_logging
+
+    configure_logging()
+    tickets = TicketStore(TICKET_STORE_PATH)
+    report = {}
+    for number, account in enumerate(EMAIL_ACCOUNTS, 1):
+        mail = connect_to_email(account=account)
+        try:
+            report[account["email"]] = run_batch(mail, BatchResultStore(shard_path(BATCH_RESULTS_PATH, number)),
+                                                 args.mailbox, args.since, args.batch_size, args.workers, tickets,
+                                                 args.fetch_bytes)
+        finally:
+            mail.logout()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# benchmarks/bench_confirm.py
+#
+# End-to-end benchmark of the /confirm flow against the in-process IMAP
+# server in benchmarks.fake_imap. Each request posts /confirm for a new
+# user, then polls /status until the job is done. With --arrival-delay the
+# forwarded email is delivered that many seconds after the request is
+# queued, exercising the IDLE wake-up path; otherwise the inbox is
+# preloaded. With --accounts N, N receiving accounts are configured, each
+# served by its own server, and every email is delivered to the account its
+# user is sharded to. State files go to a temporary directory.
+# Run from the repository root: python -m benchmarks.bench_confirm
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import make_msgid
+
+from benchmarks.fake_imap import FakeIMAPServer
+from benchmarks.samples import INBOX_EMAIL, PLATFORMS, forwarded_message
+
+
+def account_email(number):
+    return INBOX_EMAIL if number == 1 else INBOX_EMAIL.replace("@", f"+{number}@")
+
+
+def configure_environment(state_dir, accounts=1):
+    """Point the app's settings at state_dir; must run before app is imported."""
+    for number in range(2, accounts + 1):
+        os.environ.update({
+            f"EMAIL_ACCOUNT_{number}": account_email(number),
+            f"EMAIL_PASSWORD_{number}": "bench",
+        })
+    os.environ.update({
+        "EMAIL_ACCOUNT": INBOX_EMAIL,
+        "EMAIL_PASSWORD": "bench",
+        "IMAP_SERVER": "127.0.0.1",
+        "MAILBOX_INDEX_PATH": os.path.join(state_dir, "mailbox_index.sqlite3"),
+        "JOB_QUEUE_PATH": os.path.join(state_dir, "jobs.sqlite3"),
+        "BATCH_RESULTS_PATH": os.path.join(state_dir, "batch_results.sqlite3"),
+        "TICKET_STORE_PATH": os.path.join(state_dir, "tickets.sqlite3"),
+    })
+
+
+def ticket_for(i, padding):
+    platform = PLATFORMS[i % len(PLATFORMS)]
+    user_email = f"user{i}@example.com"
+    msg = forwarded_message(platform, user_email, padding=padding, booking_id=f"BENCH{i:06d}",
+                            message_id=make_msgid(domain="bench.example.com"))
+    return user_email, platform, msg
+
+
+def confirm(client, deliver, user_email, platform, msg, arrival_delay, poll_interval=0.005):
+    """Post /confirm and poll /status; returns (latency in seconds, outcome status)."""
+    start = time.perf_counter()
+    response = client.post("/confirm", data={"user_email": user_email, "platform": platform},
+                           headers={"Accept": "application/json"})
+    body = response.get_json()
+    if arrival_delay is not None:
+        threading.Timer(arrival_delay, deliver, args=(user_email, msg)).start()
+    if body.get("outcome"):
+        return time.perf_counter() - start, body["outcome"]["status"]
+
+    while True:
+        status = client.get(body["status_url"]).get_json()
+        if status["outcome"]:
+            return time.perf_counter() - start, status["outcome"]["status"]
+        time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /confirm end to end against a local IMAP server.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--padding", type=int, default=2000, help="Filler characters per forwarded email.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated IMAP round-trip time in seconds.")
+    parser.add_argument("--arrival-delay", type=float, default=None,
+                        help="Deliver each email this long after its request instead of preloading.")
+    parser.add_argument("--no-idle", action="store_true", help="Serve without IDLE so requests poll.")
+    parser.add_argument("--accounts", type=int, default=1, help="Receiving accounts to shard users over.")
+    args = parser.parse_args()
+
+    state_dir = tempfile.mkdtemp(prefix="bench-confirm-")
+    configure_environment(state_dir, args.accounts)
+    servers = {account_email(number): FakeIMAPServer(latency=args.latency, idle=not args.no_idle).start()
+               for number in range(1, args.accounts + 1)}
+
+    # Imported only now: config reads the environment on first import
+    from app import create_app, fetch_stats
+    from benchmarks.bench_parsers import percentile
+
+    app = create_app(warm_up=False)
+    services = app.extensions["ticket_verifier"]
+    logging.getLogger().setLevel(logging.WARNING)
+    for shard in services.shards.shards:
+        shard.pool.factory = shard.watcher.factory = servers[shard.email].connect
+
+    def deliver(user_email, msg):
+        servers[services.shards.for_user(user_email).email].append(msg)
+
+    tickets = [ticket_for(i, args.padding) for i in range(args.requests)]
+    if args.arrival_delay is None:
+        for user_email, _, msg in tickets:
+            deliver(user_email, msg)
+
+    local = threading.local()
+
+    def run(ticket):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        user_email, platform, msg = ticket
+        return confirm(local.client, deliver, user_email, platform, msg, args.arrival_delay)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(run, tickets))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for latency, _ in results]
+    outcomes = {}
+    for _, status in results:
+        outcomes[status] = outcomes.get(status, 0) + 1
+    pools = {shard.email: shard.pool.stats() for shard in services.shards.shards}
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "requests_per_second": round(args.requests / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1),
+        },
+        "outcomes": outcomes,
+        "accounts": {
+            email: {
+                "imap_commands": dict(server.commands),
+                "imap_bytes_sent": server.bytes_sent,
+                "users": sum(services.shards.for_user(user_email).email == email for user_email, _, _ in tickets),
+                "pool": pools[email],
+            }
+            for email, server in servers.items()
+        },
+        "fetch": fetch_stats.snapshot(),
+    }
+    print(json.dumps(report, indent=2))
+
+    services.job_queue.stop()
+    for server in servers.values():
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_extraction.py
+#
+# Compares the precompiled extraction specs against the inline re.search
+# calls the platform parsers used before, per message and per platform.
+# Run from the repository root: python -m benchmarks.bench_extraction
+
+import re
+import time
+
+from benchmarks.samples import PLATFORMS, forwarded_body
+from extraction import PLATFORM_SPECS
+
+EMAIL = r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"
+
+LEGACY_PATTERNS = {
+    "bookmyshow": {
+        "booking_id": (r"BOOKING ID[:\s]+(\w+)", re.IGNORECASE),
+        "venue": (r'Venue\s+Directions.*?<.*?>.*?\n\s*([^\n<]+)', re.DOTALL | re.IGNORECASE),
+        "date_time": (r'Date\s*&\s*Time\s*\n\s*([^|]+\|[^<\n]+)', re.IGNORECASE),
+        "quantity": (r'Category\s+Quantity\s+Price.*?\n.*?\n(\d+)', re.DOTALL | re.IGNORECASE),
+        "event_name": (r'Subject:.*?Booking confirmed for\s+(.*?)\n', re.IGNORECASE | re.DOTALL),
+    },
+    "zomato": {
+        "booking_id": (r"Ticket ID[:\s]+(\w+)", re.IGNORECASE),
+        "event_name": (r"You just scored tickets to\s+(.*?)(?:\n|$)", re.IGNORECASE),
+        "date_time": (r"(\w+,\s+\w+\s+\d+,\s+\d{4})", 0),
+        "quantity": (r"RSVP x\s*(\d+)", re.IGNORECASE),
+    },
+    "paytminsider": {
+        "booking_id": (r"transaction reference\s*(\w+)", re.IGNORECASE),
+        "venue": (r"Venue\s*\n([^\n]+(?:\n[^\n]+)*)\nGet Directions", re.IGNORECASE),
+        "date": (r"Date\s*\n([^\n]+)", re.IGNORECASE),
+        "time": (r"Time\s*\n([^\n]+)", re.IGNORECASE),
+        "event_name": (r"Music\s*\n([^\n]+)", re.IGNORECASE),
+        "quantity": (r"(\d+)\s*Ticket", re.IGNORECASE),
+    },
+    "dice": {
+        "event_name": (r"you are going\s*(.*?)(?:View tickets|Venue details|<https?://)", re.IGNORECASE | re.DOTALL),
+        "venue": (r"Venue\s*[:\s]*(.*?)(?=\s*<|$)", re.IGNORECASE),
+        "date_time": (r"Date & time\s*(.*?)(?:\n|Doors)", re.IGNORECASE),
+        "quantity": (r"Tickets\s*(\d+).*?Group\s+of\s*(\d+)", re.IGNORECASE),
+        "booking_id": (r"dice_id=([A-Za-z0-9]+)", re.IGNORECASE),
+    },
+}
+
+
+def legacy_extract(platform, text):
+    """The per-field re.search calls the parsers made before the specs existed."""
+    results = {}
+    for name, field_name in (("from_email", "From:"), ("to_email", "To:")):
+        match = re.search(fr"{re.escape(field_name)}.*?{EMAIL}", text, re.IGNORECASE | re.DOTALL)
+        results[name] = match.group(1) if match else None
+    for name, (pattern, flags) in LEGACY_PATTERNS[platform].items():
+        match = re.search(pattern, text, flags)
+        results[name] = match.group(1) if match else None
+    return results
+
+
+def time_per_call(func, *args, repeat=2000):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    print(f"{'platform':<14}{'size':>9}{'legacy us':>12}{'spec us':>10}{'speedup':>9}  same")
+    for padding in (0, 20_000, 200_000):
+        repeat = 2000 if padding < 100_000 else 50
+        for platform in PLATFORMS:
+            text = forwarded_body(platform, padding=padding)
+            spec = PLATFORM_SPECS[platform]
+            same = legacy_extract(platform, text) == spec.extract(text)
+            legacy = time_per_call(legacy_extract, platform, text, repeat=repeat)
+            compiled = time_per_call(spec.extract, text, repeat=repeat)
+            print(f"{platform:<14}{len(text):>9}{legacy * 1e6:>12.1f}{compiled * 1e6:>10.1f}"
+                  f"{legacy / compiled:>8.1f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
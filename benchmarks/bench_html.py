@@ -0,0 +1,71 @@
+# benchmarks/bench_html.py
+#
+# Compares the HTML fallback with the regex path. For every platform and
+# body size it times the regex spec on the plain-text sample, rendering the
+# HTML sample to text, and the CSS-selector spec on the HTML sample with
+# each available parser backend, with and without the SoupStrainer. Also
+# checks that HTML-only forwards parse to the same fields as plain ones and
+# exits non-zero if any differ.
+# Run from the repository root: python -m benchmarks.bench_html
+
+import importlib.util
+import sys
+
+from bs4 import BeautifulSoup
+
+from benchmarks.bench_extraction import time_per_call
+from benchmarks.samples import PLATFORMS, forwarded_body, forwarded_html_body, forwarded_message
+from extraction import PLATFORM_SPECS
+from html_extraction import HTML_SPECS
+from parsers import parse_email
+
+BACKENDS = ["html.parser"] + (["lxml"] if importlib.util.find_spec("lxml") else [])
+
+
+def unstrained_extract(spec, html, backend):
+    """The selector spec over a tree of the whole document."""
+    soup = BeautifulSoup(html, backend)
+    return {field.name: field.extract(soup) for field in spec.fields}
+
+
+def check_html_forwards():
+    """[(platform, padding, plain fields, HTML fields)] for HTML-only forwards that parse differently."""
+    problems = []
+    for platform in PLATFORMS:
+        for padding in (0, 200_000):
+            plain = parse_email(forwarded_message(platform, padding=padding), platform)
+            html = parse_email(forwarded_message(platform, padding=padding, html_only=True), platform)
+            if plain != html:
+                problems.append((platform, padding, plain, html))
+    return problems
+
+
+def main():
+    columns = ["regex", "to_text"] + [f"{backend}{mode}" for backend in BACKENDS for mode in ("", "+strain")]
+    print(f"{'platform':<14}{'html size':>10}" + "".join(f"{column + ' us':>22}" for column in columns))
+    for padding in (0, 20_000, 200_000):
+        repeat = 100 if padding < 100_000 else 3
+        for platform in PLATFORMS:
+            text = forwarded_body(platform, padding=padding)
+            html = forwarded_html_body(platform, padding=padding)
+            spec = HTML_SPECS[platform]
+            timings = [
+                time_per_call(PLATFORM_SPECS[platform].extract, text, repeat=repeat),
+                time_per_call(lambda: BeautifulSoup(html, BACKENDS[-1]).get_text("\n"), repeat=repeat),
+            ]
+            for backend in BACKENDS:
+                timings.append(time_per_call(unstrained_extract, spec, html, backend, repeat=repeat))
+                timings.append(time_per_call(spec.extract, html, backend, repeat=repeat))
+            print(f"{platform:<14}{len(html):>10}" + "".join(f"{timing * 1e6:>22.1f}" for timing in timings))
+
+    problems = check_html_forwards()
+    if problems:
+        print(f"\n{len(problems)} HTML-only forwards parsed differently:")
+        for platform, padding, plain, html in problems:
+            print(f"  {platform} padding={padding}: plain {plain}, HTML {html}")
+        sys.exit(1)
+    print("\nHTML-only forwards parsed the same as plain-text ones.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/bench_parsers.py
+#
+# Regression corpus and benchmark for parse_email. Builds synthetic
+# forwarded emails for every platform at several body and attachment
+# sizes, checks that each parses to the same fields as the plain sample,
+# and reports throughput, latency percentiles and peak memory per parse.
+# Exits non-zero if any message parses differently.
+# Run from the repository root: python -m benchmarks.bench_parsers
+
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmarks.samples import BODIES, PLATFORMS, forwarded_message
+from parsers import parse_email
+
+# (body padding in characters, attachment size in bytes)
+SIZES = [(0, 0), (20_000, 0), (200_000, 0), (0, 1_000_000), (200_000, 1_000_000)]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def build_corpus(sizes=SIZES):
+    """[(platform, padding, attachment_size, message)] for every platform and size."""
+    return [(platform, padding, attachment_size, forwarded_message(platform, padding=padding,
+                                                                   attachment_size=attachment_size))
+            for platform in PLATFORMS for padding, attachment_size in sizes]
+
+
+def check_corpus(corpus):
+    """
+    Parse every message and compare it with the unpadded sample of its
+    platform. Returns a list of (platform, padding, attachment_size, problem).
+    """
+    expected = {platform: parse_email(forwarded_message(platform), platform) for platform in PLATFORMS}
+    problems = []
+    for platform, padding, attachment_size, msg in corpus:
+        if not expected[platform] or expected[platform]["booking_id"] != BODIES[platform]["booking_id"]:
+            problems.append((platform, 0, 0, f"sample parsed as {expected[platform]}"))
+            continue
+        parsed = parse_email(msg, platform)
+        if parsed != expected[platform]:
+            problems.append((platform, padding, attachment_size, f"parsed as {parsed}"))
+    return problems
+
+
+def measure(msg, platform, repeat):
+    """Latencies in seconds for repeat parses of msg, and the peak bytes allocated by one parse."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse_email(msg, platform)
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse_email(msg, platform)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return latencies, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the platform parsers.")
+    parser.add_argument("--repeat", type=int, default=200, help="Parses per message (fewer for large ones).")
+    args = parser.parse_args()
+
+    corpus = build_corpus()
+    problems = check_corpus(corpus)
+
+    print(f"{'platform':<14}{'padding':>9}{'attach':>9}{'msg/s':>10}{'p50 us':>10}{'p95 us':>10}"
+          f"{'p99 us':>10}{'peak KiB':>10}")
+    for platform, padding, attachment_size, msg in corpus:
+        repeat = args.repeat if padding + attachment_size < 100_000 else max(args.repeat // 10, 5)
+        latencies, peak = measure(msg, platform, repeat)
+        print(f"{platform:<14}{padding:>9}{attachment_size:>9}{1 / statistics.mean(latencies):>10.0f}"
+              f"{percentile(latencies, 50) * 1e6:>10.1f}{percentile(latencies, 95) * 1e6:>10.1f}"
+              f"{percentile(latencies, 99) * 1e6:>10.1f}{peak / 1024:>10.1f}")
+
+    if problems:
+        print(f"\n{len(problems)} parse regressions:")
+        for platform, padding, attachment_size, problem in problems:
+            print(f"  {platform} padding={padding} attachment={attachment_size}: {problem}")
+        sys.exit(1)
+    print(f"\nAll {len(corpus)} corpus messages parsed as expected.")
+
+
+if __name__ == "__main__":
+    main()
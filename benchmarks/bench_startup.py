@@ -0,0 +1,119 @@
+# benchmarks/bench_startup.py
+#
+# Cold-start timings of the app. Every run is a fresh interpreter with empty
+# state files, like a new container: it imports app, calls create_app(),
+# then serves the first page, the first precheck and the first verification
+# against an in-process fake IMAP server holding --messages messages. Runs
+# are repeated without and with warm-up (run to completion before the first
+# request) and the median of every stage is reported, along with whether
+# bs4 had been imported before the first verification.
+# Run from the repository root: python -m benchmarks.bench_startup
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+USER_EMAIL = "user0@example.com"
+STAGES = ["import", "create_app", "warm_up", "first_page", "first_precheck", "first_verify"]
+
+
+def child(warm_up, messages, latency):
+    """Time one cold start and print the timings as JSON."""
+    start = time.perf_counter()
+    from app import create_app
+    timings = {"import": time.perf_counter() - start}
+
+    start = time.perf_counter()
+    app = create_app(warm_up=False)
+    timings["create_app"] = time.perf_counter() - start
+    services = app.extensions["ticket_verifier"]
+
+    from email.message import EmailMessage
+
+    from benchmarks.fake_imap import FakeIMAPServer
+    from benchmarks.samples import forwarded_message
+
+    server = FakeIMAPServer(latency=latency).start()
+    for shard in services.shards.shards:
+        shard.pool.factory = shard.watcher.factory = server.connect
+    for i in range(messages):
+        msg = EmailMessage()
+        msg["From"] = f"other{i}@example.net"
+        msg["Subject"] = f"Fwd: filler {i}"
+        msg.set_content("filler")
+        server.append(msg)
+    server.append(forwarded_message("bookmyshow", USER_EMAIL))
+
+    if warm_up:
+        start = time.perf_counter()
+        services.warm_up()
+        timings["warm_up"] = time.perf_counter() - start
+    timings["bs4_before_verify"] = "bs4" in sys.modules
+
+    client = app.test_client()
+    start = time.perf_counter()
+    client.get("/")
+    timings["first_page"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    precheck = client.get("/precheck", query_string={"user_email": USER_EMAIL, "platform": "bookmyshow"}).json
+    timings["first_precheck"] = time.perf_counter() - start
+
+    timings["bs4_before_verify"] = timings["bs4_before_verify"] or "bs4" in sys.modules
+    start = time.perf_counter()
+    outcome = services.shards.submit(USER_EMAIL, "bookmyshow").result()
+    timings["first_verify"] = time.perf_counter() - start
+
+    timings["statuses"] = [precheck["status"], outcome["status"]]
+    print(json.dumps(timings))
+    server.stop()
+
+
+def run_child(warm_up, messages, latency):
+    # Imported here so children time the app's imports from a bare interpreter
+    from benchmarks.bench_confirm import configure_environment
+
+    # Fresh state files for every run; the child inherits the environment
+    configure_environment(tempfile.mkdtemp(prefix="bench-startup-"))
+    args = [sys.executable, "-m", "benchmarks.bench_startup", "--child",
+            "--messages", str(messages), "--latency", str(latency)] + (["--warm-up"] if warm_up else [])
+    output = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time cold starts of the app with and without warm-up.")
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per mode.")
+    parser.add_argument("--messages", type=int, default=2000, help="Messages in the inbox before startup.")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated IMAP round-trip time in seconds.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--warm-up", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.warm_up, args.messages, args.latency)
+        return
+
+    results = {}
+    for mode, warm_up in (("cold", False), ("warm-up", True)):
+        results[mode] = [run_child(warm_up, args.messages, args.latency) for _ in range(args.runs)]
+
+    print(f"{'stage (median ms)':<20}" + "".join(f"{mode:>12}" for mode in results))
+    for stage in STAGES:
+        cells = []
+        for runs in results.values():
+            values = [run[stage] for run in runs if stage in run]
+            cells.append(f"{statistics.median(values) * 1000:>12.1f}" if values else f"{'-':>12}")
+        print(f"{stage:<20}" + "".join(cells))
+    for mode, runs in results.items():
+        statuses = sorted({status for run in runs for status in run["statuses"]})
+        bs4 = sum(run["bs4_before_verify"] for run in runs)
+        print(f"{mode}: statuses {', '.join(statuses)}; bs4 loaded before the first verification in {bs4}/{len(runs)} runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,577 @@
+# benchmarks/fake_imap.py
+#
+# A small in-process IMAP4rev1 server for benchmarks and offline runs. It
+# speaks enough of the protocol for everything the app sends: LOGIN,
+# SELECT/EXAMINE, STATUS, NOOP, IDLE, LIST, CREATE, EXPUNGE, UID SEARCH,
+# UID FETCH with BODYSTRUCTURE, INTERNALDATE, header fields and body
+# sections, and UID COPY/MOVE/STORE/EXPUNGE. Messages live in memory and
+# are added with FakeIMAPServer.append().
+
+import calendar
+import email
+import imaplib
+import re
+import select
+import socketserver
+import threading
+import time
+from collections import Counter
+
+TOKEN_RE = re.compile(
+    rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"\[]+(?:\[[^\]]*\](?:<[\d.]+>)?)?))'
+)
+SECTION_RE = re.compile(rb"^BODY(\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?$", re.IGNORECASE)
+
+
+class Folder:
+    def __init__(self, uidvalidity):
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.messages = []  # [uid, raw bytes, flags]
+        self.internal_dates = {}  # uid -> arrival time in epoch seconds
+
+    def add(self, raw, flags=(), internal_date=None):
+        uid = self.uidnext
+        self.uidnext += 1
+        self.messages.append([uid, raw, set(flags)])
+        self.internal_dates[uid] = time.time() if internal_date is None else internal_date
+        return uid
+
+    def remove(self, uids):
+        """Drop the messages with the given UIDs; returns their sequence numbers, highest first."""
+        uids = set(uids)
+        removed = [seq for seq, (uid, _, _) in enumerate(self.messages, 1) if uid in uids]
+        self.messages = [message for message in self.messages if message[0] not in uids]
+        for uid in uids:
+            self.internal_dates.pop(uid, None)
+        return sorted(removed, reverse=True)
+
+    def uids(self, uid_set):
+        """UIDs matching an IMAP sequence set such as b"1:5,9:*"."""
+        if not self.messages:
+            return []
+        last = self.messages[-1][0]
+        wanted = set()
+        for chunk in uid_set.split(b","):
+            lo, _, hi = chunk.partition(b":")
+            lo = last if lo == b"*" else int(lo)
+            hi = lo if not hi else last if hi == b"*" else int(hi)
+            wanted.add((min(lo, hi), max(lo, hi)))
+        return [uid for uid, _, _ in self.messages if any(lo <= uid <= hi for lo, hi in wanted)]
+
+    def find(self, uid):
+        for seq, message in enumerate(self.messages, 1):
+            if message[0] == uid:
+                return seq, message
+        return None, None
+
+
+def tokenize(args):
+    """Parse command arguments into nested lists of bytes."""
+    stack = [[]]
+    pos = 0
+    while pos < len(args):
+        match = TOKEN_RE.match(args, pos)
+        if not match or match.end() == pos:
+            break
+        pos = match.end()
+        lparen, rparen, quoted, atom = match.groups()
+        if lparen:
+            stack.append([])
+        elif rparen:
+            closed = stack.pop()
+            stack[-1].append(closed)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb"\\(.)", rb"\1", quoted))
+        elif atom:
+            stack[-1].append(atom)
+    return stack[0]
+
+
+def quote(value):
+    if value is None:
+        return b"NIL"
+    if isinstance(value, str):
+        value = value.encode()
+    return b'"' + value.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"'
+
+
+def literal(data):
+    return b"{%d}\r\n" % len(data) + data
+
+
+def search_date(value):
+    """Epoch seconds of midnight UTC on an IMAP search date such as b"1-Feb-2025"."""
+    return calendar.timegm(time.strptime(value.decode(), "%d-%b-%Y"))
+
+
+def split_message(raw):
+    """Split raw message bytes into (header block, body)."""
+    for separator in (b"\r\n\r\n", b"\n\n"):
+        index = raw.find(separator)
+        if index != -1:
+            return raw[:index + len(separator)], raw[index + len(separator):]
+    return raw, b""
+
+
+def header_fields(header_block, names, exclude=False):
+    """The header lines of header_block whose names are (not) in names."""
+    names = {name.upper() for name in names}
+    kept = []
+    keep = False
+    for line in header_block.splitlines(keepends=True):
+        if line[:1] in (b" ", b"\t"):
+            if keep:
+                kept.append(line)
+            continue
+        if not line.strip():
+            continue
+        name = line.split(b":", 1)[0].strip().upper()
+        keep = (name in names) != exclude
+        if keep:
+            kept.append(line)
+    return b"".join(kept).replace(b"\r\n", b"\n").replace(b"\n", b"\r\n") + b"\r\n"
+
+
+def part_body(part):
+    payload = part.get_payload()
+    if isinstance(payload, str):
+        return payload.encode("ascii", "surrogateescape")
+    return part.as_bytes()
+
+
+def bodystructure(part):
+    if part.is_multipart():
+        children = b"".join(bodystructure(child) for child in part.get_payload())
+        return b"(" + children + b" " + quote(part.get_content_subtype().upper()) + b")"
+    params = part.get_params() or []
+    param_list = b" ".join(quote(key.upper()) + b" " + quote(value) for key, value in params[1:])
+    body = part_body(part)
+    fields = [
+        quote(part.get_content_maintype().upper()),
+        quote(part.get_content_subtype().upper()),
+        b"(" + param_list + b")" if param_list else b"NIL",
+        quote(part.get("Content-ID")),
+        quote(part.get("Content-Description")),
+        quote(part.get("Content-Transfer-Encoding", "7BIT").upper()),
+        str(len(body)).encode(),
+    ]
+    if part.get_content_maintype() == "text":
+        fields.append(str(body.count(b"\n")).encode())
+    return b"(" + b" ".join(fields) + b")"
+
+
+def find_section(msg, path):
+    """The part addressed by a section path such as b"1.2"."""
+    part = msg
+    for number in path.split(b"."):
+        index = int(number)
+        if part.is_multipart():
+            part = part.get_payload()[index - 1]
+        elif index != 1:
+            return None
+    return part
+
+
+def section_bytes(raw, section):
+    """Contents of BODY[section] for raw message bytes."""
+    header_block, body = split_message(raw)
+    spec = section.upper()
+    if not spec:
+        return raw
+    if spec == b"HEADER":
+        return header_block
+    if spec == b"TEXT":
+        return body
+    if spec.startswith(b"HEADER.FIELDS"):
+        tokens = tokenize(section)
+        return header_fields(header_block, tokens[1], exclude=spec.startswith(b"HEADER.FIELDS.NOT"))
+    part = find_section(email.message_from_bytes(raw), section.split(b".MIME")[0])
+    return part_body(part) if part is not None else b""
+
+
+class IMAPHandler(socketserver.StreamRequestHandler):
+    # Responses go out in several small writes; don't let Nagle delay them
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.state = self.server.fake
+        self.folder = None
+        # Message count last reported to this client, as real servers track it
+        self.exists = 0
+
+    def send(self, data):
+        self.wfile.write(data)
+        self.state.count_bytes(len(data))
+
+    def handle(self):
+        self.send(b"* OK [CAPABILITY " + self.state.capabilities() + b"] Fake IMAP server ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.rstrip(b"\r\n").partition(b" ")
+            command, _, args = rest.partition(b" ")
+            command = command.upper()
+            if command == b"UID":
+                command, _, args = args.partition(b" ")
+                command = b"UID " + command.upper()
+            self.state.count_command(command.decode())
+            if self.state.latency:
+                time.sleep(self.state.latency)
+            handler = getattr(self, "do_" + command.decode().replace(" ", "_"), None)
+            try:
+                if handler is None:
+                    self.send(tag + b" BAD Unknown command\r\n")
+                elif handler(tag, args) is False:
+                    return
+            except Exception as e:
+                self.send(tag + b" BAD " + str(e).encode() + b"\r\n")
+
+    def ok(self, tag, text=b"completed"):
+        self.send(tag + b" OK " + text + b"\r\n")
+
+    def do_CAPABILITY(self, tag, args):
+        self.send(b"* CAPABILITY " + self.state.capabilities() + b"\r\n")
+        self.ok(tag)
+
+    def do_LOGIN(self, tag, args):
+        self.ok(tag, b"LOGIN completed")
+
+    def pending_exists(self):
+        """An untagged EXISTS response if the message count changed since the last one, else b""."""
+        with self.state.lock:
+            count = len(self.folder.messages) if self.folder else 0
+        if count == self.exists:
+            return b""
+        self.exists = count
+        return b"* %d EXISTS\r\n" % count
+
+    def do_NOOP(self, tag, args):
+        self.send(self.pending_exists())
+        self.ok(tag)
+
+    def do_LOGOUT(self, tag, args):
+        self.send(b"* BYE Logging out\r\n")
+        self.ok(tag)
+        return False
+
+    def do_SELECT(self, tag, args, readonly=False):
+        name = tokenize(args)[0]
+        with self.state.lock:
+            self.folder = self.state.folder(name)
+            if self.folder is None:
+                self.send(tag + b" NO Mailbox does not exist\r\n")
+                return
+            self.exists = len(self.folder.messages)
+            self.send(b"* %d EXISTS\r\n" % self.exists)
+            self.send(b"* OK [UIDVALIDITY %d] UIDs valid\r\n" % self.folder.uidvalidity)
+            self.send(b"* OK [UIDNEXT %d] Predicted next UID\r\n" % self.folder.uidnext)
+        self.ok(tag, b"[READ-ONLY] EXAMINE completed" if readonly else b"[READ-WRITE] SELECT completed")
+
+    def do_EXAMINE(self, tag, args):
+        return self.do_SELECT(tag, args, readonly=True)
+
+    def do_STATUS(self, tag, args):
+        name, items = tokenize(args)[:2]
+        with self.state.lock:
+            folder = self.state.folder(name)
+            if folder is None:
+                self.send(tag + b" NO Mailbox does not exist\r\n")
+                return
+            values = {
+                b"MESSAGES": len(folder.messages),
+                b"UIDNEXT": folder.uidnext,
+                b"UIDVALIDITY": folder.uidvalidity,
+                b"UNSEEN": sum(1 for _, _, flags in folder.messages if b"\\Seen" not in flags),
+                b"RECENT": 0,
+            }
+        reply = b" ".join(item.upper() + b" %d" % values[item.upper()] for item in items)
+        self.send(b"* STATUS " + quote(name) + b" (" + reply + b")\r\n")
+        self.ok(tag)
+
+    def do_IDLE(self, tag, args):
+        if not self.state.idle:
+            self.send(tag + b" BAD IDLE not supported\r\n")
+            return
+        # Mail that arrived since the last report is announced in the same
+        # write as the continuation, as busy servers do
+        self.send(b"+ idling\r\n" + self.pending_exists())
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], self.state.idle_poll_interval)
+            if readable:
+                line = self.rfile.readline()
+                if not line:
+                    return False
+                if line.strip().upper() == b"DONE":
+                    break
+            self.send(self.pending_exists())
+        self.ok(tag, b"IDLE terminated")
+
+    def do_LIST(self, tag, args):
+        reference, pattern = tokenize(args)[:2]
+        if not pattern:
+            self.send(b'* LIST (\\Noselect) "/" ""\r\n')
+            self.ok(tag)
+            return
+        regex = re.compile(re.escape(reference + pattern).replace(b"\\*", b".*").replace(b"%", b"[^/]*") + b"$",
+                           re.IGNORECASE)
+        with self.state.lock:
+            names = [name for name in self.state.folders if regex.match(name.encode())]
+        for name in names:
+            self.send(b'* LIST () "/" ' + quote(name) + b"\r\n")
+        self.ok(tag)
+
+    def do_CREATE(self, tag, args):
+        name = tokenize(args)[0].decode()
+        with self.state.lock:
+            if self.state.folder(name) is not None:
+                self.send(tag + b" NO [ALREADYEXISTS] Mailbox already exists\r\n")
+                return
+            self.state.folders[name] = Folder(self.state.uidvalidity)
+        self.ok(tag, b"CREATE completed")
+
+    def _expunge(self, uids):
+        with self.state.lock:
+            deleted = [uid for uid, _, flags in self.folder.messages if b"\\Deleted" in flags and uid in uids]
+            expunged = self.folder.remove(deleted)
+        for seq in expunged:
+            self.send(b"* %d EXPUNGE\r\n" % seq)
+        self.exists -= len(expunged)
+
+    def do_EXPUNGE(self, tag, args):
+        self._expunge({uid for uid, _, _ in self.folder.messages})
+        self.ok(tag, b"EXPUNGE completed")
+
+    def do_UID_EXPUNGE(self, tag, args):
+        self._expunge(set(self.folder.uids(tokenize(args)[0])))
+        self.ok(tag, b"EXPUNGE completed")
+
+    def do_UID_STORE(self, tag, args):
+        uid_set, action, values = tokenize(args)[:3]
+        values = set(values if isinstance(values, list) else [values])
+        action = action.upper()
+        with self.state.lock:
+            for uid in self.folder.uids(uid_set):
+                _, message = self.folder.find(uid)
+                if action.startswith(b"+"):
+                    message[2] |= values
+                elif action.startswith(b"-"):
+                    message[2] -= values
+                else:
+                    message[2] = set(values)
+        self.ok(tag, b"STORE completed")
+
+    def _copy(self, tag, args):
+        uid_set, name = tokenize(args)[:2]
+        with self.state.lock:
+            target = self.state.folder(name)
+            if target is None:
+                self.send(tag + b" NO [TRYCREATE] Mailbox does not exist\r\n")
+                return None
+            uids = self.folder.uids(uid_set)
+            copied = []
+            for uid in uids:
+                _, (_, raw, flags) = self.folder.find(uid)
+                copied.append(target.add(raw, flags - {b"\\Deleted"}, self.folder.internal_dates.get(uid)))
+        if not uids:
+            return uids, b""
+        code = b"[COPYUID %d %s %s]" % (target.uidvalidity, b",".join(b"%d" % uid for uid in uids),
+                                        b",".join(b"%d" % uid for uid in copied))
+        return uids, code
+
+    def do_UID_COPY(self, tag, args):
+        copied = self._copy(tag, args)
+        if copied is not None:
+            self.ok(tag, copied[1] + b" COPY completed")
+
+    def do_UID_MOVE(self, tag, args):
+        if not self.state.move:
+            self.send(tag + b" BAD MOVE not supported\r\n")
+            return
+        copied = self._copy(tag, args)
+        if copied is None:
+            return
+        uids, code = copied
+        if code:
+            self.send(b"* OK " + code + b"\r\n")
+        with self.state.lock:
+            expunged = self.folder.remove(uids)
+        for seq in expunged:
+            self.send(b"* %d EXPUNGE\r\n" % seq)
+        self.exists -= len(expunged)
+        self.ok(tag, b"MOVE completed")
+
+    def _matches(self, criteria, uid, raw, flags):
+        headers = None
+        i = 0
+        while i < len(criteria):
+            key = criteria[i]
+            if isinstance(key, list):
+                if not self._matches(key, uid, raw, flags):
+                    return False
+                i += 1
+                continue
+            key = key.upper()
+            if key == b"ALL":
+                pass
+            elif key in (b"SEEN", b"UNSEEN"):
+                if (b"\\Seen" in flags) != (key == b"SEEN"):
+                    return False
+            elif key == b"UID":
+                i += 1
+                if uid not in self.folder.uids(criteria[i]):
+                    return False
+            elif key in (b"FROM", b"TO", b"SUBJECT"):
+                i += 1
+                if headers is None:
+                    headers = email.message_from_bytes(split_message(raw)[0])
+                if criteria[i].decode().lower() not in str(headers.get(key.decode(), "")).lower():
+                    return False
+            elif key in (b"SINCE", b"BEFORE", b"ON"):
+                i += 1
+                day = search_date(criteria[i])
+                arrived = self.folder.internal_dates.get(uid, 0)
+                if key == b"BEFORE" and not arrived < day:
+                    return False
+                if key == b"SINCE" and not arrived >= day:
+                    return False
+                if key == b"ON" and not day <= arrived < day + 86400:
+                    return False
+            elif key == b"DELETED":
+                if b"\\Deleted" not in flags:
+                    return False
+            else:
+                raise ValueError(f"Unsupported search key {key.decode()}")
+            i += 1
+        return True
+
+    def do_UID_SEARCH(self, tag, args):
+        criteria = tokenize(args)
+        if criteria and isinstance(criteria[0], bytes) and criteria[0].upper() == b"CHARSET":
+            criteria = criteria[2:]
+        with self.state.lock:
+            messages = list(self.folder.messages)
+        found = [b"%d" % uid for uid, raw, flags in messages if self._matches(criteria, uid, raw, flags)]
+        self.send(b"* SEARCH" + b"".join(b" " + uid for uid in found) + b"\r\n")
+        self.ok(tag)
+
+    def do_UID_FETCH(self, tag, args):
+        tokens = tokenize(args)
+        uid_set, items = tokens[0], tokens[1]
+        if not isinstance(items, list):
+            items = [items]
+        with self.state.lock:
+            selected = [self.folder.find(uid) for uid in self.folder.uids(uid_set)]
+        for seq, (uid, raw, flags) in selected:
+            parts = [b"UID %d" % uid]
+            for item in items:
+                name = item.upper()
+                if name == b"UID":
+                    continue
+                if name == b"FLAGS":
+                    parts.append(b"FLAGS (" + b" ".join(sorted(flags)) + b")")
+                elif name == b"INTERNALDATE":
+                    stamp = self.folder.internal_dates.get(uid, 0)
+                    parts.append(b"INTERNALDATE " + imaplib.Time2Internaldate(stamp).encode())
+                elif name == b"RFC822.SIZE":
+                    parts.append(b"RFC822.SIZE %d" % len(raw))
+                elif name == b"BODYSTRUCTURE":
+                    parts.append(b"BODYSTRUCTURE " + bodystructure(email.message_from_bytes(raw)))
+                elif name in (b"RFC822", b"RFC822.PEEK"):
+                    parts.append(b"RFC822 " + literal(raw))
+                else:
+                    match = SECTION_RE.match(item)
+                    if not match:
+                        raise ValueError(f"Unsupported fetch item {item.decode()}")
+                    peek, section, offset, length = match.groups()
+                    data = section_bytes(raw, section)
+                    origin = b""
+                    if offset is not None:
+                        data = data[int(offset):int(offset) + int(length)]
+                        origin = b"<" + offset + b">"
+                    if not peek:
+                        flags.add(b"\\Seen")
+                    parts.append(b"BODY[" + section + b"]" + origin + b" " + literal(data))
+            self.send(b"* %d FETCH (" % seq + b" ".join(parts) + b")\r\n")
+        self.ok(tag)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeIMAPServer:
+    """
+    In-process IMAP server on 127.0.0.1 backed by in-memory folders.
+    latency adds a delay before every response to simulate a remote server.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, idle=True, uidvalidity=1,
+                 idle_poll_interval=0.01, move=True):
+        self.latency = latency
+        self.idle = idle
+        self.move = move
+        self.uidvalidity = uidvalidity
+        self.idle_poll_interval = idle_poll_interval
+        self.lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.folders = {"INBOX": Folder(uidvalidity)}
+        self.commands = Counter()
+        self.bytes_sent = 0
+        self._server = _Server((host, port), IMAPHandler)
+        self._server.fake = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address
+
+    def capabilities(self):
+        return b"IMAP4rev1 UIDPLUS" + (b" IDLE" if self.idle else b"") + (b" MOVE" if self.move else b"")
+
+    def folder(self, name):
+        if isinstance(name, bytes):
+            name = name.decode()
+        return self.folders.get("INBOX" if name.upper() == "INBOX" else name)
+
+    def count_command(self, command):
+        with self._stats_lock:
+            self.commands[command] += 1
+
+    def count_bytes(self, size):
+        with self._stats_lock:
+            self.bytes_sent += size
+
+    def append(self, msg, mailbox="INBOX", flags=(), internal_date=None):
+        """
+        Add a message (bytes or email.message.Message) and return its UID.
+        internal_date is its arrival time in epoch seconds, now by default.
+        """
+        raw = msg if isinstance(msg, bytes) else msg.as_bytes()
+        with self.lock:
+            return self.folder(mailbox).add(raw, flags, internal_date)
+
+    def connect(self):
+        """Return a logged-in imaplib connection to this server."""
+        host, port = self.address
+        mail = imaplib.IMAP4(host, port)
+        mail.login("bench@example.org", "bench")
+        return mail
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-imap", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
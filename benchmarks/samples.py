@@ -0,0 +1,184 @@
+from email.message import EmailMessage
+
+USER_EMAIL = "user@example.com"
+INBOX_EMAIL = "tickets@example.org"
+
+FORWARD_HEADER = """---------- Forwarded message ----------
+From: {sender} <{sender_email}>
+Date: Sat, Mar 1, 2025 at 10:00 AM
+Subject: {subject}
+To: <{user_email}>
+"""
+
+BODIES = {
+    "bookmyshow": {
+        "booking_id": "BMS12345XYZ",
+        "sender_email": "tickets@bookmyshow.email",
+        "subject": "Booking confirmed for Coldplay Music of the Spheres",
+        "body": """
+Your booking is confirmed!
+
+BOOKING ID: BMS12345XYZ
+
+Venue Directions <https://maps.example.com/dy-patil>
+  DY Patil Stadium, Navi Mumbai
+
+Date & Time
+  Sat, 18 Jan 2025 | 07:00 PM
+
+Category Quantity Price
+Gold Standing
+2
+Rs. 9000
+""",
+    },
+    "zomato": {
+        "booking_id": "ZMT987654",
+        "sender_email": "eventsupport@zomato.com",
+        "subject": "Your tickets for Zomaland",
+        "body": """
+You just scored tickets to Zomaland Mumbai 2025
+Saturday, February 15, 2025
+RSVP x 3
+Ticket ID: ZMT987654
+""",
+    },
+    "paytminsider": {
+        "booking_id": "INS55501234",
+        "sender_email": "purchases@insider.in",
+        "subject": "Your Insider tickets",
+        "body": """
+Thanks for your purchase, transaction reference INS55501234
+
+Music
+Arijit Singh Live in Concert
+
+Venue
+Jio World Garden
+BKC, Mumbai
+Get Directions
+
+Date
+Sun, 23 Mar 2025
+Time
+6:30 PM
+
+2 Tickets
+""",
+    },
+    "dice": {
+        "booking_id": "AbC123xYz",
+        "sender_email": "noreply@dice.fm",
+        "subject": "Your DICE tickets",
+        "body": """
+Hey, you are going
+Boiler Room Mumbai
+View tickets <https://link.dice.fm/ticket?dice_id=AbC123xYz>
+Venue: antiSOCIAL Lower Parel <https://maps.example.com/antisocial>
+Date & time Fri 7 Mar, 10:00 PM
+Doors open 9:30 PM
+Tickets 2 General Admission Group of 2
+""",
+    },
+}
+
+PLATFORMS = list(BODIES)
+
+FORWARD_HEADER_HTML = """<div class="gmail_quote">---------- Forwarded message ----------<br>
+From: <strong>{sender}</strong> &lt;<a href="mailto:{sender_email}">{sender_email}</a>&gt;<br>
+Date: Sat, Mar 1, 2025 at 10:00 AM<br>
+Subject: {subject}<br>
+To: &lt;<a href="mailto:{user_email}">{user_email}</a>&gt;<br>
+"""
+
+# HTML-only versions of the samples, laid out as table-based confirmation
+# mails. They carry the same details as BODIES.
+HTML_BODIES = {
+    "bookmyshow": """<table>
+<tr><td><h2>Your booking is confirmed!</h2></td></tr>
+<tr><td>BOOKING ID</td><td>BMS12345XYZ</td></tr>
+<tr><td>Venue</td><td><a href="https://maps.example.com/dy-patil">DY Patil Stadium, Navi Mumbai</a></td></tr>
+<tr><td>Date &amp; Time</td><td>Sat, 18 Jan 2025 | 07:00 PM</td></tr>
+<tr><th>Category</th><th>Quantity</th><th>Price</th></tr>
+<tr><td>Gold Standing</td><td>2</td><td>Rs. 9000</td></tr>
+</table>
+""",
+    "zomato": """<h1>You just scored tickets to Zomaland Mumbai 2025</h1>
+<table>
+<tr><td>Date</td><td>Saturday, February 15, 2025</td></tr>
+<tr><td>RSVP</td><td>x 3</td></tr>
+<tr><td>Ticket ID</td><td>ZMT987654</td></tr>
+</table>
+""",
+    "paytminsider": """<p>Thanks for your purchase, transaction reference INS55501234</p>
+<table>
+<tr><td>Music</td><td>Arijit Singh Live in Concert</td></tr>
+<tr><td>Venue</td><td>Jio World Garden<br>BKC, Mumbai<br><a href="https://maps.example.com/jio">Get Directions</a></td></tr>
+<tr><td>Date</td><td>Sun, 23 Mar 2025</td></tr>
+<tr><td>Time</td><td>6:30 PM</td></tr>
+<tr><td>Tickets</td><td>2 Tickets</td></tr>
+</table>
+""",
+    "dice": """<p>Hey, you are going</p>
+<h1>Boiler Room Mumbai</h1>
+<p><a href="https://link.dice.fm/ticket?dice_id=AbC123xYz">View tickets</a></p>
+<table>
+<tr><td>Venue</td><td><a href="https://maps.example.com/antisocial">antiSOCIAL Lower Parel</a></td></tr>
+<tr><td>Date &amp; time</td><td>Fri 7 Mar, 10:00 PM</td></tr>
+<tr><td>Doors open</td><td>9:30 PM</td></tr>
+<tr><td>Tickets</td><td>2 General Admission, Group of 2</td></tr>
+</table>
+""",
+}
+
+
+def forwarded_body(platform, user_email=USER_EMAIL, padding=0, booking_id=None):
+    """
+    Text of a forwarded email for platform. padding adds that many
+    characters of filler before and after the ticket details to simulate
+    long promotional mails. booking_id replaces the sample's booking ID.
+    """
+    sample = BODIES[platform]
+    filler = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit.\n" * (padding // 57 + 1))[:padding]
+    return (
+        "Sending this over.\n\n"
+        + FORWARD_HEADER.format(sender=platform.title(), sender_email=sample["sender_email"],
+                                subject=sample["subject"], user_email=user_email)
+        + filler + sample["body"].replace(sample["booking_id"], booking_id or sample["booking_id"]) + filler
+    )
+
+
+def forwarded_html_body(platform, user_email=USER_EMAIL, padding=0, booking_id=None):
+    """HTML version of forwarded_body(), with the filler in paragraphs."""
+    sample = BODIES[platform]
+    filler = "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n" * (padding // 57)
+    return (
+        "<html><body><div>Sending this over.</div>\n"
+        + FORWARD_HEADER_HTML.format(sender=platform.title(), sender_email=sample["sender_email"],
+                                     subject=sample["subject"], user_email=user_email)
+        + filler + HTML_BODIES[platform].replace(sample["booking_id"], booking_id or sample["booking_id"])
+        + filler + "</div></body></html>\n"
+    )
+
+
+def forwarded_message(platform, user_email=USER_EMAIL, padding=0, attachment_size=0, booking_id=None,
+                      message_id=None, html_only=False):
+    """
+    Build the outer "Fwd:" message a user sends to the verification inbox.
+    With html_only the body is a single text/html part.
+    """
+    msg = EmailMessage()
+    msg["From"] = user_email
+    msg["To"] = INBOX_EMAIL
+    msg["Subject"] = f"Fwd: {BODIES[platform]['subject']}"
+    msg["Date"] = "Sat, 01 Mar 2025 10:05:00 +0000"
+    if message_id:
+        msg["Message-ID"] = message_id
+    if html_only:
+        msg.set_content(forwarded_html_body(platform, user_email, padding, booking_id), subtype="html")
+    else:
+        msg.set_content(forwarded_body(platform, user_email, padding, booking_id))
+    if attachment_size:
+        msg.add_attachment(b"%PDF-1.4\n" + b"\0" * attachment_size, maintype="application",
+                           subtype="pdf", filename="ticket.pdf")
+    return msg
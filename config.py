@@ -8,6 +8,136 @@ EMAIL_ACCOUNT = os.getenv("EMAIL_ACCOUNT")
 EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 IMAP_SERVER = os.getenv("IMAP_SERVER")
 
+# Receiving mailboxes. The account above is the first; more are added with
+# EMAIL_ACCOUNT_2, EMAIL_PASSWORD_2 and IMAP_SERVER_2 (defaulting to
+# IMAP_SERVER), then _3 and so on. Users are spread over the accounts by
+# consistent hashing of their address with SHARD_VIRTUAL_NODES points per
+# account, so adding an account only moves the users it takes over.
+EMAIL_ACCOUNTS = [{"email": EMAIL_ACCOUNT, "password": EMAIL_PASSWORD, "server": IMAP_SERVER}]
+while os.getenv(f"EMAIL_ACCOUNT_{len(EMAIL_ACCOUNTS) + 1}"):
+    _n = len(EMAIL_ACCOUNTS) + 1
+    EMAIL_ACCOUNTS.append({
+        "email": os.getenv(f"EMAIL_ACCOUNT_{_n}"),
+        "password": os.getenv(f"EMAIL_PASSWORD_{_n}"),
+        "server": os.getenv(f"IMAP_SERVER_{_n}", IMAP_SERVER),
+    })
+SHARD_VIRTUAL_NODES = int(os.getenv("SHARD_VIRTUAL_NODES", "100"))
+
+# Startup. With WARM_UP, create_app() compiles the parser regexes and
+# selectors, opens WARM_UP_CONNECTIONS pooled IMAP connections per account
+# and syncs each mailbox index in a background thread, so the first requests
+# do not pay for them. DEBUG only affects "python app.py"; production servers
+# load wsgi:app.
+WARM_UP = os.getenv("WARM_UP", "true").lower() in ("1", "true", "yes")
+WARM_UP_CONNECTIONS = int(os.getenv("WARM_UP_CONNECTIONS", "1"))
+DEBUG = os.getenv("FLASK_DEBUG", "false").lower() in ("1", "true", "yes")
+
+# Logging: level, "text" or "json" output, the size of the queue feeding the
+# log writer thread (records are dropped when it is full), and the fraction of
+# message bodies dumped at DEBUG level and how many characters of each
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BODY_SAMPLE_RATE = float(os.getenv("LOG_BODY_SAMPLE_RATE", "0"))
+LOG_BODY_MAX_CHARS = int(os.getenv("LOG_BODY_MAX_CHARS", "500"))
+
+# IMAP connection pool settings
+IMAP_POOL_SIZE = int(os.getenv("IMAP_POOL_SIZE", "4"))
+IMAP_POOL_IDLE_TIMEOUT = float(os.getenv("IMAP_POOL_IDLE_TIMEOUT", "300"))
+IMAP_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("IMAP_POOL_HEALTH_CHECK_INTERVAL", "30"))
+IMAP_POOL_CHECKOUT_TIMEOUT = float(os.getenv("IMAP_POOL_CHECKOUT_TIMEOUT", "30"))
+
+# How long /confirm waits for a forwarded email to arrive. With IMAP IDLE
+# available the wait ends as soon as the mail lands; otherwise the inbox is
+# polled every MAIL_ARRIVAL_POLL_INTERVAL seconds. When the user's newest
+# message was already checked, /confirm answers for it at once, or first
+# waits up to MAIL_RESUBMIT_WAIT seconds for a newer one if that is set.
+MAIL_ARRIVAL_TIMEOUT = float(os.getenv("MAIL_ARRIVAL_TIMEOUT", "15"))
+MAIL_ARRIVAL_POLL_INTERVAL = float(os.getenv("MAIL_ARRIVAL_POLL_INTERVAL", "2"))
+MAIL_RESUBMIT_WAIT = float(os.getenv("MAIL_RESUBMIT_WAIT", "0"))
+IMAP_IDLE_ENABLED = os.getenv("IMAP_IDLE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Async verification pipeline: at most MAX_PENDING_VERIFICATIONS run at once,
+# extra requests wait VERIFICATION_QUEUE_TIMEOUT seconds for a slot, and each
+# verification is abandoned after VERIFICATION_DEADLINE seconds.
+MAX_PENDING_VERIFICATIONS = int(os.getenv("MAX_PENDING_VERIFICATIONS", "100"))
+VERIFICATION_QUEUE_TIMEOUT = float(os.getenv("VERIFICATION_QUEUE_TIMEOUT", "5"))
+VERIFICATION_DEADLINE = float(os.getenv("VERIFICATION_DEADLINE", "30"))
+
+# Cached verification outcomes: at most RESULT_CACHE_SIZE entries, each kept
+# for RESULT_CACHE_TTL seconds or until the user sends a newer message
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+# /precheck answers from the mailbox index and header fields. When the subject
+# does not show the platform, the first PRECHECK_PEEK_BYTES of the text part
+# are fetched to detect it; 0 never fetches body bytes.
+PRECHECK_PEEK_BYTES = int(os.getenv("PRECHECK_PEEK_BYTES", "4096"))
+
+# Log the per-stage timings of every verification
+VERIFICATION_TRACE_LOGGING = os.getenv("VERIFICATION_TRACE_LOGGING", "false").lower() in ("1", "true", "yes")
+
+# Background verification jobs, persisted in SQLite so they survive restarts.
+# Up to MAX_PENDING_VERIFICATIONS run at once. Jobs that fail for transient
+# reasons are retried with exponential backoff. A job still running after
+# JOB_LEASE seconds is taken to be lost with its process and runs again; keep
+# it above VERIFICATION_QUEUE_TIMEOUT + VERIFICATION_DEADLINE.
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3")
+JOB_LEASE = float(os.getenv("JOB_LEASE", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+JOB_RETRY_BACKOFF_MAX = float(os.getenv("JOB_RETRY_BACKOFF_MAX", "60"))
+
+# Archive passes and batch sweeps run in one worker process at a time, the
+# one holding a lease in JOB_QUEUE_PATH. A lease left by a process that died
+# expires after TASK_LEASE seconds; keep it above the longest pass or sweep.
+TASK_LEASE = float(os.getenv("TASK_LEASE", "3600"))
+
+# Batch verification sweeps: messages per subject FETCH, bytes of forwards
+# per body FETCH (two such batches are held in memory at most), parser
+# processes (0 means one per CPU) and where results and checkpoints are stored
+BATCH_FETCH_SIZE = int(os.getenv("BATCH_FETCH_SIZE", "200"))
+BATCH_FETCH_BYTES = int(os.getenv("BATCH_FETCH_BYTES", str(32 * 1024 * 1024)))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "0")) or None
+BATCH_RESULTS_PATH = os.getenv("BATCH_RESULTS_PATH", "batch_results.sqlite3")
+
+# SQLite file of verified tickets; each booking can be claimed by one user only
+TICKET_STORE_PATH = os.getenv("TICKET_STORE_PATH", "tickets.sqlite3")
+
+# Inbox housekeeping: every ARCHIVE_INTERVAL seconds (0 turns the schedule
+# off) processed forwards are moved to monthly folders under ARCHIVE_FOLDER.
+# Messages newer than ARCHIVE_MIN_AGE_DAYS are never moved; verified forwards
+# older than that are, as are messages older than ARCHIVE_STALE_DAYS and,
+# while the inbox holds more than ARCHIVE_MAX_INBOX messages, the oldest of
+# the rest. ARCHIVE_DRY_RUN makes scheduled passes only report what they
+# would move.
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "0"))
+ARCHIVE_FOLDER = os.getenv("ARCHIVE_FOLDER", "Archive")
+ARCHIVE_MIN_AGE_DAYS = float(os.getenv("ARCHIVE_MIN_AGE_DAYS", "1"))
+ARCHIVE_STALE_DAYS = float(os.getenv("ARCHIVE_STALE_DAYS", "30"))
+ARCHIVE_MAX_INBOX = int(os.getenv("ARCHIVE_MAX_INBOX", "5000"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_DRY_RUN = os.getenv("ARCHIVE_DRY_RUN", "false").lower() in ("1", "true", "yes")
+
+# SQLite file holding the local index of inbox envelope headers. Accounts
+# after the first get their own file, and their own batch results file,
+# named with the account number (mailbox_index-2.sqlite3, ...)
+MAILBOX_INDEX_PATH = os.getenv("MAILBOX_INDEX_PATH", "mailbox_index.sqlite3")
+
+# Size limits for message bodies: how much of a raw message is fetched and
+# scanned for its text part, how much of the text part is kept, and the
+# largest header block read for a message or part
+MIME_MAX_MESSAGE_BYTES = int(os.getenv("MIME_MAX_MESSAGE_BYTES", str(5 * 1024 * 1024)))
+MIME_MAX_TEXT_BYTES = int(os.getenv("MIME_MAX_TEXT_BYTES", str(1024 * 1024)))
+MIME_MAX_HEADER_BYTES = int(os.getenv("MIME_MAX_HEADER_BYTES", str(64 * 1024)))
+
+# BeautifulSoup backend for HTML message bodies; "lxml" falls back to
+# "html.parser" when lxml is not installed
+HTML_PARSER = os.getenv("HTML_PARSER", "lxml")
+
+# Number of decoded message bodies kept in memory, keyed by Message-ID
+NORMALIZED_MESSAGE_CACHE_SIZE = int(os.getenv("NORMALIZED_MESSAGE_CACHE_SIZE", "256"))
+
 # Platform-specific email configurations
 PLATFORM_EMAILS = {
     'bookmyshow': 'tickets@bookmyshow.email',
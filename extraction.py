@@ -0,0 +1,123 @@
+import re
+
+EMAIL_ADDRESS = r"([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})"
+
+# Default number of characters a DOTALL field may span from its anchor.
+# Bounding the window keeps lazy ".*?" patterns from rescanning the whole body.
+DEFAULT_WINDOW = 2000
+
+
+class Field:
+    """
+    One field of an extraction spec.
+
+    literal is the text every match starts with, compared case-insensitively
+    when the pattern is IGNORECASE. Candidate positions are found with
+    str.find on that literal and pattern is matched only there, limited to
+    window characters when set. Patterns that use "$" must leave window
+    unset, since the window end would count as end of text. Fields without
+    a literal fall back to a precompiled pattern.search().
+    """
+
+    def __init__(self, name, pattern, flags=0, literal=None, group=1, window=None):
+        self.name = name
+        self.flags = flags
+        self.group = group
+        self.window = window
+        self.pattern = re.compile(pattern, flags)
+        self.ignore_case = bool(flags & re.IGNORECASE)
+        self.literal = literal.lower() if literal and self.ignore_case else literal
+
+    def match_at(self, text, pos):
+        endpos = min(len(text), pos + self.window) if self.window else len(text)
+        match = self.pattern.match(text, pos, endpos)
+        return match.group(self.group) if match else None
+
+    def search(self, text, folded):
+        """First captured value in text; folded is text.lower() or None."""
+        if self.literal is None or (self.ignore_case and folded is None):
+            match = self.pattern.search(text)
+            return match.group(self.group) if match else None
+        haystack = folded if self.ignore_case else text
+        pos = haystack.find(self.literal)
+        while pos != -1:
+            value = self.match_at(text, pos)
+            if value is not None:
+                return value
+            pos = haystack.find(self.literal, pos + 1)
+        return None
+
+
+class ExtractionSpec:
+    """
+    A set of fields compiled once at import. extract() lower-cases the text
+    once and locates every field from its literal anchor, so lazy DOTALL
+    patterns never rescan the body from each failed position. The first
+    match of each field is the one re.search would return, within the
+    field's window.
+    """
+
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.needs_folding = any(field.literal and field.ignore_case for field in self.fields)
+
+    def extract(self, text):
+        """Return {field name: first captured value or None}."""
+        folded = text.lower() if self.needs_folding else None
+        # Some characters change length when lower-cased, which would shift
+        # positions; use plain pattern searches for such text.
+        if folded is not None and len(folded) != len(text):
+            folded = None
+        return {field.name: field.search(text, folded) for field in self.fields}
+
+
+def email_fields():
+    """From/To address fields shared by every platform."""
+    return [
+        Field("from_email", fr"From:.*?{EMAIL_ADDRESS}", re.IGNORECASE | re.DOTALL, "From:",
+              window=DEFAULT_WINDOW),
+        Field("to_email", fr"To:.*?{EMAIL_ADDRESS}", re.IGNORECASE | re.DOTALL, "To:",
+              window=DEFAULT_WINDOW),
+    ]
+
+
+PLATFORM_SPECS = {
+    "bookmyshow": ExtractionSpec(email_fields() + [
+        Field("booking_id", r"BOOKING ID[:\s]+(\w+)", re.IGNORECASE, "BOOKING ID"),
+        Field("venue", r"Venue\s+Directions.*?<.*?>.*?\n\s*([^\n<]+)", re.DOTALL | re.IGNORECASE, "Venue",
+              window=DEFAULT_WINDOW),
+        Field("date_time", r"Date\s*&\s*Time\s*\n\s*([^|]+\|[^<\n]+)", re.IGNORECASE, "Date",
+              window=DEFAULT_WINDOW),
+        Field("quantity", r"Category\s+Quantity\s+Price.*?\n.*?\n(\d+)", re.DOTALL | re.IGNORECASE, "Category",
+              window=DEFAULT_WINDOW),
+        Field("event_name", r"Subject:.*?Booking confirmed for\s+(.*?)\n", re.IGNORECASE | re.DOTALL, "Subject:",
+              window=DEFAULT_WINDOW),
+    ]),
+    "zomato": ExtractionSpec(email_fields() + [
+        Field("booking_id", r"Ticket ID[:\s]+(\w+)", re.IGNORECASE, "Ticket ID"),
+        Field("event_name", r"You just scored tickets to\s+(.*?)(?:\n|$)", re.IGNORECASE, "You just scored"),
+        Field("date_time", r"(\w+,\s+\w+\s+\d+,\s+\d{4})"),
+        Field("quantity", r"RSVP x\s*(\d+)", re.IGNORECASE, "RSVP x"),
+    ]),
+    "paytminsider": ExtractionSpec(email_fields() + [
+        Field("booking_id", r"transaction reference\s*(\w+)", re.IGNORECASE, "transaction reference"),
+        Field("venue", r"Venue\s*\n([^\n]+(?:\n[^\n]+)*)\nGet Directions", re.IGNORECASE, "Venue",
+              window=DEFAULT_WINDOW),
+        Field("date", r"Date\s*\n([^\n]+)", re.IGNORECASE, "Date"),
+        Field("time", r"Time\s*\n([^\n]+)", re.IGNORECASE, "Time"),
+        Field("event_name", r"Music\s*\n([^\n]+)", re.IGNORECASE, "Music"),
+        Field("quantity", r"(\d+)\s*Ticket", re.IGNORECASE),
+    ]),
+    "dice": ExtractionSpec(email_fields() + [
+        Field("event_name", r"you are going\s*(.*?)(?:View tickets|Venue details|<https?://)",
+              re.IGNORECASE | re.DOTALL, "you are going", window=DEFAULT_WINDOW),
+        Field("venue", r"Venue\s*[:\s]*(.*?)(?=\s*<|$)", re.IGNORECASE, "Venue"),
+        Field("date_time", r"Date & time\s*(.*?)(?:\n|Doors)", re.IGNORECASE, "Date & time"),
+        Field("quantity", r"Tickets\s*(\d+).*?Group\s+of\s*(\d+)", re.IGNORECASE, "Tickets"),
+        Field("booking_id", r"dice_id=([A-Za-z0-9]+)", re.IGNORECASE, "dice_id="),
+    ]),
+}
+
+def extract_platform_fields(platform, text):
+    """Run the platform's extraction spec over text."""
+    return PLATFORM_SPECS[platform].extract(text)
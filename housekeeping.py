@@ -0,0 +1,249 @@
+import email
+import imaplib
+import logging
+import re
+import threading
+import time
+
+from metrics import metrics
+
+UID_RE = re.compile(rb"UID (\d+)", re.IGNORECASE)
+LIST_DELIMITER_RE = re.compile(rb'\([^)]*\) (?:"((?:[^"\\]|\\.)*)"|NIL)')
+
+# Server-side SEARCH timed before and after a pass; it matches nothing, so the
+# server scans every message in the mailbox
+PROBE_SEARCH = '(FROM "archive-probe@invalid")'
+
+DAY = 86400
+
+
+class InboxArchiver:
+    """
+    Moves processed forwards out of the inbox into monthly archive folders
+    (Archive/2025-03) so the inbox, and every SELECT, STATUS and SEARCH on
+    it, stays small.
+
+    Only messages older than min_age_days are touched. Of those, forwards
+    whose Message-ID belongs to a verified ticket and anything older than
+    stale_days are archived; if the inbox would still hold more than
+    max_inbox messages, the oldest of the rest go too. Moves use UID MOVE
+    where the server supports it and UID COPY, STORE \\Deleted and EXPUNGE
+    otherwise, batch_size UIDs per command. Moved UIDs are dropped from
+    index so lookups never point at a message that is gone.
+    """
+
+    def __init__(self, tickets, index=None, mailbox="inbox", folder="Archive", min_age_days=1, stale_days=30,
+                 max_inbox=5000, batch_size=500):
+        self.tickets = tickets
+        self.index = index
+        self.mailbox = mailbox
+        self.folder = folder
+        self.min_age_days = min_age_days
+        self.stale_days = stale_days
+        self.max_inbox = max_inbox
+        self.batch_size = batch_size
+        self._created = set()
+
+    def _time_search(self, mail):
+        start = time.perf_counter()
+        status, _ = mail.uid("SEARCH", None, PROBE_SEARCH)
+        if status != "OK":
+            raise RuntimeError(f"SEARCH failed in {self.mailbox}")
+        return time.perf_counter() - start
+
+    def _candidates(self, mail, now):
+        """[(uid, arrival time, Message-ID)] of messages older than min_age_days, oldest UID first."""
+        before = time.strftime("%d-%b-%Y", time.gmtime(now - self.min_age_days * DAY))
+        status, data = mail.uid("SEARCH", None, f"(BEFORE {before})")
+        if status != "OK":
+            raise RuntimeError(f"SEARCH failed in {self.mailbox}")
+        uids = data[0].split()
+        candidates = []
+        for start in range(0, len(uids), self.batch_size):
+            chunk = uids[start:start + self.batch_size]
+            status, data = mail.uid("FETCH", b",".join(chunk),
+                                    "(UID INTERNALDATE BODY.PEEK[HEADER.FIELDS (MESSAGE-ID)])")
+            if status != "OK":
+                raise RuntimeError(f"FETCH failed in {self.mailbox}")
+            for item in data:
+                if not isinstance(item, tuple):
+                    continue
+                match = UID_RE.search(item[0])
+                arrived = imaplib.Internaldate2tuple(item[0])
+                if not match or arrived is None:
+                    continue
+                message_id = (email.message_from_bytes(item[1]).get("Message-ID") or "").strip()
+                candidates.append((int(match.group(1)), time.mktime(arrived), message_id))
+        candidates.sort()
+        return candidates
+
+    def plan(self, mail, inbox_size, now):
+        """{uid: (reason, arrival time)} of the messages to archive."""
+        candidates = self._candidates(mail, now)
+        verified = self.tickets.verified_message_ids(message_id for _, _, message_id in candidates)
+        stale_before = now - self.stale_days * DAY
+        planned = {}
+        for uid, arrived, message_id in candidates:
+            if message_id in verified:
+                planned[uid] = ("verified", arrived)
+            elif arrived < stale_before:
+                planned[uid] = ("stale", arrived)
+        excess = inbox_size - len(planned) - self.max_inbox
+        for uid, arrived, _ in candidates:
+            if excess <= 0:
+                break
+            if uid not in planned:
+                planned[uid] = ("overflow", arrived)
+                excess -= 1
+        return planned
+
+    def _delimiter(self, mail):
+        status, data = mail.list('""', '""')
+        match = LIST_DELIMITER_RE.match(data[0]) if status == "OK" and data and data[0] else None
+        return match.group(1).decode() if match and match.group(1) else "/"
+
+    def _ensure_folder(self, mail, name):
+        if name in self._created:
+            return
+        status, data = mail.create(name)
+        if status != "OK":
+            # Usually ALREADYEXISTS; a real failure shows up in the move
+            logging.debug("CREATE %s returned %s: %s", name, status, data)
+        self._created.add(name)
+
+    def _move(self, mail, uids, folder):
+        uid_set = ",".join(str(uid) for uid in uids)
+        if "MOVE" in mail.capabilities:
+            status, data = mail.uid("MOVE", uid_set, folder)
+        else:
+            status, data = mail.uid("COPY", uid_set, folder)
+            if status == "OK":
+                status, data = mail.uid("STORE", uid_set, "+FLAGS.SILENT", "(\\Deleted)")
+            if status == "OK":
+                # UID EXPUNGE leaves other messages marked \Deleted alone
+                status, data = mail.uid("EXPUNGE", uid_set) if "UIDPLUS" in mail.capabilities else mail.expunge()
+        if status != "OK":
+            raise RuntimeError(f"Moving {len(uids)} messages to {folder} failed: {data}")
+
+    def run(self, mail, dry_run=False, now=None):
+        """
+        Archive one pass worth of messages and return a report. With dry_run
+        nothing is moved; the report shows what would have been.
+        """
+        start = time.perf_counter()
+        now = time.time() if now is None else now
+        status, data = mail.select(self.mailbox, readonly=dry_run)
+        if status != "OK":
+            raise RuntimeError(f"SELECT failed for mailbox {self.mailbox}")
+        inbox_size = int(data[0])
+        search_before = self._time_search(mail)
+
+        planned = self.plan(mail, inbox_size, now)
+        delimiter = self._delimiter(mail) if planned else "/"
+        by_folder = {}
+        reasons = {"verified": 0, "stale": 0, "overflow": 0}
+        for uid, (reason, arrived) in sorted(planned.items()):
+            folder = f"{self.folder}{delimiter}{time.strftime('%Y-%m', time.gmtime(arrived))}"
+            by_folder.setdefault(folder, []).append(uid)
+            reasons[reason] += 1
+
+        if not dry_run:
+            for folder, uids in by_folder.items():
+                self._ensure_folder(mail, folder)
+                for chunk_start in range(0, len(uids), self.batch_size):
+                    chunk = uids[chunk_start:chunk_start + self.batch_size]
+                    self._move(mail, chunk, folder)
+                    if self.index is not None:
+                        self.index.forget(chunk)
+            for reason, count in reasons.items():
+                if count:
+                    metrics.inc("archived_messages_total", count, reason=reason)
+
+        search_after = self._time_search(mail) if planned and not dry_run else None
+        report = {
+            "mailbox": self.mailbox,
+            "dry_run": dry_run,
+            "inbox_before": inbox_size,
+            "inbox_after": inbox_size - (0 if dry_run else len(planned)),
+            "moved": reasons,
+            "folders": {folder: len(uids) for folder, uids in by_folder.items()},
+            "search_seconds_before": round(search_before, 6),
+            "search_seconds_after": round(search_after, 6) if search_after is not None else None,
+            "search_seconds_saved": round(search_before - search_after, 6) if search_after is not None else None,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+        logging.info("Inbox archive pass: %s", report)
+        return report
+
+
+class ArchiveScheduler:
+    """
+    Runs archive passes in a background thread, every interval seconds when
+    interval is positive and on demand through trigger(). run_pass(dry_run)
+    does the work; scheduled passes use default_dry_run. One pass runs at a
+    time and its outcome is kept in state.
+
+    With a lease (a job_queue.TaskLease), a pass only runs while holding it,
+    so of several worker processes only one archives at a time; the others
+    skip the pass and record when in last_skipped.
+    """
+
+    def __init__(self, run_pass, interval=0, default_dry_run=False, lease=None):
+        self.run_pass = run_pass
+        self.interval = interval
+        self.default_dry_run = default_dry_run
+        self.lease = lease
+        self.state = {"running": False, "last_run": None, "last_report": None, "last_error": None,
+                      "last_skipped": None}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._requested = None
+        self._thread = None
+
+    def ensure_started(self):
+        """Start the scheduler thread if it is not already running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._loop, name="inbox-archiver", daemon=True)
+            self._thread.start()
+
+    def trigger(self, dry_run=False):
+        """Request a pass now. Returns False if one is already running or requested."""
+        with self._lock:
+            if self.state["running"] or self._requested is not None:
+                return False
+            self._requested = dry_run
+        self.ensure_started()
+        self._wake.set()
+        return True
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.state)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()
+            with self._lock:
+                dry_run = self.default_dry_run if self._requested is None else self._requested
+                self._requested = None
+                if self.lease is not None and not self.lease.acquire():
+                    logging.info("Skipping inbox archive pass; another process is running one.")
+                    self.state["last_skipped"] = time.time()
+                    continue
+                self.state["running"] = True
+            try:
+                report = self.run_pass(dry_run)
+                error = None
+            except Exception as e:
+                logging.error("Inbox archive pass failed: %s", e)
+                report, error = None, str(e)
+            finally:
+                if self.lease is not None:
+                    self.lease.release()
+            with self._lock:
+                self.state.update(running=False, last_run=time.time(), last_error=error)
+                if report is not None:
+                    self.state["last_report"] = report
@@ -0,0 +1,128 @@
+import importlib.util
+import logging
+import re
+
+from config import HTML_PARSER
+
+# lxml builds trees several times faster than the stdlib parser but is
+# optional; fall back to html.parser when it is not installed
+if HTML_PARSER == "lxml" and importlib.util.find_spec("lxml") is None:
+    logging.warning("lxml is not installed; parsing HTML with html.parser.")
+    PARSER_BACKEND = "html.parser"
+else:
+    PARSER_BACKEND = HTML_PARSER
+
+# Tags kept by default when building a tree for field extraction. Ticket
+# details sit in table cells, links and headings; everything else is skipped.
+DEFAULT_TAGS = ("td", "th", "a", "h1", "h2")
+
+
+class HtmlField:
+    """
+    One field of an HTML extraction spec.
+
+    selector is a CSS selector; the value is the text of the first matching
+    element, or its attribute when set, with text nodes joined by separator.
+    With join set, the texts of every match are joined by it instead. When
+    pattern is set, the value is its first group searched in that text.
+    """
+
+    def __init__(self, name, selector, attribute=None, pattern=None, flags=0, separator=" ", join=None):
+        self.name = name
+        self.selector = selector
+        self.attribute = attribute
+        self.pattern = re.compile(pattern, flags) if pattern else None
+        self.separator = separator
+        self.join = join
+
+    def _value(self, tag):
+        if self.attribute:
+            return tag.get(self.attribute)
+        return tag.get_text(self.separator, strip=True)
+
+    def extract(self, soup):
+        if self.join is None:
+            tag = soup.select_one(self.selector)
+            value = self._value(tag) if tag is not None else None
+        else:
+            value = self.join.join(filter(None, (self._value(tag) for tag in soup.select(self.selector))))
+        if value and self.pattern:
+            match = self.pattern.search(value)
+            value = match.group(1) if match else None
+        return value.strip() if value else None
+
+
+class HtmlExtractionSpec:
+    """
+    A platform's fields as CSS selectors. Only the tags in tags are parsed
+    (through a SoupStrainer), so the tree stays small for long mails.
+    """
+
+    def __init__(self, fields, tags=DEFAULT_TAGS):
+        self.fields = list(fields)
+        self.tags = list(tags)
+        self._strainer = None
+
+    @property
+    def strainer(self):
+        # bs4 is imported on first use; most mail has a text part and never needs it
+        if self._strainer is None:
+            from bs4 import SoupStrainer
+            self._strainer = SoupStrainer(self.tags)
+        return self._strainer
+
+    def extract(self, html, backend=None):
+        """Return {field name: value or None}."""
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, backend or PARSER_BACKEND, parse_only=self.strainer)
+        return {field.name: field.extract(soup) for field in self.fields}
+
+
+def label_value(label):
+    """Selector for the table cell after the cell whose own text contains label."""
+    return f'td:-soup-contains-own("{label}") + td'
+
+
+HTML_SPECS = {
+    "bookmyshow": HtmlExtractionSpec([
+        HtmlField("booking_id", label_value("BOOKING ID")),
+        HtmlField("venue", label_value("Venue")),
+        HtmlField("date_time", label_value("Date & Time")),
+        HtmlField("quantity", 'tr:has(> th:-soup-contains-own("Quantity")) + tr > td:nth-of-type(2)',
+                  pattern=r"(\d+)"),
+    ], tags=("tr",)),
+    "zomato": HtmlExtractionSpec([
+        HtmlField("booking_id", label_value("Ticket ID")),
+        HtmlField("event_name", ':is(h1, h2):-soup-contains-own("scored tickets")',
+                  pattern=r"You just scored tickets to\s+(.+)", flags=re.IGNORECASE),
+        HtmlField("date_time", label_value("Date")),
+        HtmlField("quantity", label_value("RSVP"), pattern=r"(\d+)"),
+    ]),
+    "paytminsider": HtmlExtractionSpec([
+        HtmlField("booking_id", ':is(p, td):-soup-contains-own("transaction reference")',
+                  pattern=r"transaction reference\s*(\w+)", flags=re.IGNORECASE),
+        HtmlField("venue", label_value("Venue"), separator=", ", pattern=r"^(.*?)(?:,\s*Get Directions)?$"),
+        HtmlField("date_time", f'{label_value("Date")}, {label_value("Time")}', join=" "),
+        HtmlField("event_name", label_value("Music")),
+        HtmlField("quantity", label_value("Tickets"), pattern=r"(\d+)"),
+    ], tags=DEFAULT_TAGS + ("p",)),
+    "dice": HtmlExtractionSpec([
+        HtmlField("event_name", "h1"),
+        HtmlField("venue", label_value("Venue")),
+        HtmlField("date_time", label_value("Date & time")),
+        HtmlField("quantity", label_value("Tickets"), pattern=r"(\d+)"),
+        HtmlField("booking_id", 'a[href*="dice_id="]', attribute="href", pattern=r"dice_id=([A-Za-z0-9]+)"),
+    ]),
+}
+
+
+def compile_html_specs():
+    """Import bs4 and compile every spec's selectors by running it over an empty table."""
+    for spec in HTML_SPECS.values():
+        spec.extract("<table><tr><td></td></tr></table>")
+
+
+def extract_html_fields(platform, html):
+    """Run the platform's HTML extraction spec over html, or return None if it has none."""
+    spec = HTML_SPECS.get(platform)
+    return spec.extract(html) if spec else None
@@ -0,0 +1,41 @@
+import imaplib
+import logging
+import socket
+import ssl
+import time
+
+from config import EMAIL_ACCOUNTS
+from metrics import metrics, span
+
+
+def connect_to_email(retries=3, delay=5, account=None):
+    """
+    Connect to the IMAP server and log in with retry logic. account is one
+    of config.EMAIL_ACCOUNTS and defaults to the first.
+    """
+    account = account or EMAIL_ACCOUNTS[0]
+    for attempt in range(1, retries + 1):
+        try:
+            with span("connect"):
+                logging.info("Attempt %s: Connecting to IMAP server: %s", attempt, account["server"])
+                context = ssl.create_default_context()
+                mail = imaplib.IMAP4_SSL(account["server"], 993, ssl_context=context)
+                logging.info("Successfully connected to IMAP server.")
+
+                logging.info("Logging in as %s...", account["email"])
+                mail.login(account["email"], account["password"])
+                logging.info("Logged in successfully!")
+            return mail
+        except socket.gaierror as e:
+            logging.error("Socket error (getaddrinfo failed): %s", e)
+        except imaplib.IMAP4.error as e:
+            logging.error("IMAP4 error: %s", e)
+        except Exception as e:
+            logging.error("An unexpected error occurred: %s", e)
+        metrics.inc("imap_connect_failures_total", account=account["email"])
+        
+        if attempt < retries:
+            logging.info("Retrying in %s seconds...", delay)
+            time.sleep(delay)
+    
+    raise Exception("Failed to connect to the IMAP server after multiple attempts.")
@@ -0,0 +1,229 @@
+import email
+import logging
+import re
+import threading
+
+HEADER_FIELDS = "BODY.PEEK[HEADER.FIELDS (FROM TO SUBJECT DATE MESSAGE-ID)]"
+
+TOKEN_RE = re.compile(
+    rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}\s*$|([^\s()"\[]+(?:\[[^\]]*\](?:<\d+>)?)?))'
+)
+LPAREN = object()
+RPAREN = object()
+
+
+def _scan(text, literal):
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if not match or match.end() == pos:
+            if not text[pos:].strip():
+                return
+            raise ValueError(f"Cannot parse IMAP response near {text[pos:pos + 40]!r}")
+        pos = match.end()
+        lparen, rparen, quoted, literal_size, atom = match.groups()
+        if lparen:
+            yield LPAREN
+        elif rparen:
+            yield RPAREN
+        elif quoted is not None:
+            yield re.sub(rb"\\(.)", rb"\1", quoted)
+        elif literal_size is not None:
+            yield literal if literal is not None else b""
+        elif atom.upper() == b"NIL":
+            yield None
+        else:
+            yield atom
+
+
+def parse_fetch_response(data):
+    """
+    Parse the first message of an imaplib FETCH response into a dict of
+    upper-cased item names (b"UID", b"BODYSTRUCTURE", b"BODY[1]", ...) to
+    values. Parenthesized lists become Python lists and NIL becomes None.
+    """
+    stack = [[]]
+    for item in data:
+        if item is None:
+            continue
+        head, literal = item if isinstance(item, tuple) else (item, None)
+        for token in _scan(head, literal):
+            if token is LPAREN:
+                stack.append([])
+            elif token is RPAREN:
+                if len(stack) == 1:
+                    raise ValueError("Unbalanced parenthesis in IMAP response")
+                closed = stack.pop()
+                stack[-1].append(closed)
+            else:
+                stack[-1].append(token)
+        if len(stack) == 1 and len(stack[0]) >= 2:
+            break
+    top = stack[0]
+    if len(top) < 2 or not isinstance(top[1], list):
+        raise ValueError("Unexpected FETCH response")
+    items = top[1]
+    return {items[i].upper(): items[i + 1] for i in range(0, len(items) - 1, 2)}
+
+
+def response_size(data):
+    """Number of bytes carried by an imaplib response."""
+    size = 0
+    for item in data:
+        if isinstance(item, tuple):
+            size += sum(len(part) for part in item if part)
+        elif item:
+            size += len(item)
+    return size
+
+
+def find_item(items, prefix):
+    """Return the value of the first item whose name starts with prefix."""
+    for name, value in items.items():
+        if name.startswith(prefix):
+            return value
+    return None
+
+
+def _text(value):
+    return value.decode(errors="ignore").lower() if isinstance(value, bytes) else ""
+
+
+def _params(value):
+    if not isinstance(value, list):
+        return {}
+    return {_text(value[i]): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+
+def _is_multipart(structure):
+    return bool(structure) and isinstance(structure[0], list)
+
+
+def _children(structure):
+    for child in structure:
+        if not isinstance(child, list):
+            break
+        yield child
+
+
+def _part_info(part, section):
+    return {
+        "section": section,
+        "content_type": f"{_text(part[0])}/{_text(part[1])}",
+        "charset": _params(part[2]).get("charset"),
+        "encoding": _text(part[5]) or "7bit",
+        "size": int(part[6]) if len(part) > 6 and part[6] else 0,
+    }
+
+
+def _find_in_part(part, section, content_type):
+    if _is_multipart(part):
+        for i, child in enumerate(_children(part), 1):
+            found = _find_in_part(child, f"{section}.{i}", content_type)
+            if found:
+                return found
+        return None
+    info = _part_info(part, section)
+    if info["content_type"] == content_type:
+        return info
+    if info["content_type"] == "message/rfc822" and len(part) > 8 and isinstance(part[8], list):
+        return _find_in_body(part[8], section + ".", content_type)
+    return None
+
+
+def _find_in_body(structure, prefix, content_type):
+    if _is_multipart(structure):
+        for i, child in enumerate(_children(structure), 1):
+            found = _find_in_part(child, f"{prefix}{i}", content_type)
+            if found:
+                return found
+        return None
+    return _find_in_part(structure, f"{prefix}1", content_type)
+
+
+def find_body_part(structure, content_type="text/plain"):
+    """
+    Locate the first part of the given content type in a parsed BODYSTRUCTURE,
+    in the same depth-first order as Message.walk(). A single-part message
+    always yields section "1". Returns a dict with section, content_type,
+    charset, encoding and size, or None.
+    """
+    if not _is_multipart(structure):
+        return _part_info(structure, "1")
+    return _find_in_body(structure, "", content_type)
+
+
+class FetchStats:
+    """Thread-safe counters for bytes transferred by message fetches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "header_bytes": 0,
+            "body_bytes": 0,
+            "full_fetch_bytes": 0,
+            "rejected_before_body": 0,
+            "max_request_bytes": 0,
+            "last_request_bytes": 0,
+        }
+
+    def record(self, header_bytes=0, body_bytes=0, full_fetch_bytes=0, rejected=False):
+        total = header_bytes + body_bytes + full_fetch_bytes
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["header_bytes"] += header_bytes
+            self._stats["body_bytes"] += body_bytes
+            self._stats["full_fetch_bytes"] += full_fetch_bytes
+            self._stats["rejected_before_body"] += int(rejected)
+            self._stats["max_request_bytes"] = max(self._stats["max_request_bytes"], total)
+            self._stats["last_request_bytes"] = total
+        return total
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["header_bytes"] + stats["body_bytes"] + stats["full_fetch_bytes"]
+        stats["avg_request_bytes"] = total / stats["requests"] if stats["requests"] else 0.0
+        return stats
+
+
+def build_message(header_bytes, part, body_bytes):
+    """
+    Build a single-part email.message.Message from fetched header fields and
+    one body section, so existing parsers can call get_payload(decode=True).
+    """
+    headers = header_bytes.rstrip(b"\r\n")
+    content_type = part["content_type"] if part else "text/plain"
+    mime_headers = ("\r\n" if headers else "") + f"Content-Type: {content_type}"
+    if part and part["charset"]:
+        mime_headers += f'; charset="{part["charset"]}"'
+    mime_headers += f"\r\nContent-Transfer-Encoding: {part['encoding'] if part else '7bit'}\r\n\r\n"
+    return email.message_from_bytes(headers + mime_headers.encode() + (body_bytes or b""))
+
+
+def fetch_headers(mail, uid):
+    """
+    Fetch BODYSTRUCTURE and the envelope header fields for uid.
+    Returns (header_message, header_bytes, bodystructure, bytes_transferred).
+    """
+    status, data = mail.uid("FETCH", uid, f"(BODYSTRUCTURE {HEADER_FIELDS})")
+    if status != "OK" or not data or data[0] is None:
+        return None
+    items = parse_fetch_response(data)
+    header_bytes = find_item(items, b"BODY[HEADER") or b""
+    logging.debug("Fetched headers for UID %r", uid)
+    return email.message_from_bytes(header_bytes), header_bytes, items.get(b"BODYSTRUCTURE"), response_size(data)
+
+
+def fetch_section(mail, uid, section, max_bytes=None):
+    """
+    Fetch a single body section without setting \\Seen, or only its first
+    max_bytes bytes. Returns (bytes, bytes_transferred).
+    """
+    partial = f"<0.{max_bytes}>" if max_bytes else ""
+    status, data = mail.uid("FETCH", uid, f"(BODY.PEEK[{section}]{partial})")
+    if status != "OK" or not data or data[0] is None:
+        return None, 0
+    items = parse_fetch_response(data)
+    return find_item(items, f"BODY[{section}]".encode()) or b"", response_size(data)
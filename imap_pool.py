@@ -0,0 +1,252 @@
+import imaplib
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no IMAP connection becomes available in time."""
+
+
+class PooledConnection:
+    """
+    Wrapper around an imaplib connection that remembers which mailbox is
+    selected so repeated select() calls on a reused connection are free.
+    All other attributes are forwarded to the underlying connection.
+    """
+
+    def __init__(self, mail):
+        self.mail = mail
+        self.selected = None
+        self.select_response = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def select(self, mailbox="inbox", readonly=False):
+        key = (mailbox, readonly)
+        if self.selected == key and self.select_response is not None:
+            return self.select_response
+        status, data = self.mail.select(mailbox, readonly)
+        if status == "OK":
+            self.selected = key
+            self.select_response = (status, data)
+        else:
+            self.selected = None
+            self.select_response = None
+        return status, data
+
+    def noop(self):
+        return self.mail.noop()
+
+    def close(self):
+        """Log out, ignoring errors from an already broken connection."""
+        try:
+            self.mail.logout()
+        except Exception as e:
+            logging.debug("Ignoring error while closing IMAP connection: %s", e)
+
+    def __getattr__(self, name):
+        return getattr(self.mail, name)
+
+
+class IMAPConnectionPool:
+    """
+    Bounded, thread-safe pool of logged-in IMAP connections.
+
+    Connections are health checked with NOOP when they have been idle for
+    longer than health_check_interval, evicted after idle_timeout and
+    re-established with exponential backoff when the server drops them.
+    """
+
+    def __init__(self, factory, max_size=4, idle_timeout=300, health_check_interval=30,
+                 checkout_timeout=30, reconnect_retries=3, backoff_base=0.5, backoff_max=8):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+        self.reconnect_retries = reconnect_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._idle = deque()
+        self._size = 0
+        self._last_error = None
+        self._cond = threading.Condition()
+        self._metrics = {
+            "checkouts": 0,
+            "checkout_wait_total": 0.0,
+            "checkout_wait_max": 0.0,
+            "checkout_timeouts": 0,
+            "connects": 0,
+            "reconnects": 0,
+            "connect_failures": 0,
+            "health_check_failures": 0,
+            "evictions": 0,
+            "discards": 0,
+        }
+
+    def _open(self, reconnect=False):
+        """Create a new connection, backing off between failed attempts."""
+        delay = self.backoff_base
+        for attempt in range(1, self.reconnect_retries + 1):
+            try:
+                mail = self.factory()
+                with self._cond:
+                    self._metrics["connects"] += 1
+                    if reconnect:
+                        self._metrics["reconnects"] += 1
+                    self._last_error = None
+                return PooledConnection(mail)
+            except Exception as e:
+                with self._cond:
+                    self._metrics["connect_failures"] += 1
+                    self._last_error = str(e)
+                logging.error("IMAP pool connect attempt %s failed: %s", attempt, e)
+                if attempt == self.reconnect_retries:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, self.backoff_max)
+
+    def _evict_idle_locked(self):
+        """Drop connections that have sat idle longer than idle_timeout."""
+        now = time.monotonic()
+        evicted = []
+        while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+            evicted.append(self._idle.popleft())
+            self._size -= 1
+            self._metrics["evictions"] += 1
+        return evicted
+
+    def _is_healthy(self, conn):
+        if time.monotonic() - conn.last_used < self.health_check_interval:
+            return True
+        try:
+            status, _ = conn.noop()
+            return status == "OK"
+        except (imaplib.IMAP4.error, OSError, socket.error) as e:
+            logging.warning("IMAP connection failed health check: %s", e)
+            return False
+
+    def acquire(self, timeout=None):
+        """Check out a healthy connection, waiting up to timeout seconds."""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        conn = None
+        evicted = []
+        with self._cond:
+            while True:
+                evicted.extend(self._evict_idle_locked())
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics["checkout_timeouts"] += 1
+                    raise PoolTimeout(f"No IMAP connection available after {timeout} seconds.")
+                self._cond.wait(remaining)
+        for stale in evicted:
+            stale.close()
+
+        try:
+            if conn is None:
+                conn = self._open()
+            elif not self._is_healthy(conn):
+                with self._cond:
+                    self._metrics["health_check_failures"] += 1
+                conn.close()
+                conn = self._open(reconnect=True)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._metrics["checkouts"] += 1
+            self._metrics["checkout_wait_total"] += waited
+            self._metrics["checkout_wait_max"] = max(self._metrics["checkout_wait_max"], waited)
+        conn.last_used = time.monotonic()
+        return conn
+
+    def release(self, conn):
+        """Return a connection to the pool for reuse."""
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Close a broken connection and free its slot."""
+        conn.close()
+        with self._cond:
+            self._size -= 1
+            self._metrics["discards"] += 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """
+        Context manager yielding a pooled connection. Connections that raise
+        IMAP or socket errors are discarded rather than returned to the pool.
+        """
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except (imaplib.IMAP4.abort, OSError, socket.error):
+            self.discard(conn)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def prefill(self, count=None):
+        """
+        Open connections until count of them (max_size by default) sit idle,
+        so the first requests do not wait for a login. Returns the number of
+        connections checked out and put back.
+        """
+        count = self.max_size if count is None else min(count, self.max_size)
+        conns = []
+        try:
+            while len(conns) < count:
+                conns.append(self.acquire())
+        finally:
+            for conn in conns:
+                self.release(conn)
+        return len(conns)
+
+    def close_all(self):
+        """Log out every idle connection."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Return a snapshot of pool size and checkout metrics."""
+        with self._cond:
+            stats = dict(self._metrics)
+            stats["size"] = self._size
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._size - len(self._idle)
+            stats["max_size"] = self.max_size
+            # Healthy until a connection attempt fails, and again once one succeeds
+            stats["healthy"] = self._last_error is None
+            stats["last_error"] = self._last_error
+        checkouts = stats["checkouts"]
+        stats["checkout_wait_avg"] = stats["checkout_wait_total"] / checkouts if checkouts else 0.0
+        return stats
@@ -0,0 +1,283 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import metrics
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+
+# Jobs that can be claimed: queued or retrying ones that are due, and running
+# ones whose lease has expired; parameters are (queued, retrying, now, running, now)
+DUE = "(state IN (?, ?) AND next_run_at <= ?) OR (state = ? AND COALESCE(lease_until, 0) < ?)"
+
+# Outcome status recorded when the handler raises
+HANDLER_ERROR = "error"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_email TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    lease_until REAL,
+    outcome TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_due_time ON jobs (state, next_run_at);
+"""
+
+
+class JobQueue:
+    """
+    Persistent verification job queue backed by SQLite. handler(user_email,
+    platform) starts a verification and returns a concurrent.futures.Future
+    of its outcome, so one dispatcher thread keeps up to max_in_flight jobs
+    running without a thread blocked on each. Jobs whose outcome status is
+    in retry_statuses are retried with exponential backoff up to
+    max_attempts.
+
+    Several processes can work the same database. A job is claimed with a
+    conditional UPDATE, so only one of them runs it, and holds a lease of
+    lease seconds; a running job whose lease has expired, left by a process
+    that died, is claimed again. An outcome is only recorded by the process
+    holding the job's current attempt.
+    """
+
+    def __init__(self, db_path, handler, max_in_flight=100, max_attempts=3, backoff_base=5, backoff_max=60,
+                 retry_statuses=(), poll_interval=1.0, lease=120):
+        self.handler = handler
+        self.max_in_flight = max_in_flight
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = set(retry_statuses)
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        # Finished jobs from the handler's futures, and None to wake the dispatcher
+        self._events = queue.SimpleQueue()
+        self._in_flight = 0
+        self._thread = None
+        self._stop = threading.Event()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        if "lease_until" not in {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}:
+            # Queues created before leases; their running jobs count as expired
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+        self._db.commit()
+
+    def start(self):
+        """Start the dispatcher thread."""
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._dispatch, name="verification-dispatcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._events.put(None)
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval * 2)
+
+    def enqueue(self, user_email, platform):
+        """Add a verification job and return its ID."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, user_email, platform, state, next_run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_email, platform, QUEUED, now, now, now)
+            )
+            self._db.commit()
+        self._events.put(None)
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it does not exist."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, user_email, platform, state, attempts, next_run_at, outcome, created_at, updated_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row[0],
+            "user_email": row[1],
+            "platform": row[2],
+            "state": row[3],
+            "attempts": row[4],
+            "next_run_at": row[5],
+            "outcome": json.loads(row[6]) if row[6] else None,
+            "created_at": row[7],
+            "updated_at": row[8],
+        }
+
+    def counts(self):
+        """Number of jobs in each state."""
+        with self._lock:
+            return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def _claim(self):
+        """Mark the next due job as running and return (id, user_email, platform, attempts)."""
+        with self._lock:
+            try:
+                while True:
+                    now = time.time()
+                    row = self._db.execute(
+                        f"SELECT id, user_email, platform, attempts FROM jobs WHERE {DUE} "
+                        "ORDER BY next_run_at LIMIT 1",
+                        (QUEUED, RETRYING, now, RUNNING, now)
+                    ).fetchone()
+                    if row is None:
+                        return None
+                    # Conditional, so a job another process claimed since the SELECT is left alone
+                    cursor = self._db.execute(
+                        "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? "
+                        f"WHERE id = ? AND attempts = ? AND ({DUE})",
+                        (RUNNING, now + self.lease, now, row[0], row[3], QUEUED, RETRYING, now, RUNNING, now)
+                    )
+                    self._db.commit()
+                    if cursor.rowcount == 1:
+                        return row[0], row[1], row[2], row[3] + 1
+            except sqlite3.OperationalError as e:
+                # Usually another process holding the database lock; try again on the next pass
+                self._db.rollback()
+                logging.warning("Could not claim a verification job: %s", e)
+                return None
+
+    def _dispatch(self):
+        while not self._stop.is_set():
+            # Only claim what the verifier has room for; the rest stay queued
+            while self._in_flight < self.max_in_flight:
+                job = self._claim()
+                if job is None:
+                    break
+                self._submit(*job)
+            try:
+                events = [self._events.get(timeout=self.poll_interval)]
+            except queue.Empty:
+                continue
+            while not self._events.empty():
+                events.append(self._events.get())
+            for event in events:
+                if event is not None:
+                    self._in_flight -= 1
+                    self._finish(*event)
+
+    def _submit(self, job_id, user_email, platform, attempts):
+        try:
+            future = self.handler(user_email, platform)
+        except Exception as e:
+            logging.error("Verification job %s could not be started: %s", job_id, e)
+            self._record(job_id, platform, attempts, self._error_outcome(e))
+            return
+        self._in_flight += 1
+        # Runs on the thread that completes the future; only hands the job back
+        future.add_done_callback(lambda done: self._events.put((job_id, platform, attempts, done)))
+
+    @staticmethod
+    def _error_outcome(e):
+        return {"status": HANDLER_ERROR, "message": f"Verification failed: {e}", "data": None}
+
+    def _finish(self, job_id, platform, attempts, future):
+        try:
+            outcome = future.result()
+        except Exception as e:
+            logging.error("Verification job %s failed: %s", job_id, e)
+            outcome = self._error_outcome(e)
+        self._record(job_id, platform, attempts, outcome)
+
+    def _record(self, job_id, platform, attempts, outcome):
+        retry = outcome["status"] in self.retry_statuses or outcome["status"] == HANDLER_ERROR
+        now = time.time()
+        # Only while this attempt still holds the job; after its lease expired it may have been claimed again
+        owned = "WHERE id = ? AND state = ? AND attempts = ?"
+        with self._lock:
+            try:
+                if retry and attempts < self.max_attempts:
+                    delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+                    logging.info("Retrying verification job %s in %s seconds (%s).", job_id, delay, outcome["status"])
+                    metrics.inc("job_retries_total", platform=platform, status=outcome["status"])
+                    cursor = self._db.execute(
+                        f"UPDATE jobs SET state = ?, next_run_at = ?, outcome = ?, updated_at = ? {owned}",
+                        (RETRYING, now + delay, json.dumps(outcome), now, job_id, RUNNING, attempts)
+                    )
+                else:
+                    cursor = self._db.execute(
+                        f"UPDATE jobs SET state = ?, outcome = ?, updated_at = ? {owned}",
+                        (DONE, json.dumps(outcome), now, job_id, RUNNING, attempts)
+                    )
+                self._db.commit()
+            except sqlite3.OperationalError as e:
+                self._db.rollback()
+                logging.error("Could not record verification job %s; it runs again once its lease expires: %s",
+                              job_id, e)
+                return
+        if cursor.rowcount != 1:
+            logging.warning("Discarding the outcome of verification job %s attempt %s; its lease expired.",
+                            job_id, attempts)
+
+
+class TaskLease:
+    """
+    Named lease in a SQLite database shared by every worker process, for
+    background tasks that must not run in two of them at once, such as an
+    archive pass or a batch sweep. acquire() takes the lease when no other
+    holder has it; one left by a process that died expires after duration
+    seconds.
+    """
+
+    def __init__(self, db_path, name, duration):
+        self.name = name
+        self.duration = duration
+        self.holder = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT, "
+                         "lease_until REAL NOT NULL)")
+        self._db.commit()
+
+    def acquire(self):
+        """Take the lease. Returns False if another holder has it."""
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute("INSERT OR IGNORE INTO leases (name, holder, lease_until) VALUES (?, NULL, 0)",
+                                 (self.name,))
+                # Conditional, like claiming a job, so only one process gets it
+                cursor = self._db.execute(
+                    "UPDATE leases SET holder = ?, lease_until = ? WHERE name = ? AND lease_until < ?",
+                    (self.holder, now + self.duration, self.name, now)
+                )
+                self._db.commit()
+            except sqlite3.OperationalError as e:
+                self._db.rollback()
+                logging.warning("Could not acquire the %s lease: %s", self.name, e)
+                return False
+        return cursor.rowcount == 1
+
+    def release(self):
+        with self._lock:
+            try:
+                self._db.execute("UPDATE leases SET holder = NULL, lease_until = 0 WHERE name = ? AND holder = ?",
+                                 (self.name, self.holder))
+                self._db.commit()
+            except sqlite3.OperationalError as e:
+                # The lease expires on its own
+                self._db.rollback()
+                logging.warning("Could not release the %s lease: %s", self.name, e)
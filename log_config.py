@@ -0,0 +1,106 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+from config import LOG_BODY_MAX_CHARS, LOG_BODY_SAMPLE_RATE, LOG_FORMAT, LOG_LEVEL, LOG_QUEUE_SIZE
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s:%(message)s"
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+_queue_handler = None
+_body_sample_rate = LOG_BODY_SAMPLE_RATE
+_body_max_chars = LOG_BODY_MAX_CHARS
+
+
+class StructuredFormatter(logging.Formatter):
+    """Formats each record as one JSON object, including fields passed with extra=."""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, queue_size=LOG_QUEUE_SIZE,
+                      body_sample_rate=LOG_BODY_SAMPLE_RATE, body_max_chars=LOG_BODY_MAX_CHARS):
+    """
+    Route all logging through a bounded queue drained by a background
+    thread, so request threads never wait on log I/O. fmt is "text" or
+    "json". Safe to call more than once; later calls reconfigure.
+    """
+    global _listener, _queue_handler, _body_sample_rate, _body_max_chars
+    _body_sample_rate = body_sample_rate
+    _body_max_chars = body_max_chars
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(StructuredFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+        root.removeHandler(_queue_handler)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    log_queue = queue.Queue(queue_size)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _queue_handler
+
+
+def dropped_records():
+    """Number of log records dropped because the queue was full."""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def log_body(label, text):
+    """
+    Log a message body at DEBUG for a sample of calls (LOG_BODY_SAMPLE_RATE),
+    truncated to LOG_BODY_MAX_CHARS. Does nothing unless DEBUG is enabled.
+    """
+    if _body_sample_rate <= 0 or not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= _body_sample_rate:
+        return
+    truncated = len(text) > _body_max_chars
+    logging.debug("%s (%d chars%s): %s", label, len(text), ", truncated" if truncated else "",
+                  text[:_body_max_chars])
+
+
+@atexit.register
+def _flush():
+    if _listener is not None:
+        _listener.stop()
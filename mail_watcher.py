@@ -0,0 +1,196 @@
+import email
+import imaplib
+import logging
+import re
+import select
+import ssl
+import threading
+import time
+from email.utils import parseaddr
+
+EXISTS_RE = re.compile(rb"^\* \d+ EXISTS", re.IGNORECASE)
+UID_RE = re.compile(rb"UID (\d+)", re.IGNORECASE)
+
+
+class InboxWatcher:
+    """
+    Background thread that keeps a dedicated IMAP connection in IDLE on the
+    inbox and passes (uid, sender) for every new message to its listeners,
+    so waiting requests wake up as soon as a forward lands instead of sleeping.
+    """
+
+    def __init__(self, factory, mailbox="inbox", refresh_interval=300, heartbeat=1.0,
+                 backoff_base=1, backoff_max=60):
+        self.factory = factory
+        self.mailbox = mailbox
+        self.refresh_interval = refresh_interval
+        self.heartbeat = heartbeat
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.last_uid = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._running = False
+        self._listeners = []
+        self.unsupported = False
+
+    def ensure_started(self):
+        """Start the watcher thread if it is not already running."""
+        with self._lock:
+            if self.unsupported or (self._thread and self._thread.is_alive()):
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="imap-idle-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.heartbeat * 2)
+
+    def is_running(self):
+        """True while the watcher holds an IDLE-capable connection."""
+        return self._running
+
+    def add_listener(self, callback):
+        """
+        Call callback(arrivals) from the watcher thread with the list of new
+        (uid, sender) pairs, and with an empty list whenever the watcher
+        starts or stops running.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _notify_listeners(self, arrivals):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(arrivals)
+            except Exception as e:
+                logging.error("Inbox watcher listener failed: %s", e)
+
+    def _publish(self, arrivals):
+        with self._lock:
+            for uid, _ in arrivals:
+                self.last_uid = max(self.last_uid or 0, uid)
+        if arrivals:
+            self._notify_listeners(arrivals)
+
+    def _set_running(self, running):
+        with self._lock:
+            changed = self._running != running
+            self._running = running
+        if changed:
+            self._notify_listeners([])
+
+    def _run(self):
+        delay = self.backoff_base
+        while not self._stop.is_set():
+            mail = None
+            try:
+                mail = self.factory()
+                if "IDLE" not in mail.capabilities:
+                    logging.warning("IMAP server does not support IDLE; inbox watcher disabled.")
+                    self.unsupported = True
+                    return
+                mail.select(self.mailbox, readonly=True)
+                self._sync_last_uid(mail)
+                self._set_running(True)
+                delay = self.backoff_base
+                while not self._stop.is_set():
+                    self._idle(mail)
+                    self._publish(self._fetch_new(mail))
+            except Exception as e:
+                logging.error("Inbox watcher error: %s", e)
+            finally:
+                self._set_running(False)
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+            if not self._stop.wait(delay):
+                delay = min(delay * 2, self.backoff_max)
+
+    def _sync_last_uid(self, mail):
+        status, data = mail.status(self.mailbox, "(UIDNEXT)")
+        if status != "OK":
+            raise imaplib.IMAP4.error("STATUS UIDNEXT failed")
+        match = re.search(rb"UIDNEXT (\d+)", data[0])
+        with self._lock:
+            self.last_uid = int(match.group(1)) - 1 if match else 0
+
+    def _idle(self, mail):
+        """
+        Run one IDLE cycle. Returns when the server reports EXISTS, when
+        refresh_interval elapses or when the watcher is stopped.
+        """
+        tag = mail._new_tag()
+        mail.send(tag + b" IDLE\r\n")
+        line = mail.readline()
+        if not line.startswith(b"+"):
+            raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+        deadline = time.monotonic() + self.refresh_interval
+        try:
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                if not self._buffered(mail):
+                    readable, _, _ = select.select([mail.sock], [], [], self.heartbeat)
+                    if not readable:
+                        continue
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed during IDLE")
+                if EXISTS_RE.match(line):
+                    break
+        finally:
+            mail.send(b"DONE\r\n")
+            while True:
+                line = mail.readline()
+                if not line:
+                    raise imaplib.IMAP4.abort("Connection closed while ending IDLE")
+                if line.startswith(tag):
+                    break
+
+    @staticmethod
+    def _buffered(mail):
+        """
+        True if imaplib's buffered reader already holds response bytes. A
+        line that came in the same segment as the one before it is never
+        signalled by select() on the socket. The socket is made non-blocking
+        for the check, so an empty buffer is filled only with what has
+        already arrived, including data an SSL layer has decrypted.
+        """
+        timeout = mail.sock.gettimeout()
+        mail.sock.setblocking(False)
+        try:
+            return bool(mail.file.peek(1))
+        except (BlockingIOError, ssl.SSLWantReadError):
+            return False
+        finally:
+            mail.sock.settimeout(timeout)
+
+    def _fetch_new(self, mail):
+        """Return (uid, sender) for every message newer than last_uid."""
+        since = (self.last_uid or 0) + 1
+        status, data = mail.uid("FETCH", f"{since}:*", "(UID BODY.PEEK[HEADER.FIELDS (FROM)])")
+        if status != "OK":
+            return []
+        arrivals = []
+        for item in data:
+            if not isinstance(item, tuple):
+                continue
+            match = UID_RE.search(item[0])
+            if not match:
+                continue
+            uid = int(match.group(1))
+            # "UID n:*" always returns the newest message, even if it is old
+            if uid < since:
+                continue
+            headers = email.message_from_bytes(item[1])
+            from_addr = parseaddr(headers.get("From", ""))[1].lower()
+            arrivals.append((uid, from_addr))
+        return arrivals
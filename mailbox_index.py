@@ -0,0 +1,167 @@
+import email
+import logging
+import re
+import sqlite3
+import threading
+from email.header import decode_header, make_header
+from email.utils import parseaddr
+
+UID_RE = re.compile(rb"UID (\d+)", re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailbox_state (
+    mailbox TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    synced_uid INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    mailbox TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    from_addr TEXT NOT NULL,
+    subject TEXT,
+    date TEXT,
+    PRIMARY KEY (mailbox, uid)
+);
+CREATE INDEX IF NOT EXISTS messages_by_sender ON messages (mailbox, from_addr, uid);
+"""
+
+
+def decode_subject(raw_subject):
+    """Decode an RFC 2047 encoded subject header into text."""
+    if not raw_subject:
+        return ""
+    try:
+        return str(make_header(decode_header(raw_subject)))
+    except Exception:
+        return raw_subject
+
+
+class MailboxIndex:
+    """
+    Local SQLite index of envelope headers (From, Subject, Date, UID).
+
+    sync() only fetches UIDs above the last synced UID and starts over when
+    the mailbox UIDVALIDITY changes, so "latest message from X" lookups are
+    answered from a B-tree index instead of a server-side SEARCH.
+    """
+
+    def __init__(self, db_path, mailbox="inbox", batch_size=500):
+        self.mailbox = mailbox
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    def _state(self):
+        row = self._db.execute(
+            "SELECT uidvalidity, synced_uid FROM mailbox_state WHERE mailbox = ?", (self.mailbox,)
+        ).fetchone()
+        return row if row else (None, 0)
+
+    def _reset(self, uidvalidity):
+        logging.info("UIDVALIDITY of %s changed; rebuilding mailbox index.", self.mailbox)
+        self._db.execute("DELETE FROM messages WHERE mailbox = ?", (self.mailbox,))
+        self._db.execute(
+            "INSERT OR REPLACE INTO mailbox_state (mailbox, uidvalidity, synced_uid) VALUES (?, ?, 0)",
+            (self.mailbox, uidvalidity)
+        )
+
+    def sync(self, mail):
+        """
+        Bring the index up to date with the server over mail, which must have
+        the mailbox selected. Returns the number of newly indexed messages.
+        """
+        uidvalidity = self._selected_uidvalidity(mail)
+        last_uid = self._last_uid(mail)
+
+        with self._lock:
+            known_validity, synced_uid = self._state()
+            if known_validity != uidvalidity:
+                self._reset(uidvalidity)
+                synced_uid = 0
+            if last_uid <= synced_uid:
+                self._db.commit()
+                return 0
+
+            indexed = 0
+            start = synced_uid + 1
+            while start <= last_uid:
+                end = min(start + self.batch_size - 1, last_uid)
+                rows = self._fetch_envelopes(mail, start, end)
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO messages (mailbox, uid, from_addr, subject, date) VALUES (?, ?, ?, ?, ?)",
+                    [(self.mailbox,) + row for row in rows]
+                )
+                self._db.execute(
+                    "UPDATE mailbox_state SET synced_uid = ? WHERE mailbox = ?", (end, self.mailbox)
+                )
+                self._db.commit()
+                indexed += len(rows)
+                start = end + 1
+            logging.debug("Indexed %s new messages in %s.", indexed, self.mailbox)
+            return indexed
+
+    def _selected_uidvalidity(self, mail):
+        """UIDVALIDITY reported when the mailbox was selected; it cannot change while selected."""
+        values = mail.untagged_responses.get("UIDVALIDITY")
+        if not values:
+            raise RuntimeError(f"No UIDVALIDITY known for mailbox {self.mailbox}; select it first")
+        return int(values[-1])
+
+    def _last_uid(self, mail):
+        """
+        Highest UID in the selected mailbox, or 0 when it is empty. STATUS
+        must not be used on the selected mailbox (RFC 3501 6.3.10) and some
+        servers answer it with a stale UIDNEXT there. A UID FETCH of "*" is
+        one round trip too, and the server reports new mail before answering it.
+        """
+        status, data = mail.uid("FETCH", "*", "(UID)")
+        if status != "OK":
+            raise RuntimeError(f"UID FETCH * failed for mailbox {self.mailbox}")
+        uids = [int(match.group(1)) for item in data if item
+                for match in [UID_RE.search(item[0] if isinstance(item, tuple) else item)] if match]
+        return max(uids, default=0)
+
+    def _fetch_envelopes(self, mail, start, end):
+        status, data = mail.uid(
+            "FETCH", f"{start}:{end}", "(UID BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE)])"
+        )
+        if status != "OK":
+            raise RuntimeError(f"Failed to fetch headers for UIDs {start}:{end}")
+        rows = []
+        for item in data:
+            if not isinstance(item, tuple):
+                continue
+            match = UID_RE.search(item[0])
+            if not match:
+                continue
+            uid = int(match.group(1))
+            if not start <= uid <= end:
+                continue
+            headers = email.message_from_bytes(item[1])
+            from_addr = parseaddr(headers.get("From", ""))[1].lower()
+            rows.append((uid, from_addr, decode_subject(headers.get("Subject")), headers.get("Date")))
+        return rows
+
+    def forget(self, uids):
+        """Drop messages that were moved out of the mailbox from the index."""
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM messages WHERE mailbox = ? AND uid = ?", [(self.mailbox, int(uid)) for uid in uids]
+            )
+            self._db.commit()
+
+    def uidvalidity(self):
+        """UIDVALIDITY of the mailbox as of the last sync, or None."""
+        with self._lock:
+            return self._state()[0]
+
+    def latest_from(self, from_addr):
+        """Return (uid, subject, date) of the newest indexed message from from_addr, or None."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT uid, subject, date FROM messages WHERE mailbox = ? AND from_addr = ? "
+                "ORDER BY uid DESC LIMIT 1",
+                (self.mailbox, from_addr.lower())
+            ).fetchone()
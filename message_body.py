@@ -0,0 +1,127 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+
+from html_extraction import PARSER_BACKEND
+
+FORWARD_MARKERS = [
+    "---------- Forwarded message ----------",
+    "Begin forwarded message:",
+    "----- Original Message -----"
+]
+FORWARD_MARKER_RE = re.compile("|".join(re.escape(marker) for marker in FORWARD_MARKERS))
+
+
+def decode_part(part):
+    """Decode a MIME part's payload using its declared charset."""
+    payload = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return payload.decode(charset, errors="ignore")
+    except LookupError:
+        return payload.decode("utf-8", errors="ignore")
+
+
+def html_to_text(html):
+    """Render an HTML body as plain text, one block element per line."""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, PARSER_BACKEND).get_text("\n")
+
+
+def extract_body_source(msg):
+    """
+    Return (text, html) for msg. text is its first text/plain part, decoded.
+    HTML-only mail falls back to the text of its first text/html part, and
+    html is then that part's decoded HTML; otherwise html is None.
+    """
+    if not msg.is_multipart():
+        text = decode_part(msg)
+        if msg.get_content_type() == "text/html":
+            return html_to_text(text), text
+        return text, None
+
+    html_part = None
+    for part in msg.walk():
+        content_type = part.get_content_type()
+        if content_type == "text/plain":
+            return decode_part(part), None
+        if content_type == "text/html" and html_part is None:
+            html_part = part
+    if html_part is not None:
+        html = decode_part(html_part)
+        return html_to_text(html), html
+    return "", None
+
+
+def extract_forwarded_email(body):
+    """
+    Extract the forwarded email content from the outer email body.
+    Markers are tried in FORWARD_MARKERS order, found with a single scan.
+    """
+    first_seen = {}
+    for match in FORWARD_MARKER_RE.finditer(body):
+        first_seen.setdefault(match.group(), match.start())
+        if match.group() == FORWARD_MARKERS[0]:
+            break
+
+    for marker in FORWARD_MARKERS:
+        if marker in first_seen:
+            return body[first_seen[marker]:]
+
+    logging.warning("No forwarded email marker found. Returning full body.")
+    return body
+
+
+class NormalizedMessage:
+    """
+    A message whose body has been decoded once. text is the decoded body
+    and forwarded_text the forwarded section; both have quoted-printable
+    soft line breaks removed. html is the decoded HTML the body was
+    rendered from, or None when the message has a text/plain part.
+    """
+
+    def __init__(self, msg):
+        self.message_id = msg.get("Message-ID")
+        self.subject = msg.get("Subject")
+        self.raw_text, self.html = extract_body_source(msg)
+        self.text = self.raw_text.replace("=\n", "")
+        self._forwarded_text = None
+
+    @property
+    def forwarded_text(self):
+        if self._forwarded_text is None:
+            self._forwarded_text = extract_forwarded_email(self.raw_text).replace("=\n", "")
+        return self._forwarded_text
+
+
+class NormalizedMessageCache:
+    """Thread-safe LRU cache of NormalizedMessage objects keyed by Message-ID."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, msg):
+        """Return the normalized form of msg, decoding it only on a cache miss."""
+        message_id = (msg.get("Message-ID") or "").strip()
+        if message_id:
+            with self._lock:
+                cached = self._entries.get(message_id)
+                if cached is not None:
+                    self._entries.move_to_end(message_id)
+                    self.hits += 1
+                    return cached
+                self.misses += 1
+
+        normalized = NormalizedMessage(msg)
+        if message_id and self.max_entries > 0:
+            with self._lock:
+                self._entries[message_id] = normalized
+                self._entries.move_to_end(message_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return normalized
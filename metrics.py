@@ -0,0 +1,160 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Thread-safe counters, gauges and histograms keyed by name and labels,
+    rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self, prefix="ticket_verifier"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._kinds = {}
+        self._help = {}
+        self._values = {}
+
+    def describe(self, name, kind, help_text):
+        """Declare a metric's type ("counter", "gauge" or "histogram") and help text."""
+        self._kinds[name] = kind
+        self._help[name] = help_text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._values.get(key)
+            if histogram is None:
+                histogram = self._values[key] = Histogram()
+            histogram.observe(value)
+
+    def render(self):
+        """Return all metrics in the Prometheus text format."""
+        with self._lock:
+            items = sorted(self._values.items(), key=lambda item: item[0])
+            lines = []
+            current = None
+            for (name, labels), value in items:
+                full_name = f"{self.prefix}_{name}"
+                if name != current:
+                    current = name
+                    if name in self._help:
+                        lines.append(f"# HELP {full_name} {self._help[name]}")
+                    kind = self._kinds.get(name, "histogram" if isinstance(value, Histogram) else "untyped")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                if isinstance(value, Histogram):
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + (float("inf"),), value.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{full_name}_bucket{_format_labels(labels, [('le', le)])} {cumulative}")
+                    lines.append(f"{full_name}_sum{_format_labels(labels)} {value.sum}")
+                    lines.append(f"{full_name}_count{_format_labels(labels)} {value.count}")
+                else:
+                    lines.append(f"{full_name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """Stage timings of one verification."""
+
+    def __init__(self, user_email, platform):
+        self.user_email = user_email
+        self.platform = platform
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, stage, seconds):
+        self.spans.append((stage, seconds))
+
+    def summary(self, status):
+        total = time.perf_counter() - self.start
+        stages = ", ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.spans)
+        return f"Verification trace for {self.user_email} ({self.platform}): status={status}, " \
+               f"total={total * 1000:.1f}ms, {stages}"
+
+
+metrics = Metrics()
+metrics.describe("stage_seconds", "histogram", "Time spent in each verification stage.")
+metrics.describe("verification_seconds", "histogram", "End-to-end verification time by outcome.")
+metrics.describe("verifications_total", "counter", "Verifications by platform and outcome status.")
+metrics.describe("missing_fields_total", "counter", "Parsed tickets missing a required field.")
+metrics.describe("html_fallbacks_total", "counter", "HTML extractions run after the text parse missed fields.")
+metrics.describe("archived_messages_total", "counter", "Messages moved out of the inbox by reason.")
+metrics.describe("job_retries_total", "counter", "Verification jobs scheduled for a retry.")
+metrics.describe("imap_connect_failures_total", "counter", "Failed IMAP connection attempts.")
+metrics.describe("imap_pool_size", "gauge", "Open pooled IMAP connections.")
+metrics.describe("imap_pool_in_use", "gauge", "Pooled IMAP connections checked out.")
+metrics.describe("imap_pool_idle", "gauge", "Pooled IMAP connections waiting to be reused.")
+metrics.describe("imap_account_healthy", "gauge", "1 while the receiving account's last connection attempt succeeded.")
+metrics.describe("verification_jobs", "gauge", "Verification jobs by state.")
+metrics.describe("prechecks_total", "counter", "Prechecks by platform and status.")
+metrics.describe("result_cache_lookups_total", "counter", "Result cache lookups by hit or miss.")
+metrics.describe("log_records_dropped", "gauge", "Log records dropped because the log queue was full.")
+
+# The verification running in the current thread or task, if any. Executors
+# do not inherit context, so work handed to them must run in a copied context.
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as stage of the current verification."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        trace = current_trace.get()
+        metrics.observe("stage_seconds", elapsed, stage=stage, platform=trace.platform if trace else "none")
+        if trace is not None:
+            trace.add(stage, elapsed)
+
+
+def finish_trace(trace, status, log=False):
+    """Record the outcome of a traced verification and optionally log its stages."""
+    metrics.observe("verification_seconds", time.perf_counter() - trace.start,
+                    platform=trace.platform, status=status)
+    metrics.inc("verifications_total", platform=trace.platform, status=status)
+    if log:
+        logging.info(trace.summary(status))
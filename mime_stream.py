@@ -0,0 +1,160 @@
+import email
+import io
+
+from config import MIME_MAX_HEADER_BYTES, MIME_MAX_MESSAGE_BYTES, MIME_MAX_TEXT_BYTES
+from imap_fetch import build_message
+
+# Top-level headers that describe the original MIME structure; the single
+# part built from the text body gets its own
+MIME_HEADERS = (b"content-type:", b"content-transfer-encoding:", b"mime-version:")
+
+# Scanner modes for the body of the current entity
+SKIP = 0
+COLLECT_TEXT = 1
+COLLECT_HTML = 2
+
+
+def _lines(source, max_bytes, info):
+    """Yield lines of source, stopping once max_bytes have been read."""
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    for line in stream:
+        info["scanned_bytes"] += len(line)
+        if info["scanned_bytes"] > max_bytes:
+            info["truncated"] = True
+            return
+        yield line
+
+
+def _read_headers(lines, max_bytes):
+    """Consume a header block from lines, keeping at most max_bytes of it."""
+    kept = []
+    size = 0
+    for line in lines:
+        if line in (b"\r\n", b"\n"):
+            break
+        size += len(line)
+        if size <= max_bytes:
+            kept.append(line)
+    return b"".join(kept)
+
+
+def _strip_mime_headers(header_bytes):
+    kept = []
+    skipping = False
+    for line in header_bytes.splitlines(keepends=True):
+        if line[:1] in (b" ", b"\t"):
+            if not skipping:
+                kept.append(line)
+            continue
+        skipping = line.lower().startswith(MIME_HEADERS)
+        if not skipping:
+            kept.append(line)
+    return b"".join(kept)
+
+
+def _part_info(headers):
+    return {
+        "content_type": headers.get_content_type(),
+        "charset": headers.get_content_charset(),
+        "encoding": (headers.get("Content-Transfer-Encoding") or "7bit").strip().lower(),
+    }
+
+
+def _mode_for(headers, have_html):
+    if headers.get_content_disposition() == "attachment":
+        return SKIP
+    content_type = headers.get_content_type()
+    if content_type == "text/plain":
+        return COLLECT_TEXT
+    if content_type == "text/html" and not have_html:
+        return COLLECT_HTML
+    return SKIP
+
+
+def _body(chunks):
+    # The line break before a boundary belongs to the boundary
+    body = b"".join(chunks)
+    if body.endswith(b"\r\n"):
+        return body[:-2]
+    return body[:-1] if body.endswith(b"\n") else body
+
+
+def parse_first_text_part(source, max_bytes=MIME_MAX_MESSAGE_BYTES, max_text_bytes=MIME_MAX_TEXT_BYTES,
+                          max_header_bytes=MIME_MAX_HEADER_BYTES):
+    """
+    Stream a raw message (bytes or a binary file object) line by line and
+    return (message, info). message is a single-part Message with the
+    top-level headers and the first text/plain body, or the first text/html
+    body if there is no plain text part. It has an empty body if there is
+    neither.
+
+    Scanning stops as soon as the text/plain part ends. Attachments and other
+    parts are skipped without being buffered, at most max_bytes of source
+    are read and the text body is cut at max_text_bytes. info reports
+    scanned_bytes, skipped_parts and whether anything was truncated.
+    """
+    info = {"scanned_bytes": 0, "skipped_parts": 0, "truncated": False}
+    lines = _lines(source, max_bytes, info)
+
+    top_header_bytes = _read_headers(lines, max_header_bytes)
+    headers = email.message_from_bytes(top_header_bytes)
+    boundaries = []
+    html = None
+    mode, part, chunks, size = SKIP, None, [], 0
+
+    def enter(entity_headers):
+        nonlocal mode, part, chunks, size
+        boundary = entity_headers.get_boundary() if entity_headers.get_content_maintype() == "multipart" else None
+        if boundary:
+            boundaries.append(b"--" + boundary.encode("ascii", "ignore"))
+            mode = SKIP
+            return
+        if entity_headers.get_content_type() == "message/rfc822":
+            # Forwarded as an attachment: descend into the embedded message
+            enter(email.message_from_bytes(_read_headers(lines, max_header_bytes)))
+            return
+        mode = _mode_for(entity_headers, html is not None)
+        if mode == SKIP:
+            info["skipped_parts"] += 1
+        part, chunks, size = _part_info(entity_headers), [], 0
+
+    enter(headers)
+    for line in lines:
+        if boundaries and line.startswith(b"--"):
+            marker = line.rstrip(b"\r\n")
+            level = next((i for i in range(len(boundaries) - 1, -1, -1)
+                          if marker == boundaries[i] or marker == boundaries[i] + b"--"), None)
+            if level is not None:
+                if mode == COLLECT_TEXT:
+                    return build_message(_strip_mime_headers(top_header_bytes), part, _body(chunks)), info
+                if mode == COLLECT_HTML:
+                    html = (part, _body(chunks))
+                closing = marker.endswith(b"--") and marker != boundaries[level]
+                del boundaries[level + (0 if closing else 1):]
+                if closing:
+                    mode = SKIP
+                else:
+                    enter(email.message_from_bytes(_read_headers(lines, max_header_bytes)))
+                continue
+        if mode == SKIP:
+            continue
+        size += len(line)
+        if size > max_text_bytes:
+            info["truncated"] = True
+            line = line[:len(line) - (size - max_text_bytes)]
+            chunks.append(line)
+            if mode == COLLECT_TEXT:
+                break
+            html = (part, _body(chunks))
+            mode = SKIP
+            continue
+        chunks.append(line)
+
+    # End of input inside the text part, or a truncated one
+    if mode == COLLECT_TEXT:
+        return build_message(_strip_mime_headers(top_header_bytes), part, b"".join(chunks)), info
+    if mode == COLLECT_HTML:
+        html = (part, b"".join(chunks))
+    if html is not None:
+        return build_message(_strip_mime_headers(top_header_bytes), html[0], html[1]), info
+    return build_message(_strip_mime_headers(top_header_bytes), None, b""), info
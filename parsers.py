@@ -0,0 +1,183 @@
+import logging
+
+from config import PLATFORM_EMAILS, NORMALIZED_MESSAGE_CACHE_SIZE
+from extraction import extract_platform_fields
+from html_extraction import compile_html_specs, extract_html_fields
+from log_config import log_body
+from message_body import NormalizedMessageCache
+from metrics import metrics, span
+from platforms import registry
+
+# Decoded message bodies keyed by Message-ID, so re-verifying a mail skips decoding
+normalized_messages = NormalizedMessageCache(NORMALIZED_MESSAGE_CACHE_SIZE)
+
+def normalize_email_fields(fields):
+    """Lower-case the extracted From/To addresses, warning when one is missing."""
+    for key, field_name in (("from_email", "From:"), ("to_email", "To:")):
+        if fields[key]:
+            fields[key] = fields[key].strip().lower()
+        else:
+            logging.warning("Email address not found for field: %s", field_name)
+    return fields
+
+def strip_or_none(value):
+    return value.strip() if value else None
+
+@registry.register("bookmyshow", "BookMyShow", PLATFORM_EMAILS["bookmyshow"],
+                   signatures=[r"Booking confirmed for", r"bookmyshow"])
+def parse_bookmyshow_email(msg):
+    """Parse BookMyShow email format."""
+    # Forwarded section of the decoded body, with soft line breaks removed
+    forwarded_email = normalized_messages.get(msg).forwarded_text
+    if not forwarded_email:
+        return None
+
+    # Extract the From/To addresses and BookMyShow specific fields in one scan
+    fields = normalize_email_fields(extract_platform_fields("bookmyshow", forwarded_email))
+
+    return {
+        "from_email": fields["from_email"],
+        "to_email": fields["to_email"],
+        "booking_id": strip_or_none(fields["booking_id"]),
+        "venue": strip_or_none(fields["venue"]),
+        "date_time": strip_or_none(fields["date_time"]),
+        "event_name": strip_or_none(fields["event_name"]),
+        "quantity": strip_or_none(fields["quantity"])
+    }
+
+@registry.register("zomato", "Zomato", PLATFORM_EMAILS["zomato"],
+                   signatures=[r"You just scored tickets to", r"zomato"])
+def parse_zomato_email(msg):
+    """Parse Zomato email format."""
+    # Forwarded section of the decoded body, with soft line breaks removed
+    forwarded_email = normalized_messages.get(msg).forwarded_text
+    if not forwarded_email:
+        return None
+
+    # Extract the From/To addresses and Zomato specific fields in one scan
+    fields = normalize_email_fields(extract_platform_fields("zomato", forwarded_email))
+
+    # Note: Venue might not be directly available in the email template shown
+    venue = "Venue information not available in email"
+
+    return {
+        "from_email": fields["from_email"],
+        "to_email": fields["to_email"],
+        "booking_id": strip_or_none(fields["booking_id"]),
+        "venue": venue,
+        "date_time": strip_or_none(fields["date_time"]),
+        "event_name": strip_or_none(fields["event_name"]),
+        "quantity": strip_or_none(fields["quantity"])
+    }
+
+@registry.register("paytminsider", "Paytm Insider", PLATFORM_EMAILS["paytminsider"],
+                   signatures=[r"insider\.in", r"Paytm Insider"])
+def parse_paytminsider_email(msg):
+    """Parse Paytm Insider email format."""
+    normalized = normalized_messages.get(msg)
+
+    # Log a sample of raw bodies for debugging, capped in size
+    log_body("Raw Paytm Insider email body", normalized.raw_text)
+
+    # Soft line breaks have already been removed from the decoded body
+    body = normalized.text
+
+    # Extract the From/To addresses and Paytm Insider specific fields in one scan
+    fields = normalize_email_fields(extract_platform_fields("paytminsider", body))
+    from_email = fields["from_email"]
+    to_email = fields["to_email"]
+    booking_id = strip_or_none(fields["booking_id"])
+
+    # Venue spans the lines between "Venue" and "Get Directions"; join them with commas
+    if fields["venue"]:
+        venue = ", ".join([line.strip() for line in fields["venue"].splitlines() if line]).strip(", ")
+    else:
+        venue = None
+
+    date_time = f"{fields['date'].strip()} {fields['time'].strip()}" if fields["date"] and fields["time"] else None
+    event_name = strip_or_none(fields["event_name"])
+    quantity = fields["quantity"].strip() if fields["quantity"] else "1"
+    # Addresses are left out of the log; they identify the user
+    logging.debug("Extracted Paytm Insider ticket: booking_id=%s, venue=%s, date_time=%s, event_name=%s, quantity=%s",
+                  booking_id, venue, date_time, event_name, quantity)
+
+    return {
+        "from_email": from_email,
+        "to_email": to_email,
+        "booking_id": booking_id,
+        "venue": venue,
+        "date_time": date_time,
+        "event_name": event_name,
+        "quantity": quantity
+    }
+
+@registry.register("dice", "Dice", PLATFORM_EMAILS["dice"],
+                   signatures=[r"dice\.fm", r"dice_id="])
+def parse_dice_email(msg):
+    """Parse DICE email format."""
+    # Forwarded section of the decoded body, with soft line breaks removed
+    forwarded_email = normalized_messages.get(msg).forwarded_text
+    if not forwarded_email:
+        return None
+
+    # Extract the From/To addresses and DICE specific fields in one scan.
+    # The booking ID is the dice_id URL parameter, and the quantity comes
+    # from the "Tickets N ... Group of N" ticket details section.
+    fields = normalize_email_fields(extract_platform_fields("dice", forwarded_email))
+
+    return {
+        "from_email": fields["from_email"],
+        "to_email": fields["to_email"],
+        "booking_id": fields["booking_id"],
+        "venue": strip_or_none(fields["venue"]),
+        "date_time": strip_or_none(fields["date_time"]),
+        "event_name": strip_or_none(fields["event_name"]),
+        "quantity": fields["quantity"]
+    }
+
+def get_platform_email(platform):
+    """Sender address registered for platform, or None."""
+    registered = registry.get(platform)
+    return registered.sender if registered else None
+
+def detect_platform(msg):
+    """Return the registered platform msg was forwarded from, or None."""
+    normalized = normalized_messages.get(msg)
+    return registry.detect(normalized.subject, normalized.forwarded_text)
+
+def warm_up():
+    """
+    Compile the platform detection regexes and the HTML specs' selectors,
+    importing bs4, so the first verification does not pay for them.
+    """
+    # The registry compiles its regexes on the first detect()
+    registry.detect("", "")
+    compile_html_specs()
+
+def fill_from_html(platform, html, parsed_data):
+    """
+    Run the platform's CSS-selector spec over html and fill the fields the
+    text parse left empty.
+    """
+    with span("html_parse"):
+        html_fields = extract_html_fields(platform, html)
+    if html_fields is None:
+        return parsed_data
+    filled = {name: value for name, value in html_fields.items() if value and not parsed_data.get(name)}
+    metrics.inc("html_fallbacks_total", platform=platform, result="filled" if filled else "no_change")
+    logging.info("HTML fallback for %s filled: %s", platform, ", ".join(filled) or "nothing")
+    return {**parsed_data, **filled}
+
+def parse_email(msg, platform):
+    """
+    Parse the email message based on the selected platform.
+    Returns a dictionary with extracted data. For HTML-only mail whose
+    text parse missed a field, the HTML is parsed for the missing details.
+    """
+    parsed_data = registry.parse(platform, msg)
+    if not parsed_data or all(parsed_data.values()):
+        return parsed_data
+    html = normalized_messages.get(msg).html
+    if html is None:
+        return parsed_data
+    return fill_from_html(platform, html, parsed_data)
@@ -0,0 +1,122 @@
+import logging
+import re
+import threading
+import time
+
+# Only the start of the forwarded text is scanned when detecting the platform;
+# the forwarded From/Subject headers always appear there.
+DETECTION_WINDOW = 4000
+
+
+class Platform:
+    """
+    A ticket platform: its sender address, parser and signatures, which are
+    regexes matched against the subject and the start of the forwarded text
+    when the sender address is not found.
+    """
+
+    def __init__(self, name, display_name, sender, parser, signatures=()):
+        self.name = name
+        self.display_name = display_name
+        self.sender = sender
+        self.parser = parser
+        self.signatures = list(signatures)
+
+
+class ParserStats:
+    """Thread-safe per-platform call counts and timings for parsers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, platform, elapsed, failed):
+        with self._lock:
+            stats = self._stats.setdefault(platform, {
+                "calls": 0, "failures": 0, "total_seconds": 0.0, "max_seconds": 0.0
+            })
+            stats["calls"] += 1
+            stats["failures"] += int(failed)
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {platform: dict(stats) for platform, stats in self._stats.items()}
+        for stats in snapshot.values():
+            stats["avg_seconds"] = stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0
+        return snapshot
+
+
+class PlatformRegistry:
+    """
+    Registry of supported platforms. detect() classifies a forwarded email
+    with one precompiled scan for every registered sender address, falling
+    back to the platforms' signatures, so mail for the wrong or an unknown
+    platform is caught before any parser runs.
+    """
+
+    def __init__(self):
+        self._platforms = {}
+        self._sender_re = None
+        self._signature_re = None
+        self.stats = ParserStats()
+
+    def register(self, name, display_name, sender, signatures=()):
+        """Decorator registering the decorated function as name's parser."""
+        def decorator(parser):
+            self._platforms[name] = Platform(name, display_name, sender, parser, signatures)
+            self._sender_re = None
+            self._signature_re = None
+            return parser
+        return decorator
+
+    def get(self, name):
+        return self._platforms.get(name)
+
+    def all(self):
+        return list(self._platforms.values())
+
+    def __contains__(self, name):
+        return name in self._platforms
+
+    def _compile(self):
+        senders = []
+        signature_groups = []
+        for platform in self._platforms.values():
+            senders.append(f"(?P<{platform.name}>{re.escape(platform.sender)})")
+            if platform.signatures:
+                signatures = "|".join(platform.signatures)
+                signature_groups.append(f"(?P<{platform.name}>{signatures})")
+        self._sender_re = re.compile("|".join(senders), re.IGNORECASE)
+        self._signature_re = re.compile("|".join(signature_groups), re.IGNORECASE) if signature_groups else None
+
+    def detect(self, subject, text):
+        """Return the name of the platform text was forwarded from, or None."""
+        if self._sender_re is None:
+            self._compile()
+        match = self._sender_re.search(text, 0, DETECTION_WINDOW)
+        if match:
+            return match.lastgroup
+        if self._signature_re is not None:
+            match = self._signature_re.search(subject or "") or self._signature_re.search(text, 0, DETECTION_WINDOW)
+            if match:
+                return match.lastgroup
+        return None
+
+    def parse(self, name, msg):
+        """Run name's parser on msg, recording its timing."""
+        platform = self._platforms.get(name)
+        if platform is None:
+            logging.error("Unsupported platform: %s", name)
+            return None
+        start = time.perf_counter()
+        result = None
+        try:
+            result = platform.parser(msg)
+            return result
+        finally:
+            self.stats.record(name, time.perf_counter() - start, failed=result is None)
+
+
+registry = PlatformRegistry()
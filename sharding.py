@@ -0,0 +1,84 @@
+import bisect
+import hashlib
+import os
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+def shard_path(path, number):
+    """path for account number 1, and path with "-<number>" before the extension for the others."""
+    if number == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{number}{ext}"
+
+
+class HashRing:
+    """
+    Consistent hash ring. Each node is placed at replicas points on the ring
+    and a key belongs to the first node point at or after its hash, so adding
+    or removing a node only moves the keys next to that node's points.
+    """
+
+    def __init__(self, nodes, replicas=100):
+        points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        if not self._nodes:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+class MailboxShard:
+    """
+    One receiving account with its own connection pool, IDLE watcher,
+    mailbox index, verifier and inbox archiver.
+    """
+
+    def __init__(self, number, account, pool, watcher, index, verifier, batch_results, archiver):
+        self.number = number
+        self.account = account
+        self.pool = pool
+        self.watcher = watcher
+        self.index = index
+        self.verifier = verifier
+        self.batch_results = batch_results
+        self.archiver = archiver
+
+    @property
+    def email(self):
+        return self.account["email"]
+
+    def stats(self):
+        """Pool statistics and health of this shard."""
+        pool = self.pool.stats()
+        return {
+            "email": self.email,
+            "pool": pool,
+            "watcher_running": self.watcher.is_running(),
+            "healthy": pool["healthy"],
+        }
+
+
+class ShardRouter:
+    """Maps each user to one of the shards by consistent hashing of their address."""
+
+    def __init__(self, shards, replicas=100):
+        self.shards = list(shards)
+        self._by_email = {shard.email: shard for shard in self.shards}
+        self._ring = HashRing(self._by_email, replicas)
+
+    def for_user(self, user_email):
+        return self._by_email[self._ring.node_for(user_email.strip().lower())]
+
+    def submit(self, user_email, platform):
+        """Start verifying user_email's forward on its shard; returns a Future of the outcome."""
+        return self.for_user(user_email).verifier.submit(user_email, platform)
+
+    def stats(self):
+        return {shard.email: shard.stats() for shard in self.shards}
@@ -0,0 +1,111 @@
+# test_imap_fetch.py
+
+from email.message import EmailMessage
+
+import pytest
+
+from benchmarks.fake_imap import FakeIMAPServer
+from imap_fetch import fetch_headers, fetch_section, find_body_part, parse_fetch_response
+
+TEXT_PLAIN = b'("TEXT" "PLAIN" ("CHARSET" "utf-8") NIL NIL "QUOTED-PRINTABLE" 120 4)'
+TEXT_HTML = b'("TEXT" "HTML" ("CHARSET" "iso-8859-1") NIL NIL "BASE64" 300 6)'
+PDF = b'("APPLICATION" "PDF" ("NAME" "ticket.pdf") NIL NIL "BASE64" 5000)'
+ENVELOPE = b'("Sat, 01 Mar 2025 10:00:00 +0000" "Your tickets" NIL NIL NIL NIL NIL NIL NIL "<a@b>")'
+
+
+def bodystructure(structure):
+    """Parse a one-line FETCH response carrying structure as its BODYSTRUCTURE."""
+    return parse_fetch_response([b"1 (UID 7 BODYSTRUCTURE " + structure + b")"])[b"BODYSTRUCTURE"]
+
+
+def rfc822(body, size=2000):
+    """A message/rfc822 part holding a message whose body structure is body."""
+    return b'("MESSAGE" "RFC822" NIL NIL NIL "7BIT" %d ' % size + ENVELOPE + b" " + body + b" 40)"
+
+
+def test_literals_quoted_strings_and_nil():
+    data = [
+        (b'1 (UID 42 FLAGS (\\Seen) BODY[HEADER.FIELDS (FROM SUBJECT)] {37}',
+         b"From: a@example.com\r\nSubject: Hi\r\n\r\n"),
+        b' X-NOTE "say \\"hi\\"" X-EMPTY NIL)',
+    ]
+    items = parse_fetch_response(data)
+    assert items[b"UID"] == b"42"
+    assert items[b"FLAGS"] == [b"\\Seen"]
+    assert items[b"BODY[HEADER.FIELDS (FROM SUBJECT)]"] == b"From: a@example.com\r\nSubject: Hi\r\n\r\n"
+    assert items[b"X-NOTE"] == b'say "hi"'
+    assert items[b"X-EMPTY"] is None
+
+
+def test_partial_body_item_keeps_its_origin():
+    items = parse_fetch_response([(b"1 (UID 3 BODY[1]<0> {5}", b"Hello"), b")"])
+    assert items[b"BODY[1]<0>"] == b"Hello"
+
+
+def test_only_the_first_message_is_parsed():
+    data = [(b"1 (UID 3 BODY[] {2}", b"ab"), b")", (b"2 (UID 4 BODY[] {2}", b"cd"), b")"]
+    assert parse_fetch_response(data) == {b"UID": b"3", b"BODY[]": b"ab"}
+
+
+def test_unbalanced_response_is_rejected():
+    with pytest.raises(ValueError):
+        parse_fetch_response([b"1 (UID 3))"])
+
+
+def test_single_part_message_is_section_1():
+    part = find_body_part(bodystructure(TEXT_PLAIN))
+    assert part == {"section": "1", "content_type": "text/plain", "charset": "utf-8",
+                    "encoding": "quoted-printable", "size": 120}
+
+
+def test_nested_multipart():
+    structure = bodystructure(b"((" + TEXT_PLAIN + TEXT_HTML + b' "ALTERNATIVE")' + PDF + b' "MIXED")')
+    assert find_body_part(structure)["section"] == "1.1"
+    html = find_body_part(structure, "text/html")
+    assert (html["section"], html["charset"], html["encoding"]) == ("1.2", "iso-8859-1", "base64")
+    assert find_body_part(structure, "application/pdf")["section"] == "2"
+    assert find_body_part(structure, "image/png") is None
+
+
+def test_forward_attached_as_message_rfc822():
+    inner = b"(" + TEXT_PLAIN + TEXT_HTML + b' "ALTERNATIVE")'
+    structure = bodystructure(b"(" + PDF + rfc822(inner) + b' "MIXED")')
+    assert find_body_part(structure)["section"] == "2.1"
+    assert find_body_part(structure, "text/html")["section"] == "2.2"
+
+
+def test_single_part_message_rfc822_body_is_its_part_1():
+    structure = bodystructure(b"(" + PDF + rfc822(TEXT_HTML) + b' "MIXED")')
+    assert find_body_part(structure, "text/html")["section"] == "2.1"
+
+
+def test_text_before_an_attached_message_wins():
+    structure = bodystructure(b"(" + TEXT_PLAIN + rfc822(TEXT_PLAIN) + b' "MIXED")')
+    assert find_body_part(structure)["section"] == "1"
+
+
+def test_fetch_headers_and_sections_from_a_server():
+    msg = EmailMessage()
+    msg["From"] = "user@example.com"
+    msg["Subject"] = "Fwd: Your tickets"
+    msg.set_content("Booking ID: ABC123\n")
+    msg.add_alternative("<p>Booking ID: ABC123</p>\n", subtype="html")
+    msg.add_attachment(b"%PDF-1.4\n" + b"\0" * 1000, maintype="application", subtype="pdf",
+                       filename="ticket.pdf")
+
+    server = FakeIMAPServer().start()
+    try:
+        uid = str(server.append(msg))
+        mail = server.connect()
+        mail.select("inbox")
+        headers, _, structure, _ = fetch_headers(mail, uid)
+        assert headers["Subject"] == "Fwd: Your tickets"
+        part = find_body_part(structure)
+        assert part["section"] == "1.1"
+        body, _ = fetch_section(mail, uid, part["section"])
+        assert body == b"Booking ID: ABC123\n"
+        body, _ = fetch_section(mail, uid, part["section"], max_bytes=7)
+        assert body == b"Booking"
+        mail.logout()
+    finally:
+        server.stop()
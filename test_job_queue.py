@@ -0,0 +1,120 @@
+# test_job_queue.py
+
+import sqlite3
+import time
+from concurrent.futures import Future
+
+from job_queue import DONE, QUEUED, RETRYING, RUNNING, JobQueue, TaskLease
+from verification import CONNECTION_ERROR, VERIFIED, make_outcome
+
+
+def handler(user_email, platform):
+    future = Future()
+    future.set_result(make_outcome(VERIFIED, "ok"))
+    return future
+
+
+def job_queue(path, **kwargs):
+    return JobQueue(str(path), handler, retry_statuses=(CONNECTION_ERROR,), **kwargs)
+
+
+def expire_lease(path, job_id):
+    db = sqlite3.connect(str(path))
+    db.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job_id))
+    db.commit()
+    db.close()
+
+
+def test_a_job_is_claimed_once(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    first, second = job_queue(path), job_queue(path)
+    job_id = first.enqueue("user@example.com", "bookmyshow")
+    assert first._claim() == (job_id, "user@example.com", "bookmyshow", 1)
+    assert second._claim() is None
+    assert first._claim() is None
+    assert first.get(job_id)["state"] == RUNNING
+
+
+def test_jobs_are_shared_between_queues(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    queues = [job_queue(path), job_queue(path)]
+    job_ids = {queues[0].enqueue(f"user{i}@example.com", "bookmyshow") for i in range(10)}
+    claimed = []
+    for i in range(20):
+        job = queues[i % 2]._claim()
+        if job:
+            claimed.append(job[0])
+    assert sorted(claimed) == sorted(job_ids)
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    first, second = job_queue(path, lease=60), job_queue(path, lease=60)
+    job_id = first.enqueue("user@example.com", "bookmyshow")
+    first._claim()
+    assert second._claim() is None
+    expire_lease(path, job_id)
+    assert second._claim() == (job_id, "user@example.com", "bookmyshow", 2)
+
+
+def test_late_outcome_is_discarded(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    first, second = job_queue(path), job_queue(path)
+    job_id = first.enqueue("user@example.com", "bookmyshow")
+    first._claim()
+    expire_lease(path, job_id)
+    second._claim()
+
+    first._record(job_id, "bookmyshow", 1, make_outcome(VERIFIED, "late"))
+    job = first.get(job_id)
+    assert (job["state"], job["outcome"]) == (RUNNING, None)
+
+    second._record(job_id, "bookmyshow", 2, make_outcome(VERIFIED, "current"))
+    job = first.get(job_id)
+    assert (job["state"], job["outcome"]["message"]) == (DONE, "current")
+
+    first._record(job_id, "bookmyshow", 1, make_outcome(VERIFIED, "late"))
+    assert first.get(job_id)["outcome"]["message"] == "current"
+
+
+def test_transient_outcome_is_retried_after_backoff(tmp_path):
+    queue = job_queue(tmp_path / "jobs.sqlite3", max_attempts=2, backoff_base=60)
+    job_id = queue.enqueue("user@example.com", "bookmyshow")
+    queue._claim()
+    queue._record(job_id, "bookmyshow", 1, make_outcome(CONNECTION_ERROR, "down"))
+    job = queue.get(job_id)
+    assert job["state"] == RETRYING
+    assert job["next_run_at"] > time.time() + 30
+    assert queue._claim() is None
+    assert queue.counts() == {RETRYING: 1}
+
+
+def test_last_attempt_records_the_outcome(tmp_path):
+    queue = job_queue(tmp_path / "jobs.sqlite3", max_attempts=1)
+    job_id = queue.enqueue("user@example.com", "bookmyshow")
+    queue._claim()
+    queue._record(job_id, "bookmyshow", 1, make_outcome(CONNECTION_ERROR, "down"))
+    job = queue.get(job_id)
+    assert (job["state"], job["outcome"]["status"]) == (DONE, CONNECTION_ERROR)
+    assert queue.counts() == {DONE: 1}
+    assert QUEUED not in queue.counts()
+
+
+def test_task_lease_has_one_holder(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = TaskLease(path, "archive", 60), TaskLease(path, "archive", 60)
+    assert first.acquire()
+    assert not second.acquire()
+    assert TaskLease(path, "batch-verify", 60).acquire()
+    second.release()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+
+
+def test_task_lease_expires(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    assert TaskLease(path, "archive", 0.05).acquire()
+    assert not TaskLease(path, "archive", 60).acquire()
+    time.sleep(0.1)
+    assert TaskLease(path, "archive", 60).acquire()
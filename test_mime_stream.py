@@ -0,0 +1,112 @@
+# test_mime_stream.py
+
+from email.message import EmailMessage
+
+from mime_stream import parse_first_text_part
+
+TEXT = "Booking ID: ABC123\nVenue: Grand Hall\n"
+
+
+def forward(text=TEXT, html=True, attachment_size=0):
+    msg = EmailMessage()
+    msg["From"] = "user@example.com"
+    msg["To"] = "verify@example.org"
+    msg["Subject"] = "Fwd: Your tickets"
+    msg.set_content(text)
+    if html:
+        msg.add_alternative("<p>Booking ID: ABC123</p>\n", subtype="html")
+    if attachment_size:
+        msg.add_attachment(b"\0" * attachment_size, maintype="application", subtype="pdf",
+                           filename="ticket.pdf")
+    return msg
+
+
+def text_of(msg):
+    return msg.get_payload(decode=True).decode()
+
+
+def test_single_part_message():
+    msg, info = parse_first_text_part(forward(html=False).as_bytes())
+    assert msg["Subject"] == "Fwd: Your tickets"
+    assert msg.get_content_type() == "text/plain"
+    assert text_of(msg) == TEXT
+    assert not info["truncated"]
+
+
+def test_nested_multipart_stops_after_the_text_part():
+    raw = forward(attachment_size=200000).as_bytes()
+    msg, info = parse_first_text_part(raw)
+    assert text_of(msg) == TEXT
+    assert msg["From"] == "user@example.com"
+    assert info["scanned_bytes"] < 2000 < len(raw)
+    assert not info["truncated"]
+
+
+def test_html_is_used_without_a_plain_text_part():
+    msg = EmailMessage()
+    msg["Subject"] = "Fwd: Your tickets"
+    msg.set_content("<p>Booking ID: ABC123</p>\n", subtype="html")
+    msg.add_attachment(b"\0" * 100, maintype="application", subtype="pdf", filename="ticket.pdf")
+    parsed, info = parse_first_text_part(msg.as_bytes())
+    assert parsed.get_content_type() == "text/html"
+    assert text_of(parsed) == "<p>Booking ID: ABC123</p>\n"
+    assert info["skipped_parts"] == 1
+
+
+def test_attachment_named_text_is_skipped():
+    msg = EmailMessage()
+    msg["Subject"] = "Fwd: Your tickets"
+    msg.set_content("")
+    msg.make_mixed()
+    msg.get_payload()[0].set_payload("")
+    msg.add_attachment("not the body\n", filename="notes.txt")
+    msg.add_attachment(TEXT, subtype="plain")
+    parsed, _ = parse_first_text_part(msg.as_bytes())
+    assert parsed.get_payload(decode=True) == b""
+
+
+def test_forward_attached_as_message_rfc822():
+    outer = EmailMessage()
+    outer["From"] = "user@example.com"
+    outer["Subject"] = "Fwd: Your tickets"
+    outer.set_content("See attached.\n", subtype="html")
+    outer.add_attachment(forward(attachment_size=500))
+    msg, _ = parse_first_text_part(outer.as_bytes())
+    assert outer.get_payload()[1].get_content_type() == "message/rfc822"
+    assert msg["Subject"] == "Fwd: Your tickets"
+    assert msg["From"] == "user@example.com"
+    assert msg.get_content_type() == "text/plain"
+    assert text_of(msg) == TEXT
+
+
+def test_message_cut_inside_the_text_part():
+    raw = forward(text="line\n" * 1000).as_bytes()
+    cut = raw.index(b"line\n") + 100
+    msg, info = parse_first_text_part(raw[:cut])
+    assert not info["truncated"]
+    assert text_of(msg).startswith("line\nline\n")
+    assert len(msg.get_payload(decode=True)) <= 100
+
+
+def test_max_bytes_stops_the_scan():
+    raw = forward(text="line\n" * 1000).as_bytes()
+    limit = raw.index(b"line\n") + 500
+    msg, info = parse_first_text_part(raw, max_bytes=limit)
+    assert info["truncated"]
+    assert info["scanned_bytes"] > limit
+    assert msg.get_payload(decode=True) == b"line\n" * 100
+
+
+def test_text_part_is_cut_at_max_text_bytes():
+    text = ("x" * 50 + "\n") * 100
+    msg, info = parse_first_text_part(forward(text=text).as_bytes(), max_text_bytes=100)
+    assert info["truncated"]
+    assert msg.get_payload(decode=True) == text.encode()[:100]
+
+
+def test_message_cut_before_any_body():
+    raw = forward().as_bytes()
+    msg, info = parse_first_text_part(raw[:raw.index(b"\n\n") + 2])
+    assert msg["Subject"] == "Fwd: Your tickets"
+    assert msg.get_payload(decode=True) == b""
+    assert not info["truncated"]
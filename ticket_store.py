@@ -0,0 +1,113 @@
+import json
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verified_tickets (
+    platform TEXT NOT NULL,
+    booking_id TEXT NOT NULL,
+    message_id TEXT,
+    user_email TEXT NOT NULL,
+    data TEXT NOT NULL,
+    verified_at REAL NOT NULL,
+    PRIMARY KEY (platform, booking_id)
+);
+CREATE UNIQUE INDEX IF NOT EXISTS verified_tickets_by_message_id
+    ON verified_tickets (message_id) WHERE message_id IS NOT NULL;
+"""
+
+
+class TicketStore:
+    """
+    Persistent store of verified tickets. Each (platform, booking_id) and
+    each Message-ID can be claimed by one user only, so replayed or shared
+    tickets are rejected.
+    """
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    @staticmethod
+    def _row_to_ticket(row):
+        return {
+            "platform": row[0],
+            "booking_id": row[1],
+            "message_id": row[2],
+            "user_email": row[3],
+            "data": json.loads(row[4]),
+            "verified_at": row[5],
+        }
+
+    def lookup_message(self, message_id):
+        """Ticket claimed with the message message_id, or None."""
+        message_id = (message_id or "").strip()
+        if not message_id:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT platform, booking_id, message_id, user_email, data, verified_at FROM verified_tickets "
+                "WHERE message_id = ?", (message_id,)
+            ).fetchone()
+        return self._row_to_ticket(row) if row else None
+
+    def verified_message_ids(self, message_ids):
+        """The subset of message_ids that belong to verified tickets."""
+        message_ids = [message_id.strip() for message_id in message_ids if message_id]
+        found = set()
+        with self._lock:
+            # Stay below SQLite's limit on bound parameters
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                found.update(row[0] for row in self._db.execute(
+                    "SELECT message_id FROM verified_tickets WHERE message_id IN "
+                    f"({', '.join('?' * len(chunk))})", chunk
+                ))
+        return found
+
+    def _find_conflict(self, platform, booking_id, message_id):
+        row = self._db.execute(
+            "SELECT platform, booking_id, message_id, user_email, data, verified_at FROM verified_tickets "
+            "WHERE (platform = ? AND booking_id = ?) OR (message_id IS NOT NULL AND message_id = ?)",
+            (platform, booking_id, message_id)
+        ).fetchone()
+        return self._row_to_ticket(row) if row else None
+
+    def claim(self, platform, booking_id, message_id, user_email, data):
+        """
+        Record a verified ticket for user_email. Returns (accepted, ticket):
+        accepted is False when the booking or message was already claimed by
+        another user, in which case ticket is the existing claim.
+        """
+        user_email = user_email.lower()
+        message_id = (message_id or "").strip() or None
+        with self._lock:
+            existing = self._find_conflict(platform, booking_id, message_id)
+            if existing:
+                if existing["user_email"] != user_email or existing["booking_id"] != booking_id:
+                    return False, existing
+                return True, existing
+
+            ticket = {
+                "platform": platform,
+                "booking_id": booking_id,
+                "message_id": message_id,
+                "user_email": user_email,
+                "data": data,
+                "verified_at": time.time(),
+            }
+            try:
+                self._db.execute(
+                    "INSERT INTO verified_tickets (platform, booking_id, message_id, user_email, data, verified_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (platform, booking_id, message_id, user_email, json.dumps(data), ticket["verified_at"])
+                )
+                self._db.commit()
+            except sqlite3.IntegrityError:
+                # Claimed by another process since the conflict check
+                self._db.rollback()
+                return False, self._find_conflict(platform, booking_id, message_id)
+            return True, ticket
@@ -0,0 +1,127 @@
+import logging
+
+from parsers import detect_platform, get_platform_email, parse_email
+from metrics import metrics, span
+from platforms import registry
+
+# Outcome statuses
+VERIFIED = "verified"
+FAILED = "failed"
+NO_EMAIL = "no_email"
+WRONG_PLATFORM = "wrong_platform"
+PARSE_FAILED = "parse_failed"
+CONNECTION_ERROR = "connection_error"
+TIMED_OUT = "timed_out"
+OVERLOADED = "overloaded"
+UNKNOWN_PLATFORM = "unknown_platform"
+DUPLICATE = "duplicate"
+
+# Precheck statuses, besides NO_EMAIL, WRONG_PLATFORM and CONNECTION_ERROR
+NOT_FORWARDED = "not_forwarded"
+READY = "ready"
+
+# Outcomes decided by the message itself; they hold until a newer message arrives
+MESSAGE_OUTCOMES = {VERIFIED, FAILED, WRONG_PLATFORM, PARSE_FAILED, DUPLICATE}
+
+REQUIRED_FIELDS = ["booking_id", "venue", "date_time", "event_name", "quantity"]
+
+
+def make_outcome(status, message, data=None):
+    """A verification outcome as rendered by /confirm."""
+    return {"status": status, "message": message, "data": data}
+
+
+def check_parsed_data(parsed_data, user_email, expected_from_email):
+    """Return the list of verification errors for parsed ticket data."""
+    errors = []
+    if parsed_data["from_email"] != expected_from_email.lower():
+        errors.append(f"From email does not match. Expected: {expected_from_email}, Found: {parsed_data['from_email']}")
+
+    if parsed_data["to_email"] != user_email.lower():
+        errors.append(f"To email does not match. Expected: {user_email}, Found: {parsed_data['to_email']}")
+
+    for field in REQUIRED_FIELDS:
+        if not parsed_data[field]:
+            errors.append(f"{field.replace('_', ' ').title()} not found in the email.")
+    return errors
+
+
+def wrong_platform_outcome(detected_platform, platform, data=None):
+    detected_name = registry.get(detected_platform).display_name
+    selected_name = registry.get(platform).display_name
+    return make_outcome(WRONG_PLATFORM,
+                        f"The forwarded email looks like a {detected_name} ticket, but {selected_name} was selected.",
+                        data)
+
+
+def verify_message(msg, user_email, platform):
+    """
+    Detect, parse and check a forwarded email for user_email and the
+    selected platform. Returns an outcome dict.
+    """
+    expected_from_email = get_platform_email(platform)
+
+    with span("detect"):
+        detected_platform = detect_platform(msg)
+    if detected_platform and detected_platform != platform:
+        # Mail from another platform would only fail verification; skip parsing it
+        logging.warning("Forwarded email is from %s, but %s was selected.", detected_platform, platform)
+        return wrong_platform_outcome(detected_platform, platform)
+
+    with span("parse"):
+        parsed_data = parse_email(msg, platform)
+    if not parsed_data:
+        logging.error("Failed to parse the forwarded email.")
+        return make_outcome(PARSE_FAILED, "Failed to parse the forwarded email.")
+
+    with span("check"):
+        errors = check_parsed_data(parsed_data, user_email, expected_from_email)
+    if errors:
+        for field in REQUIRED_FIELDS:
+            if not parsed_data[field]:
+                metrics.inc("missing_fields_total", platform=platform, field=field)
+        logging.info("Verification failed.")
+        return make_outcome(FAILED, "Verification failed:<br>" + "<br>".join(errors))
+
+    logging.info("Verification successful.")
+    outcome = make_outcome(VERIFIED, "Verification successful! All details are valid.", parsed_data)
+    outcome["message_id"] = msg.get("Message-ID")
+    return outcome
+
+
+def precheck_outcome(forward, platform):
+    """
+    Precheck outcome for forward, the envelope of the user's newest message,
+    or None when there is none. ready is True when a full verification is
+    worth starting; the platform may still be unknown then.
+    """
+    if not forward:
+        outcome = make_outcome(NO_EMAIL, "No forwarded email found. Please ensure you have forwarded the email correctly.")
+    elif not forward["forwarded"]:
+        outcome = make_outcome(NOT_FORWARDED, "The latest email is not a forwarded email.", forward)
+    elif forward["detected_platform"] and forward["detected_platform"] != platform:
+        outcome = wrong_platform_outcome(forward["detected_platform"], platform, forward)
+    else:
+        outcome = make_outcome(READY, "A forwarded email was found.", forward)
+    outcome["ready"] = outcome["status"] == READY
+    return outcome
+
+
+def stored_outcome(ticket):
+    """Outcome for a ticket the user already verified."""
+    return make_outcome(VERIFIED, "Verification successful! This ticket was already verified.", ticket["data"])
+
+
+def claim_ticket(tickets, outcome, user_email, platform):
+    """
+    Record a verified outcome in the ticket store. A booking or message
+    already claimed by another user turns the outcome into DUPLICATE.
+    """
+    if outcome["status"] != VERIFIED:
+        return outcome
+    booking_id = outcome["data"]["booking_id"]
+    accepted, _ = tickets.claim(platform, booking_id, outcome.get("message_id"), user_email, outcome["data"])
+    if accepted:
+        return outcome
+    logging.warning("Rejected replayed ticket %s/%s for %s.", platform, booking_id, user_email)
+    return make_outcome(DUPLICATE, f"This ticket (booking ID {booking_id}) has already been verified by another user.")
@@ -0,0 +1,11 @@
+# wsgi.py
+#
+# Production entry point for WSGI servers, e.g.
+#   gunicorn --workers 2 --threads 8 wsgi:app
+# Each worker process builds its own app, pools and background threads. The
+# processes share the job queue: each job is claimed by one of them, and a job
+# left running by a process that died is picked up once its JOB_LEASE expires.
+
+from app import create_app
+
+app = create_app()